@@ -1,6 +1,30 @@
 # annotator/__init__.py
-from .gui import ImageVideoAnnotator
-from .models import Annotation
-from .ai_tools import ai_prelabel, train_custom_model
-from .export_tools import export_yolo_format, export_voc_format, export_coco_format, export_csv_format
-from .utils import point_in_polygon
+# Public names are resolved lazily (PEP 562) so that "import annotator" stays
+# cheap; heavy dependencies load only when a feature that needs them is used.
+import importlib
+
+_EXPORTS = {
+    "ImageVideoAnnotator": ".gui",
+    "Annotation": ".models",
+    "ai_prelabel": ".ai_tools",
+    "train_custom_model": ".ai_tools",
+    "export_yolo_format": ".export_tools",
+    "export_voc_format": ".export_tools",
+    "export_coco_format": ".export_tools",
+    "export_csv_format": ".export_tools",
+    "point_in_polygon": ".utils",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,281 @@
+# annotator/active_learning.py
+"""
+Active learning: rank the images that still need work by how uncertain the
+current model is about them, and let Next Image walk that ranking instead of
+the file order.
+
+Scoring methods (higher = more informative):
+    least_confidence  1 - the highest detection confidence (1.0 without detections)
+    entropy           sum of the binary entropies of all detections, in bits
+    disagreement      1 - F1 between the confident detections and the image's
+                      existing annotations (IoU >= 0.5, same label); images
+                      without annotations fall back to least_confidence
+"""
+import contextlib
+import math
+import os
+import time
+
+METHODS = ("least_confidence", "entropy", "disagreement")
+MIN_CONFIDENCE = 0.05       # detections below this are ignored by all methods
+CONFIDENT = 0.25            # detections compared against existing annotations
+DISAGREEMENT_IOU = 0.5
+
+
+def least_confidence(confidences):
+    return 1.0 - max(confidences) if len(confidences) else 1.0
+
+
+def detection_entropy(confidences):
+    total = 0.0
+    for p in confidences:
+        p = min(max(float(p), 1e-6), 1 - 1e-6)
+        total -= p * math.log2(p) + (1 - p) * math.log2(1 - p)
+    return total
+
+
+def disagreement(boxes, labels, confidences, annotations):
+    """1 - F1 of the confident detections against the annotation dicts of the image."""
+    import numpy as np
+
+    from .evaluation import match_predictions
+
+    keep = [i for i, c in enumerate(confidences) if c >= CONFIDENT]
+    keep.sort(key=lambda i: -confidences[i])
+    gt = [ann for ann in annotations if len(ann["points"]) >= 4]
+    if not keep and not gt:
+        return 0.0
+    names = {}
+    pred_classes = np.array([names.setdefault(labels[i], len(names)) for i in keep], dtype=int)
+    gt_classes = np.array([names.setdefault(ann["label"], len(names)) for ann in gt], dtype=int)
+    gt_boxes = np.array([[min(ann["points"][0::2]), min(ann["points"][1::2]),
+                          max(ann["points"][0::2]), max(ann["points"][1::2])] for ann in gt],
+                        dtype=np.float64).reshape(-1, 4)
+    pred_boxes = np.asarray([boxes[i] for i in keep], dtype=np.float64).reshape(-1, 4)
+    tp = match_predictions(pred_boxes, pred_classes, gt_boxes, gt_classes, iou_thresholds=[DISAGREEMENT_IOU])
+    matched = int(tp.sum())
+    return 1.0 - 2.0 * matched / (len(keep) + len(gt))
+
+
+def score_image(method, boxes, labels, confidences, annotations=()):
+    if method == "least_confidence":
+        return least_confidence(confidences)
+    if method == "entropy":
+        return detection_entropy(confidences)
+    if method == "disagreement":
+        if annotations:
+            return disagreement(boxes, labels, confidences, annotations)
+        return least_confidence(confidences)
+    raise ValueError(f"Unknown scoring method: {method}")
+
+
+def candidate_images(image_list, annotation_store, image_status, method):
+    """Images worth ranking: not marked completed and, except for disagreement, not annotated yet."""
+    return [p for p in image_list if not image_status.get(p, False)
+            and (method == "disagreement" or not annotation_store.get(p))]
+
+
+def rank_images(model, paths, method="least_confidence", annotation_store=None, batch_size=16, imgsz=640,
+                progress_callback=None, cancel_event=None, lock=None):
+    """
+    Run model over paths in batches and score every image. Returns a list of
+    (path, score, detections) sorted by descending score; images skipped by
+    cancel_event are not in it. Images the model cannot read score 0. lock, if
+    given, is held around each batch's inference (see ModelRegistry.call_lock).
+    """
+    from .inference import _label_for
+    from .profiling import profiler
+
+    if method not in METHODS:
+        raise ValueError(f"Unknown scoring method: {method}")
+    annotation_store = annotation_store or {}
+    scored = []
+    for start in range(0, len(paths), batch_size):
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        batch = paths[start:start + batch_size]
+        readable = [p for p in batch if os.path.isfile(p)]
+        with lock or contextlib.nullcontext(), profiler.measure("ai.active_learning_batch"):
+            results = model.predict(source=readable, imgsz=imgsz, conf=MIN_CONFIDENCE, save=False,
+                                    verbose=False) if readable else []
+        for path, result in zip(readable, results):
+            boxes = result.boxes.xyxy.cpu().numpy().tolist()
+            confidences = result.boxes.conf.cpu().numpy().tolist()
+            labels = [_label_for(model, int(c)) for c in result.boxes.cls.cpu().numpy().tolist()]
+            score = score_image(method, boxes, labels, confidences, annotation_store.get(path, ()))
+            scored.append((path, float(score), len(boxes)))
+        scored.extend((p, 0.0, 0) for p in batch if p not in readable)
+        if progress_callback is not None:
+            progress_callback(min(start + batch_size, len(paths)), len(paths))
+    scored.sort(key=lambda item: -item[1])
+    return scored
+
+
+class ActiveQueue:
+    """
+    A ranked list of images for Next Image to follow. next_path() continues
+    after the current image's rank and skips images completed since ranking.
+    """
+
+    def __init__(self, ranking, method, model_path, created=None):
+        self.ranking = list(ranking)  # (path, score) pairs, best first
+        self.method = method
+        self.model_path = model_path
+        self.created = created if created is not None else time.time()
+        self._rank = {path: n for n, (path, _) in enumerate(self.ranking)}
+
+    def __len__(self):
+        return len(self.ranking)
+
+    def next_path(self, current, is_done):
+        start = self._rank[current] + 1 if current in self._rank else 0
+        for path, _ in self.ranking[start:]:
+            if not is_done(path):
+                return path
+        return None
+
+    def remaining(self, is_done):
+        return sum(1 for path, _ in self.ranking if not is_done(path))
+
+    def to_dict(self):
+        return {"method": self.method, "model": self.model_path, "created": self.created,
+                "ranking": [[path, score] for path, score in self.ranking]}
+
+    @staticmethod
+    def from_dict(d, image_list=None):
+        """Images missing from image_list (e.g. removed since ranking) are dropped from the ranking."""
+        if not d or not d.get("ranking"):
+            return None
+        known = set(image_list) if image_list is not None else None
+        ranking = [(path, score) for path, score in d["ranking"] if known is None or path in known]
+        if not ranking:
+            return None
+        return ActiveQueue(ranking, d.get("method", ""), d.get("model", ""), d.get("created"))
+
+
+def active_learning(app):
+    """Rank the project's open images with the current model and make Next Image follow the ranking."""
+    # Tk is imported here so the ranking above also runs headless (see cli.py).
+    import queue
+    import threading
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+
+    from .inference import get_yolo, model_registry
+
+    if get_yolo() is None:
+        messagebox.showerror("Error", "Ultralytics package not installed!\nPlease run: pip install ultralytics")
+        return
+    if not app.image_list:
+        messagebox.showerror("Error", "Load images first.")
+        return
+    app.store_current_annotations()
+
+    win = tk.Toplevel(app)
+    win.title("Active Learning Queue")
+    win.geometry("760x520")
+    form = ttk.Frame(win, padding=5)
+    form.pack(fill=tk.X)
+    ttk.Label(form, text="Model:").grid(row=0, column=0, sticky="w")
+    model_var = tk.StringVar(value=app.prelabel_model_path)
+    ttk.Entry(form, textvariable=model_var, width=50).grid(row=0, column=1, sticky="ew")
+    ttk.Button(form, text="...", width=3, command=lambda: model_var.set(
+        filedialog.askopenfilename(parent=win, filetypes=[("PyTorch Model Files", "*.pt"), ("All Files", "*.*")])
+        or model_var.get())).grid(row=0, column=2)
+    ttk.Label(form, text="Score by:").grid(row=1, column=0, sticky="w")
+    method_var = tk.StringVar(value="least_confidence")
+    ttk.Combobox(form, textvariable=method_var, values=METHODS, state="readonly",
+                 width=18).grid(row=1, column=1, sticky="w")
+    ttk.Label(form, text="Batch size:").grid(row=2, column=0, sticky="w")
+    batch_var = tk.IntVar(value=16)
+    ttk.Spinbox(form, from_=1, to=256, textvariable=batch_var, width=6).grid(row=2, column=1, sticky="w")
+    status = ttk.Label(win, text="", padding=5)
+    status.pack(fill=tk.X)
+
+    tree = ttk.Treeview(win, columns=("score", "detections", "image"), show="headings")
+    for column, text, width in (("score", "Score", 80), ("detections", "Detections", 80), ("image", "Image", 520)):
+        tree.heading(column, text=text)
+        tree.column(column, width=width, anchor="w" if column == "image" else "e")
+    tree.pack(fill=tk.BOTH, expand=True)
+    buttons = ttk.Frame(win, padding=5)
+    buttons.pack(fill=tk.X)
+    state = {"ranking": [], "model": None, "method": None}
+    cancel_event = threading.Event()
+
+    def show(ranking):
+        tree.delete(*tree.get_children())
+        for n, (path, score, detections) in enumerate(ranking[:2000]):
+            tree.insert("", "end", iid=str(n), values=(f"{score:.3f}", detections, path))
+
+    def start_labeling():
+        if not state["ranking"]:
+            return
+        app.active_queue = ActiveQueue([(p, s) for p, s, _ in state["ranking"]], state["method"], state["model"])
+        app.update_active_queue_status()
+        win.destroy()
+        app.goto_image(app.active_queue.ranking[0][0])
+
+    def on_select(event):
+        selection = tree.selection()
+        if selection:
+            app.goto_image(state["ranking"][int(selection[0])][0])
+
+    def run():
+        weights = model_var.get()
+        method = method_var.get()
+        try:
+            model = model_registry.get(weights)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not load the model:\n{e}", parent=win)
+            return
+        paths = candidate_images(app.image_list, app.annotation_store, app.image_status, method)
+        if not paths:
+            messagebox.showinfo("Active Learning", "No open images to rank.", parent=win)
+            return
+        store = {p: list(app.annotation_store.get(p, ())) for p in paths}
+        events = queue.Queue()
+        cancel_event.clear()
+
+        def worker():
+            try:
+                ranking = rank_images(model, paths, method, store, batch_size=max(1, batch_var.get()),
+                                      progress_callback=lambda done, total: events.put(("progress", (done, total))),
+                                      cancel_event=cancel_event, lock=model_registry.call_lock(model))
+                events.put(("done", ranking))
+            except Exception as e:
+                events.put(("error", e))
+
+        run_btn.state(["disabled"])
+        threading.Thread(target=worker, daemon=True).start()
+
+        def poll():
+            if not win.winfo_exists():
+                return
+            try:
+                while True:
+                    kind, payload = events.get_nowait()
+                    if kind == "progress":
+                        status.config(text=f"Scoring... {payload[0]}/{payload[1]} images")
+                    elif kind == "error":
+                        run_btn.state(["!disabled"])
+                        messagebox.showerror("Error", f"Ranking failed:\n{payload}", parent=win)
+                        return
+                    else:
+                        run_btn.state(["!disabled"])
+                        state.update(ranking=payload, model=weights, method=method)
+                        show(payload)
+                        status.config(text=f"{len(payload)} images ranked by {method}. "
+                                           "Start Labeling makes Next Image follow this order.")
+                        return
+            except queue.Empty:
+                pass
+            win.after(200, poll)
+
+        poll()
+
+    run_btn = ttk.Button(buttons, text="Rank Images", command=run)
+    run_btn.pack(side=tk.LEFT)
+    ttk.Button(buttons, text="Start Labeling", command=start_labeling).pack(side=tk.LEFT, padx=5)
+    ttk.Button(buttons, text="Cancel", command=cancel_event.set).pack(side=tk.LEFT)
+    tree.bind("<<TreeviewSelect>>", on_select)
+    win.bind("<Destroy>", lambda event: cancel_event.set() if event.widget is win else None, add="+")
@@ -1,62 +1,150 @@
 # ai_tools.py
 import os
-import glob
-import cv2
-from tkinter import Canvas, messagebox, filedialog
-from PIL import Image, ImageDraw, ImageFont
-import os
-import glob
-import cv2
-from tkinter import Toplevel, Frame, Listbox, Scrollbar, Button, Label, messagebox, filedialog, BOTH, LEFT, RIGHT, Y, END, VERTICAL
+import threading
+
+from tkinter import (Toplevel, Frame, Listbox, Scrollbar, Button, Label, Text, Canvas, messagebox,
+                     filedialog, simpledialog, BOTH, LEFT, RIGHT, Y, END, VERTICAL)
 from PIL import Image, ImageTk, ImageDraw, ImageFont
 
-try:
-    from ultralytics import YOLO
-except ImportError:
-    YOLO = None
+from .inference import (DEFAULT_PRELABEL_MODEL, get_yolo, model_registry, sliced_predict,
+                        ultralytics_installed, _label_for)
+from .profiling import profiler
+
+# OpenCV and Ultralytics (which pulls in torch) are imported on first use so
+# that starting the annotator does not pay for them.
+
+
+def _add_detections(app, model, boxes, classes):
+    """Append detected boxes (image coordinates) to the current annotations."""
+    from annotator.models import Annotation  # Local import to avoid circular dependency
+
+    for (x1, y1, x2, y2), cls_id in zip(boxes, classes):
+        label = _label_for(model, int(cls_id))
+        if label not in app.labels:
+            app.labels.append(label)
+            app.update_class_buttons()
+        ann = Annotation("bbox", [int(x1), int(y1), int(x2), int(y2)], label)
+        app.annotations.append(ann)
+    app.push_undo_state()
+    app.redraw_canvas()
+
+
+def _load_prelabel_model(app):
+    weights = getattr(app, "prelabel_model_path", None) or DEFAULT_PRELABEL_MODEL
+    return model_registry.get(weights)
+
+
+def select_prelabel_model(app):
+    """Let the user pick which weights file is used for pre-labeling.
+       Models that are already warm in the registry are listed for instant switching."""
+    if get_yolo() is None:
+        messagebox.showerror("Error", "Ultralytics package not installed!\nPlease run: pip install ultralytics")
+        return
+
+    win = Toplevel(app)
+    win.title("Select Pre-label Model")
+    win.geometry("500x300")
+
+    current = getattr(app, "prelabel_model_path", None) or DEFAULT_PRELABEL_MODEL
+    Label(win, text=f"Current: {current}").pack(pady=5)
+
+    choices = model_registry.loaded()
+    if DEFAULT_PRELABEL_MODEL not in choices:
+        choices.append(DEFAULT_PRELABEL_MODEL)
+    listbox = Listbox(win)
+    listbox.pack(fill=BOTH, expand=True, padx=5, pady=5)
+    for weights in choices:
+        listbox.insert(END, weights)
+
+    def use_model(weights):
+        try:
+            model_registry.get(weights)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not load the model:\n{e}")
+            return
+        app.prelabel_model_path = weights
+        win.destroy()
+
+    def use_selected():
+        sel = listbox.curselection()
+        if sel:
+            use_model(listbox.get(sel[0]))
+
+    def browse():
+        weights = filedialog.askopenfilename(
+            title="Select Model Weights",
+            filetypes=[("PyTorch Model Files", "*.pt"), ("All Files", "*.*")]
+        )
+        if weights:
+            use_model(weights)
+
+    Button(win, text="Use Selected", command=use_selected).pack(side=LEFT, padx=5, pady=5)
+    Button(win, text="Browse...", command=browse).pack(side=LEFT, padx=5, pady=5)
+
 
 def ai_prelabel(app):
     """Run AI-assisted pre-labeling using a YOLOv11 model."""
-    if YOLO is None:
+    if get_yolo() is None:
         messagebox.showerror("Error", "Ultralytics package not installed!\nPlease run: pip install ultralytics")
         return
 
-    if not hasattr(app, 'ai_model') or app.ai_model is None:
-        app.ai_model = YOLO("yolo11s.pt")
+    model = _load_prelabel_model(app)
 
+    import cv2
     img = cv2.imread(app.image_path)
     if img is None:
         messagebox.showerror("Error", "Cannot load image for AI pre-labeling!")
         return
 
-    results = app.ai_model(img)
-    from annotator.models import Annotation  # Local import to avoid circular dependency
-
+    with model_registry.call_lock(model), profiler.measure("ai.predict"):
+        results = model(img)
     for result in results:
-        for box in result.boxes:
-            coords = box.xyxy[0].cpu().numpy().astype(int)
-            x1, y1, x2, y2 = coords
-            cls_id = int(box.cls[0])
-            if isinstance(app.ai_model.names, dict):
-                label = app.ai_model.names.get(cls_id, "object")
-            else:
-                label = app.ai_model.names[cls_id]
-            if label not in app.labels:
-                app.labels.append(label)
-                app.update_class_buttons()
-            ann = Annotation("bbox", [int(x1), int(y1), int(x2), int(y2)], label)
-            app.annotations.append(ann)
-    app.push_undo_state()
-    app.redraw_canvas()
+        boxes = result.boxes.xyxy.cpu().numpy().astype(int)
+        classes = result.boxes.cls.cpu().numpy().astype(int)
+        _add_detections(app, model, boxes, classes)
     messagebox.showinfo("AI Pre-label", "AI pre-labeling complete.")
 
+
+def ai_prelabel_tiled(app):
+    """Run AI-assisted pre-labeling with sliced (tiled) inference for very large images."""
+    if get_yolo() is None:
+        messagebox.showerror("Error", "Ultralytics package not installed!\nPlease run: pip install ultralytics")
+        return
+    if not app.image_path:
+        return
+
+    tile_size = simpledialog.askinteger("Tiled Pre-label", "Tile size (pixels)",
+                                        initialvalue=app.tile_size, minvalue=128, maxvalue=4096)
+    if tile_size is None:
+        return
+    overlap = simpledialog.askfloat("Tiled Pre-label", "Tile overlap (0.0 - 0.9)",
+                                    initialvalue=app.tile_overlap, minvalue=0.0, maxvalue=0.9)
+    if overlap is None:
+        return
+    batch_size = simpledialog.askinteger("Tiled Pre-label", "Tiles per batch",
+                                         initialvalue=app.tile_batch_size, minvalue=1, maxvalue=256)
+    if batch_size is None:
+        return
+    app.tile_size, app.tile_overlap, app.tile_batch_size = tile_size, overlap, batch_size
+
+    model = _load_prelabel_model(app)
+
+    import cv2
+    img = cv2.imread(app.image_path)
+    if img is None:
+        messagebox.showerror("Error", "Cannot load image for AI pre-labeling!")
+        return
+
+    with model_registry.call_lock(model):
+        boxes, _, classes = sliced_predict(model, img, tile_size=tile_size, overlap=overlap,
+                                           batch_size=batch_size)
+    _add_detections(app, model, boxes.astype(int), classes)
+    messagebox.showinfo("AI Pre-label", f"Tiled pre-labeling complete: {len(boxes)} objects found.")
+
 def train_custom_model(app):
     """Initiate custom YOLOv11 training using a provided dataset.yaml and user-specified hyperparameters.
        Training progress will be shown in a dedicated UI window."""
-    from tkinter import filedialog, simpledialog, Toplevel, Text, Scrollbar, BOTH, END, Button
-    import threading, queue, sys
-
-    if YOLO is None:
+    if not ultralytics_installed():
         messagebox.showerror("Error", "Ultralytics package not installed!\nPlease run: pip install ultralytics")
         return
 
@@ -81,6 +169,11 @@ def train_custom_model(app):
     if image_size is None:
         return
 
+    cache_images = messagebox.askyesno(
+        "Training", f"Prepare a copy of the images resized to {image_size} px before training?\n"
+                    "Epochs are much faster with large photos, especially without a GPU. "
+                    "The copy is kept and reused while the dataset does not change.")
+
     num_workers = simpledialog.askinteger("Training", "Enter number of workers", initialvalue=4, minvalue=1, maxvalue=16)
     if num_workers is None:
         return
@@ -97,86 +190,190 @@ def train_custom_model(app):
     if weight_decay is None:
         return
 
-    # Create a new window to show training progress.
+    from .training import TrainingRunner
+    runner = TrainingRunner({
+        "model": "yolo11s.yaml",
+        "image_cache": {"format": "jpeg"} if cache_images else None,
+        "train_args": {
+            "data": dataset_file,
+            "epochs": epochs,
+            "imgsz": image_size,
+            "batch": batch_size,
+            "workers": num_workers,
+            "lr0": learning_rate,
+            "momentum": momentum,
+            "weight_decay": weight_decay,
+        },
+    })
+    _show_training_window(app, runner)
+
+
+def resume_training(app):
+    """Resume an interrupted training run from its last.pt checkpoint."""
+    if not ultralytics_installed():
+        messagebox.showerror("Error", "Ultralytics package not installed!\nPlease run: pip install ultralytics")
+        return
+    last_weights = filedialog.askopenfilename(
+        title="Select last.pt of the run to resume",
+        filetypes=[("PyTorch Model Files", "*.pt"), ("All Files", "*.*")]
+    )
+    if not last_weights:
+        return
+    from .training import TrainingRunner
+    _show_training_window(app, TrainingRunner({"resume": last_weights}))
+
+
+def _draw_series(canvas, title, series):
+    """Draw one or more metric series as line charts. series: list of (name, color, values)."""
+    canvas.delete("all")
+    width = max(canvas.winfo_width(), 100)
+    height = max(canvas.winfo_height(), 60)
+    pad = 30
+    canvas.create_text(pad, 10, anchor="nw", text=title, fill="black")
+    values = [v for _, _, vals in series for v in vals if v is not None]
+    if not values:
+        return
+    lo, hi = min(values), max(values)
+    if hi - lo < 1e-12:
+        hi = lo + 1.0
+    n = max(len(vals) for _, _, vals in series)
+    canvas.create_text(pad - 4, pad, anchor="ne", text=f"{hi:.3g}", font=("Helvetica", 8))
+    canvas.create_text(pad - 4, height - pad, anchor="ne", text=f"{lo:.3g}", font=("Helvetica", 8))
+    canvas.create_line(pad, height - pad, width - 10, height - pad, fill="gray")
+    legend_x = width - 10
+    for name, color, vals in series:
+        pts = []
+        for i, v in enumerate(vals):
+            if v is None:
+                continue
+            x = pad + (width - pad - 10) * (i / max(n - 1, 1))
+            y = height - pad - (height - 2 * pad) * ((v - lo) / (hi - lo))
+            pts.extend([x, y])
+        if len(pts) >= 4:
+            canvas.create_line(*pts, fill=color, width=2)
+        elif len(pts) == 2:
+            canvas.create_oval(pts[0] - 2, pts[1] - 2, pts[0] + 2, pts[1] + 2, fill=color, outline=color)
+        text_id = canvas.create_text(legend_x, 10, anchor="ne", text=name, fill=color)
+        legend_x = canvas.bbox(text_id)[0] - 10
+
+
+def _show_training_window(app, runner, max_log_lines=500):
+    """Start runner and show live metric charts, a bounded log and cancel/resume controls."""
     progress_window = Toplevel(app)
     progress_window.title("Training Progress")
-    progress_window.geometry("600x400")
-
-    text_widget = Text(progress_window, wrap="word")
-    text_widget.pack(fill=BOTH, expand=True)
-
-    scrollbar = Scrollbar(text_widget)
-    scrollbar.pack(side="right", fill="y")
+    progress_window.geometry("900x650")
+
+    summary_label = Label(progress_window, text="Starting training...", anchor="w")
+    summary_label.pack(fill="x", padx=5, pady=5)
+
+    charts = Frame(progress_window)
+    charts.pack(fill=BOTH, expand=True)
+    loss_canvas = Canvas(charts, bg="white", height=220)
+    loss_canvas.pack(side=LEFT, fill=BOTH, expand=True, padx=5)
+    map_canvas = Canvas(charts, bg="white", height=220)
+    map_canvas.pack(side=LEFT, fill=BOTH, expand=True, padx=5)
+
+    log_frame = Frame(progress_window)
+    log_frame.pack(fill=BOTH, expand=True, padx=5)
+    text_widget = Text(log_frame, wrap="none", height=10)
+    scrollbar = Scrollbar(log_frame, command=text_widget.yview)
     text_widget.config(yscrollcommand=scrollbar.set)
-    scrollbar.config(command=text_widget.yview)
-
-    # Create a thread-safe queue for log messages.
-    log_queue = queue.Queue()
-
-    # Define a custom stream that writes log messages to the queue.
-    class QueueStream:
-        def __init__(self, q):
-            self.q = q
-
-        def write(self, msg):
-            self.q.put(msg)
-
-        def flush(self):
-            pass
+    scrollbar.pack(side=RIGHT, fill=Y)
+    text_widget.pack(fill=BOTH, expand=True)
 
-    # Save the original stdout and stderr.
-    original_stdout = sys.stdout
-    original_stderr = sys.stderr
+    button_frame = Frame(progress_window)
+    button_frame.pack(pady=5)
+    cancel_btn = Button(button_frame, text="Cancel")
+    cancel_btn.pack(side=LEFT, padx=5)
+    resume_btn = Button(button_frame, text="Resume", state="disabled")
+    resume_btn.pack(side=LEFT, padx=5)
+    Button(button_frame, text="Close", command=lambda: close()).pack(side=LEFT, padx=5)
+
+    state = {"runner": runner}
+
+    def redraw_charts():
+        epochs = state["runner"].epochs
+        _draw_series(loss_canvas, "Train loss", [
+            ("total", "red", [e.get("loss") for e in epochs]),
+        ] + [
+            (key.split("/")[-1], color, [e.get("losses", {}).get(key) for e in epochs])
+            for key, color in zip(sorted(epochs[-1].get("losses", {})) if epochs else [],
+                                  ("blue", "green", "orange", "purple"))
+        ])
+        _draw_series(map_canvas, "Validation mAP", [
+            ("mAP50", "blue", [e.get("map50") for e in epochs]),
+            ("mAP50-95", "green", [e.get("map50_95") for e in epochs]),
+        ])
+
+    def append_log(lines):
+        if not lines:
+            return
+        text_widget.insert(END, "\n".join(lines) + "\n")
+        excess = int(text_widget.index("end-1c").split(".")[0]) - max_log_lines
+        if excess > 0:
+            text_widget.delete("1.0", f"{excess + 1}.0")
+        text_widget.see(END)
+
+    def update():
+        if not progress_window.winfo_exists():
+            return
+        current = state["runner"]
+        new_lines, new_epochs, finished = current.poll()
+        append_log(new_lines)
+        if new_epochs:
+            e = new_epochs[-1]
+            map50 = e.get("map50")
+            summary_label.config(text=(
+                f"Epoch {e['epoch']}/{e['epochs']}   loss {e['loss']:.4f}   "
+                f"mAP50 {map50 if map50 is None else format(map50, '.4f')}   "
+                f"epoch time {e['epoch_time']:.1f}s   {e['images_per_sec']:.1f} images/sec"))
+            redraw_charts()
+        if finished:
+            cancel_btn.config(state="disabled")
+            if current.error:
+                summary_label.config(text=f"Training failed: {current.error}")
+            elif current.cancelled:
+                summary_label.config(text="Training cancelled.")
+            else:
+                summary_label.config(text=f"Training completed. Best weights: {current.best_weights}")
+            if current.can_resume() and (current.cancelled or current.error):
+                resume_btn.config(state="normal")
+            return
+        progress_window.after(250, update)
+
+    def cancel():
+        state["runner"].cancel()
+        summary_label.config(text="Cancelling training...")
+        cancel_btn.config(state="disabled")
+
+    def resume():
+        state["runner"] = state["runner"].resume_runner()
+        resume_btn.config(state="disabled")
+        cancel_btn.config(state="normal")
+        append_log(["--- Resuming from last checkpoint ---"])
+        state["runner"].start()
+        update()
+
+    def close():
+        if state["runner"].is_running():
+            if not messagebox.askyesno("Training", "Training is still running. Cancel it and close?",
+                                       parent=progress_window):
+                return
+            state["runner"].cancel()
+        progress_window.destroy()
+
+    cancel_btn.config(command=cancel)
+    resume_btn.config(command=resume)
+    progress_window.protocol("WM_DELETE_WINDOW", close)
+    for chart in (loss_canvas, map_canvas):
+        chart.bind("<Configure>", lambda event: redraw_charts())
 
-    # Define the training function that will run in a separate thread.
-    def training_thread():
-        # Redirect stdout and stderr to our queue stream.
-        sys.stdout = QueueStream(log_queue)
-        sys.stderr = QueueStream(log_queue)
-        try:
-            model = YOLO("yolo11s.yaml")
-            model.train(
-                data=dataset_file,
-                epochs=epochs,
-                imgsz=image_size,
-                batch=batch_size,
-                workers=num_workers,
-                lr0=learning_rate,
-                momentum=momentum,
-                weight_decay=weight_decay
-            )
-        except Exception as e:
-            print("Error during training:", e)
-        finally:
-            # Restore the original stdout and stderr.
-            sys.stdout = original_stdout
-            sys.stderr = original_stderr
-            print("Training completed.")
-
-    # Start the training in a new thread.
-    t = threading.Thread(target=training_thread)
-    t.start()
-
-    # Define a function that polls the log queue and updates the text widget.
-    def update_log():
-        try:
-            while True:
-                line = log_queue.get_nowait()
-                text_widget.insert(END, line)
-                text_widget.see(END)
-        except queue.Empty:
-            pass
-        # If the thread is still running, poll again after 100ms.
-        if t.is_alive():
-            progress_window.after(100, update_log)
-        else:
-            # Final update after thread completion.
-            progress_window.after(100, update_log)
-            # Optionally, add a button to allow the user to close the progress window.
-            Button(progress_window, text="Close", command=progress_window.destroy).pack()
-
-    # Start polling the log queue.
-    update_log()
+    try:
+        runner.start()
+    except OSError as e:
+        summary_label.config(text=f"Could not start training: {e}")
+        return
+    update()
 
 
 def test_model_ui(app):
@@ -186,7 +383,7 @@ def test_model_ui(app):
     an image is selected and the user clicks "Predict", the model predictions are
     overlaid on that image and displayed in the same window.
     """
-    if YOLO is None:
+    if get_yolo() is None:
         messagebox.showerror("Error", "Ultralytics package not installed!\nPlease run: pip install ultralytics")
         return
 
@@ -199,7 +396,7 @@ def test_model_ui(app):
         return
 
     try:
-        test_model = YOLO(model_file)
+        test_model = model_registry.get(model_file)
     except Exception as e:
         messagebox.showerror("Error", f"Could not load the model:\n{e}")
         return
@@ -210,11 +407,8 @@ def test_model_ui(app):
         return
 
     # Gather image files in the folder.
-    extensions = ("*.jpg", "*.jpeg", "*.png", "*.bmp", "*.tiff", "*.webp")
-    image_files = []
-    for ext in extensions:
-        image_files.extend(glob.glob(os.path.join(test_folder, ext)))
-    image_files.sort()
+    from .file_index import scan_images
+    image_files = scan_images(test_folder)
     if not image_files:
         messagebox.showerror("Error", "No image files found in the selected folder!")
         return
@@ -243,9 +437,6 @@ def test_model_ui(app):
     # Create right frame for the image preview.
     right_frame = Frame(win)
     right_frame.pack(side=RIGHT, fill=BOTH, expand=True, padx=5, pady=5)
-    canvas = app.canvas  # Reuse the main app's canvas, or create a new one if preferred.
-    # Here we create a new canvas inside the Toplevel:
-    canvas = app.__class__(win).canvas  # Alternative: create a fresh canvas; for clarity we create one below.
     canvas = Canvas(right_frame, bg="black")
     canvas.pack(fill=BOTH, expand=True)
 
@@ -289,7 +480,8 @@ def test_model_ui(app):
 
         # Run inference on the current image using the test_model.
         try:
-            results = test_model.predict(source=win.current_image_path, save=False, verbose=False)
+            with model_registry.call_lock(test_model), profiler.measure("ai.predict"):
+                results = test_model.predict(source=win.current_image_path, save=False, verbose=False)
         except Exception as e:
             messagebox.showerror("Error", f"Error during inference:\n{e}")
             return
@@ -320,10 +512,95 @@ def test_model_ui(app):
 
         # Update the canvas with the prediction image.
         display_image(pred_img)
-        messagebox.showinfo("Test Model", "Prediction complete for the selected image.")
+        status_label.config(text=f"Prediction complete for {os.path.basename(win.current_image_path)}.")
+
+    def evaluate_folder():
+        """Benchmark the model over the whole test folder against its ground-truth labels."""
+        from .evaluation import evaluate_folder as run_evaluation, format_report
+        import queue
+
+        batch_size = simpledialog.askinteger("Evaluate Folder", "Batch size", parent=win,
+                                             initialvalue=16, minvalue=1, maxvalue=256)
+        if batch_size is None:
+            return
+        image_size = simpledialog.askinteger("Evaluate Folder", "Image size (imgsz)", parent=win,
+                                             initialvalue=640, minvalue=128, maxvalue=2048)
+        if image_size is None:
+            return
 
-    predict_btn = Button(win, text="Predict", command=run_prediction)
-    predict_btn.pack(side="bottom", pady=10)
+        events = queue.Queue()
+        cancel_event = threading.Event()
+
+        def worker():
+            try:
+                report = run_evaluation(
+                    test_model, image_files, batch_size=batch_size, imgsz=image_size,
+                    progress_callback=lambda done, total: events.put(("progress", (done, total))),
+                    cancel_event=cancel_event, lock=model_registry.call_lock(test_model))
+                events.put(("done", report))
+            except Exception as e:
+                events.put(("error", e))
+
+        evaluate_btn.config(state="disabled")
+        predict_btn.config(state="disabled")
+        cancel_btn.config(command=cancel_event.set, state="normal")
+        win.bind("<Destroy>", lambda event: cancel_event.set(), add="+")
+        threading.Thread(target=worker, daemon=True).start()
+
+        def poll():
+            if not win.winfo_exists():
+                return
+            try:
+                while True:
+                    kind, payload = events.get_nowait()
+                    if kind == "progress":
+                        status_label.config(text=f"Evaluating... {payload[0]}/{payload[1]} images")
+                    else:
+                        evaluate_btn.config(state="normal")
+                        predict_btn.config(state="normal")
+                        cancel_btn.config(state="disabled")
+                        if kind == "error":
+                            status_label.config(text="Evaluation failed.")
+                            messagebox.showerror("Error", f"Error during evaluation:\n{payload}", parent=win)
+                        else:
+                            status_label.config(text="Evaluation complete.")
+                            show_report(payload, format_report(payload))
+                        return
+            except queue.Empty:
+                pass
+            win.after(200, poll)
+
+        poll()
+
+    def show_report(report, text):
+        report_win = Toplevel(win)
+        report_win.title(f"Evaluation - {os.path.basename(model_file)}")
+        report_win.geometry("700x500")
+        text_widget = Text(report_win, wrap="none", font=("Courier", 10))
+        text_widget.insert(END, text)
+        text_widget.config(state="disabled")
+        text_widget.pack(fill=BOTH, expand=True)
+
+        def save_json():
+            import json
+            out_file = filedialog.asksaveasfilename(parent=report_win, defaultextension=".json",
+                                                    filetypes=[("JSON files", "*.json")])
+            if out_file:
+                with open(out_file, "w") as f:
+                    json.dump(dict(report, model=model_file, folder=test_folder), f, indent=2)
+
+        Button(report_win, text="Save JSON", command=save_json).pack(pady=5)
+
+    button_frame = Frame(win)
+    button_frame.pack(side="bottom", pady=10)
+    predict_btn = Button(button_frame, text="Predict", command=run_prediction)
+    predict_btn.pack(side=LEFT, padx=5)
+    evaluate_btn = Button(button_frame, text="Evaluate Folder", command=evaluate_folder)
+    evaluate_btn.pack(side=LEFT, padx=5)
+    cancel_btn = Button(button_frame, text="Cancel", state="disabled")
+    cancel_btn.pack(side=LEFT, padx=5)
+    status_label = Label(win, text="")
+    status_label.pack(side="bottom")
 
     # Optionally, load the first image immediately.
     listbox.select_set(0)
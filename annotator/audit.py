@@ -0,0 +1,264 @@
+# annotator/audit.py
+"""
+Dataset-wide label audit: run a model over the annotated images and compare
+its detections with the annotations.
+
+    class_confusion  a confident detection overlaps an annotation of another class (error)
+    missing_object   a confident detection matches no annotation (warning)
+    false_label      an annotation that no detection overlaps at all (warning)
+
+Detections and annotations are matched class-agnostically by IoU, greedily in
+order of confidence, so a confusion is found as a match with different labels.
+Annotations of classes the model does not know are left out. Findings come
+back as quality.QAIssue, sorted by severity and then by how sure the model is.
+"""
+import contextlib
+import os
+
+from .quality import QAIssue, SEVERITY_ORDER
+
+MATCH_IOU = 0.5
+MISSING_CONFIDENCE = 0.5
+CONFUSION_CONFIDENCE = 0.5
+FALSE_LABEL_IOU = 0.1
+MIN_CONFIDENCE = 0.05
+
+
+def _annotation_box(ann):
+    xs, ys = ann["points"][0::2], ann["points"][1::2]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def audit_image(image_path, boxes, labels, confidences, annotations, known_labels=None,
+                match_iou=MATCH_IOU, missing_conf=MISSING_CONFIDENCE, confusion_conf=CONFUSION_CONFIDENCE):
+    """
+    Compare one image's detections (xyxy boxes, label names, confidences) with
+    its annotation dicts. Returns a list of (issue, score, payload) where
+    payload is the detection as an annotation dict, or None.
+    """
+    import numpy as np
+
+    from .geometry import box_iou
+
+    checked = [n for n, ann in enumerate(annotations)
+               if len(ann["points"]) >= 4 and (known_labels is None or ann["label"] in known_labels)]
+    order = np.argsort(-np.asarray(confidences, dtype=np.float64), kind="stable")
+    pred_boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)[order]
+    pred_conf = np.asarray(confidences, dtype=np.float64)[order]
+    pred_labels = [labels[i] for i in order]
+    gt_boxes = np.asarray([_annotation_box(annotations[n]) for n in checked], dtype=np.float64).reshape(-1, 4)
+    iou = box_iou(pred_boxes, gt_boxes)
+    # Detections on objects of classes the model does not know say nothing about the labels.
+    checked_set = set(checked)
+    unchecked = [_annotation_box(ann) for n, ann in enumerate(annotations)
+                 if n not in checked_set and len(ann["points"]) >= 4]
+    covered = (box_iou(pred_boxes, unchecked).max(axis=1) >= match_iou if unchecked
+               else np.zeros(len(pred_boxes), dtype=bool))
+
+    findings = []
+    gt_taken = np.zeros(len(checked), dtype=bool)
+    for i in range(len(pred_boxes)):
+        candidates = np.where(gt_taken, -1.0, iou[i]) if len(checked) else np.zeros(0)
+        j = int(np.argmax(candidates)) if len(candidates) else -1
+        detection = {"type": "bbox", "points": [int(v) for v in pred_boxes[i]], "label": pred_labels[i],
+                     "attributes": {"confidence": round(float(pred_conf[i]), 3)}}
+        if j >= 0 and candidates[j] >= match_iou:
+            gt_taken[j] = True
+            ann = annotations[checked[j]]
+            if ann["label"] != pred_labels[i] and pred_conf[i] >= confusion_conf:
+                findings.append((QAIssue(image_path, checked[j], "class_confusion", "error",
+                                         f"Labeled '{ann['label']}', model says '{pred_labels[i]}' "
+                                         f"({pred_conf[i]:.2f}, IoU {candidates[j]:.2f})"),
+                                 float(pred_conf[i]), detection))
+        elif pred_conf[i] >= missing_conf and not covered[i]:
+            x1, y1, x2, y2 = detection["points"]
+            findings.append((QAIssue(image_path, None, "missing_object", "warning",
+                                     f"Unlabeled '{pred_labels[i]}' ({pred_conf[i]:.2f}) at "
+                                     f"{x1},{y1}-{x2},{y2}"),
+                             float(pred_conf[i]), detection))
+    for j in np.flatnonzero(~gt_taken):
+        overlapping = iou[:, j] >= FALSE_LABEL_IOU if len(pred_boxes) else np.zeros(0, dtype=bool)
+        if overlapping.any():
+            continue
+        ann = annotations[checked[j]]
+        # Nothing was detected here even at MIN_CONFIDENCE; the more the model
+        # detects elsewhere in the image, the more telling the silence.
+        score = float(pred_conf.max()) if len(pred_conf) else 0.0
+        findings.append((QAIssue(image_path, checked[j], "false_label", "warning",
+                                 f"No detection overlaps this '{ann['label']}'"), score, None))
+    return findings
+
+
+def sort_findings(findings):
+    findings.sort(key=lambda f: (SEVERITY_ORDER[f[0].severity], -f[1], f[0].image_path))
+    return findings
+
+
+def audit_images(model, paths, annotation_store, batch_size=16, imgsz=640, progress_callback=None,
+                 cancel_event=None, lock=None, **thresholds):
+    """
+    Run model over paths in batches and audit each image; returns sorted (issue, score, payload) findings.
+    lock, if given, is held around each batch's inference (see ModelRegistry.call_lock).
+    """
+    from .inference import _label_for
+    from .profiling import profiler
+
+    names = getattr(model, "names", None) or {}
+    known_labels = set(names.values()) if isinstance(names, dict) else set(names)
+    findings = []
+    for start in range(0, len(paths), batch_size):
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        batch = [p for p in paths[start:start + batch_size] if os.path.isfile(p)]
+        with lock or contextlib.nullcontext(), profiler.measure("ai.audit_batch"):
+            results = model.predict(source=batch, imgsz=imgsz, conf=MIN_CONFIDENCE, save=False,
+                                    verbose=False) if batch else []
+        for path, result in zip(batch, results):
+            labels = [_label_for(model, int(c)) for c in result.boxes.cls.cpu().numpy().tolist()]
+            findings.extend(audit_image(path, result.boxes.xyxy.cpu().numpy(), labels,
+                                        result.boxes.conf.cpu().numpy(), annotation_store.get(path, []),
+                                        known_labels or None, **thresholds))
+        if progress_callback is not None:
+            progress_callback(min(start + batch_size, len(paths)), len(paths))
+    return sort_findings(findings)
+
+
+def audit_labels(app):
+    """Ask for a model, audit the annotated images in the background and list the findings."""
+    # Tk is imported here so the audit above also runs headless (see cli.py).
+    import queue
+    import threading
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+
+    from .inference import get_yolo, model_registry
+    from .quality import show_issues_window
+
+    if get_yolo() is None:
+        messagebox.showerror("Error", "Ultralytics package not installed!\nPlease run: pip install ultralytics")
+        return
+    app.store_current_annotations()
+    paths = [p for p in app.image_list if app.annotation_store.get(p)]
+    if not paths:
+        messagebox.showerror("Error", "There are no annotated images to audit.")
+        return
+
+    dialog = tk.Toplevel(app)
+    dialog.title("Audit Labels with Model")
+    form = ttk.Frame(dialog, padding=10)
+    form.pack(fill=tk.BOTH, expand=True)
+    ttk.Label(form, text="Model:").grid(row=0, column=0, sticky="w")
+    model_var = tk.StringVar(value=app.prelabel_model_path)
+    ttk.Entry(form, textvariable=model_var, width=45).grid(row=0, column=1, sticky="ew")
+    ttk.Button(form, text="...", width=3, command=lambda: model_var.set(
+        filedialog.askopenfilename(parent=dialog, filetypes=[("PyTorch Model Files", "*.pt"), ("All Files", "*.*")])
+        or model_var.get())).grid(row=0, column=2)
+    ttk.Label(form, text="Missing-object confidence:").grid(row=1, column=0, sticky="w")
+    conf_var = tk.DoubleVar(value=MISSING_CONFIDENCE)
+    ttk.Spinbox(form, from_=0.05, to=1.0, increment=0.05, textvariable=conf_var, width=6).grid(row=1, column=1,
+                                                                                               sticky="w")
+    ttk.Label(form, text="Match IoU:").grid(row=2, column=0, sticky="w")
+    iou_var = tk.DoubleVar(value=MATCH_IOU)
+    ttk.Spinbox(form, from_=0.1, to=0.95, increment=0.05, textvariable=iou_var, width=6).grid(row=2, column=1,
+                                                                                              sticky="w")
+    status = ttk.Label(form, text=f"{len(paths)} annotated images")
+    status.grid(row=4, column=0, columnspan=3, sticky="w", pady=5)
+    cancel_event = threading.Event()
+    dialog.bind("<Destroy>", lambda event: cancel_event.set() if event.widget is dialog else None, add="+")
+
+    def add_detection(issue, payload):
+        """Accept a missing object: add the detected box to the image's annotations."""
+        from .models import Annotation
+        app.goto_image(issue.image_path)
+        ann = Annotation.from_dict(dict(payload, attributes={}))
+        # Register a class the project does not have yet, as pre-labeling does.
+        if ann.label not in app.labels:
+            app.labels.append(ann.label)
+            app.update_class_buttons()
+        app.annotations.append(ann)
+        app.push_undo_state()
+        app.store_current_annotations()
+        app.redraw_canvas()
+
+    def show(findings):
+        issues = [issue for issue, _, _ in findings]
+        payloads = [payload for _, _, payload in findings]
+        win = show_issues_window(app, "Label Audit", issues)
+        accepted = set()
+
+        def acceptable(row):
+            return payloads[row] is not None and issues[row].kind == "missing_object" and row not in accepted
+
+        def on_select(event):
+            sel = win.issue_tree.selection()
+            accept_btn.state(["!disabled"] if sel and acceptable(int(sel[0])) else ["disabled"])
+            if sel and payloads[int(sel[0])] is not None:
+                # Outline the detection on the canvas next to the existing annotations.
+                x1, y1, x2, y2 = payloads[int(sel[0])]["points"]
+                c1, c2 = app.image_to_canvas(x1, y1), app.image_to_canvas(x2, y2)
+                app.canvas.delete("audit_detection")
+                app.canvas.create_rectangle(c1[0], c1[1], c2[0], c2[1], outline="magenta", width=2, dash=(4, 2),
+                                            tags="audit_detection")
+
+        def accept():
+            sel = win.issue_tree.selection()
+            if sel and acceptable(int(sel[0])):
+                row = int(sel[0])
+                # Once per finding; a second click would add the same box again.
+                accepted.add(row)
+                accept_btn.state(["disabled"])
+                add_detection(issues[row], payloads[row])
+                win.issue_tree.set(sel[0], "details", "(added) " + issues[row].message)
+
+        win.issue_tree.bind("<<TreeviewSelect>>", on_select, add="+")
+        accept_btn = ttk.Button(win, text="Add Detected Box (missing objects)", command=accept)
+        accept_btn.state(["disabled"])
+        accept_btn.pack(side=tk.BOTTOM, pady=5)
+
+    def run():
+        try:
+            model = model_registry.get(model_var.get())
+            thresholds = {"missing_conf": float(conf_var.get()), "match_iou": float(iou_var.get())}
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not start the audit:\n{e}", parent=dialog)
+            return
+        store = {p: list(app.annotation_store[p]) for p in paths}
+        events = queue.Queue()
+
+        def worker():
+            try:
+                findings = audit_images(model, paths, store,
+                                        progress_callback=lambda done, total: events.put(("progress", (done, total))),
+                                        cancel_event=cancel_event, lock=model_registry.call_lock(model),
+                                        **thresholds)
+                events.put(("done", findings))
+            except Exception as e:
+                events.put(("error", e))
+
+        run_btn.state(["disabled"])
+        threading.Thread(target=worker, daemon=True).start()
+
+        def poll():
+            if not dialog.winfo_exists():
+                return
+            try:
+                while True:
+                    kind, payload = events.get_nowait()
+                    if kind == "progress":
+                        status.config(text=f"Auditing... {payload[0]}/{payload[1]} images")
+                    elif kind == "error":
+                        run_btn.state(["!disabled"])
+                        messagebox.showerror("Error", f"Audit failed:\n{payload}", parent=dialog)
+                        return
+                    else:
+                        dialog.destroy()
+                        show(payload)
+                        return
+            except queue.Empty:
+                pass
+            dialog.after(200, poll)
+
+        poll()
+
+    run_btn = ttk.Button(form, text="Run Audit", command=run)
+    run_btn.grid(row=3, column=0, columnspan=3, pady=10)
@@ -0,0 +1,344 @@
+# annotator/batch.py
+"""
+Headless batch operations on projects, used by cli.py and usable from scripts.
+Nothing here imports Tk. Every operation takes a project dict (see project.py),
+a number of workers and an optional progress_callback(done, total).
+
+Workers are threads: the parallel parts read image headers, decode images and
+write label files, all of which release the GIL. Mask rasterization, which is
+CPU-bound Python and NumPy work, runs in worker processes instead.
+"""
+import json
+import multiprocessing
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .models import Annotation
+from .utils import get_image_size
+
+
+def parallel_map(fn, items, workers=1, progress_callback=None, processes=False):
+    """
+    Apply fn to every item and return the results in order. At most
+    2 * workers items are in flight, so huge item lists do not pile up futures.
+    With processes=True the workers are processes, for CPU-bound work that
+    holds the GIL; fn must then be a module-level function and items picklable.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    if workers <= 1 or len(items) <= 1:
+        for i, item in enumerate(items):
+            results[i] = fn(item)
+            if progress_callback is not None:
+                progress_callback(i + 1, len(items))
+        return results
+    if processes:
+        # "spawn" children do not inherit the parent's threads (e.g. a running Tk app).
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+    with pool:
+        pending = deque()
+        done = 0
+        for i, item in enumerate(items):
+            pending.append((i, pool.submit(fn, item)))
+            if len(pending) >= 2 * workers:
+                j, future = pending.popleft()
+                results[j] = future.result()
+                done += 1
+                if progress_callback is not None:
+                    progress_callback(done, len(items))
+        while pending:
+            j, future = pending.popleft()
+            results[j] = future.result()
+            done += 1
+            if progress_callback is not None:
+                progress_callback(done, len(items))
+    return results
+
+
+def collect_image_sizes(paths, image_sizes=None, workers=1, progress_callback=None):
+    """Read (width, height) from the headers of the images not yet in image_sizes; unreadable files are skipped."""
+    image_sizes = {} if image_sizes is None else image_sizes
+    missing = [p for p in paths if p not in image_sizes]
+
+    def read(path):
+        try:
+            return get_image_size(path)
+        except OSError:
+            return None
+
+    for path, size in zip(missing, parallel_map(read, missing, workers, progress_callback)):
+        if size is not None:
+            image_sizes[path] = size
+    return image_sizes
+
+
+def project_summary(project):
+    store = project["annotation_store"]
+    per_class = Counter(ann["label"] for anns in store.values() for ann in anns)
+    per_type = Counter(ann["type"] for anns in store.values() for ann in anns)
+    return {
+        "images": len(project["image_list"]),
+        "annotated_images": sum(1 for p in project["image_list"] if store.get(p)),
+        "annotations": sum(per_class.values()),
+        "labels": project["labels"],
+        "per_class": dict(per_class),
+        "per_type": dict(per_type),
+    }
+
+
+# Import
+
+def _label_name(class_id, names):
+    return names[class_id] if 0 <= class_id < len(names) else f"class_{class_id}"
+
+
+def read_label_files(image_path, image_size, names):
+    """
+    Read the annotations exported for an image: <name>_mask.json (Mask R-CNN
+    format, polygons) if present, otherwise the YOLO <name>.txt. Returns a list
+    of annotation dicts, or None when the image has no label file.
+    """
+    from .evaluation import find_label_file, load_yolo_labels
+
+    image_dir, filename = os.path.split(image_path)
+    mask_file = os.path.join(image_dir, "labels", os.path.splitext(filename)[0] + "_mask.json")
+    if os.path.isfile(mask_file):
+        with open(mask_file) as f:
+            data = json.load(f)
+        anns = []
+        for item in data.get("annotations", []):
+            label = _label_name(int(item.get("category_id", -1)), names)
+            points = item["segmentation"][0] if item.get("segmentation") else []
+            if len(points) == 8 and points[0] == points[6] and points[1] == points[3]:
+                # Boxes are written as 4-corner rectangles; read them back as boxes.
+                anns.append({"type": "bbox", "points": [points[0], points[1], points[4], points[5]],
+                             "label": label, "attributes": {}})
+            elif len(points) >= 6:
+                anns.append({"type": "polygon", "points": list(points), "label": label, "attributes": {}})
+        return anns
+    label_file = find_label_file(image_path)
+    if label_file is None:
+        return None
+    boxes, classes = load_yolo_labels(label_file, *image_size)
+    return [{"type": "bbox", "points": [int(round(v)) for v in box], "label": _label_name(int(cls), names),
+             "attributes": {}} for box, cls in zip(boxes.tolist(), classes.tolist())]
+
+
+def import_images(project, folder, recursive=True, import_labels=True, class_names=None, overwrite=False,
+                  workers=1, progress_callback=None):
+    """
+    Add the images below folder to the project and, with import_labels, read
+    their existing YOLO / Mask R-CNN label files into the annotation store.
+    YOLO class ids are named after class_names, else the project labels, else
+    class_<id>. Images that already have annotations keep them unless overwrite.
+    """
+    from .file_index import scan_images
+
+    paths = scan_images(folder, recursive=recursive)
+    known = set(project["image_list"])
+    added = [p for p in paths if p not in known]
+    project["image_list"].extend(added)
+    stats = {"images_found": len(paths), "images_added": len(added), "label_files": 0, "annotations": 0}
+    if not import_labels:
+        return stats
+
+    store = project["annotation_store"]
+    targets = [p for p in paths if overwrite or not store.get(p)]
+    if class_names:
+        names = list(class_names)
+    else:
+        from .class_index import class_names as names_by_id, export_ids
+        names = names_by_id(export_ids(project["labels"], project["class_ids"]))
+
+    def read(path):
+        try:
+            return read_label_files(path, get_image_size(path), names)
+        except (OSError, ValueError, KeyError, IndexError):
+            return None
+
+    for path, anns in zip(targets, parallel_map(read, targets, workers, progress_callback)):
+        if anns is None:
+            continue
+        store[path] = anns
+        stats["label_files"] += 1
+        stats["annotations"] += len(anns)
+        for ann in anns:
+            if ann["label"] not in project["labels"]:
+                project["labels"].append(ann["label"])
+    return stats
+
+
+# Export
+
+def export_project(project, workers=1, progress_callback=None):
+    """
+    Write the label file of every image in the annotation store (the same
+    files as Save Annotations in the GUI). Returns a Counter of written formats.
+    """
+    from .class_index import export_ids
+    from .export_tools import write_yolo_annotations
+
+    store = project["annotation_store"]
+    labels = project["labels"]
+    class_ids = export_ids(labels, project["class_ids"])
+    listed = set(project["image_list"])
+    paths = [p for p in project["image_list"] if p in store] + [p for p in store if p not in listed]
+
+    def export(path):
+        try:
+            size = get_image_size(path)
+        except OSError:
+            return "missing_image"
+        anns = [Annotation.from_dict(d) for d in store[path]]
+        return write_yolo_annotations(path, anns, labels, size, class_ids)[1]
+
+    return Counter(parallel_map(export, paths, workers, progress_callback))
+
+
+def export_mask_pngs(project, out_dir, workers=1, force=False, progress_callback=None):
+    """Write class and instance mask PNGs of the project (see mask_export.write_mask_pngs)."""
+    from .class_index import export_ids
+    from .mask_export import write_mask_pngs
+
+    return write_mask_pngs(project["image_list"], project["annotation_store"], project["labels"], out_dir,
+                           workers=workers, force=force, class_ids=export_ids(project["labels"], project["class_ids"]),
+                           progress_callback=progress_callback)
+
+
+# Pre-labeling
+
+def prelabel_project(project, weights, conf=0.25, tiled=False, tile_size=640, overlap=0.2, batch_size=8,
+                     only_empty=True, replace=False, workers=1, progress_callback=None):
+    """
+    Run a detection model over the project images and add its boxes as
+    annotations. Images are decoded by the worker threads while the model
+    runs; without tiling, batch_size images go through the model at once.
+    only_empty skips images that already have annotations; otherwise new boxes
+    are appended, or replace the existing ones with replace=True.
+    Returns the number of boxes added.
+    """
+    import cv2
+
+    from .inference import _label_for, model_registry, sliced_predict
+
+    model = model_registry.get(weights)
+    store = project["annotation_store"]
+    paths = [p for p in project["image_list"] if not (only_empty and store.get(p))]
+    total, added, done = len(paths), 0, 0
+
+    def add(path, boxes, classes):
+        anns = [] if replace else list(store.get(path, []))
+        for (x1, y1, x2, y2), cls_id in zip(boxes, classes):
+            label = _label_for(model, int(cls_id))
+            if label not in project["labels"]:
+                project["labels"].append(label)
+            anns.append({"type": "bbox", "points": [int(x1), int(y1), int(x2), int(y2)], "label": label,
+                         "attributes": {}})
+        store[path] = anns
+        return len(boxes)
+
+    chunk = batch_size if not tiled else max(1, workers)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        # Decode the next chunk while the model works on the current one.
+        next_images = pool.map(cv2.imread, paths[:chunk])
+        for start in range(0, total, chunk):
+            batch_paths = paths[start:start + chunk]
+            images = list(next_images)
+            next_images = pool.map(cv2.imread, paths[start + chunk:start + 2 * chunk])
+            valid = [(p, img) for p, img in zip(batch_paths, images) if img is not None]
+            if tiled:
+                for path, img in valid:
+                    boxes, _, classes = sliced_predict(model, img, tile_size=tile_size, overlap=overlap,
+                                                       batch_size=batch_size, conf=conf)
+                    added += add(path, boxes.astype(int), classes)
+            elif valid:
+                results = model([img for _, img in valid], conf=conf, verbose=False)
+                for (path, _), result in zip(valid, results):
+                    boxes = result.boxes.xyxy.cpu().numpy().astype(int)
+                    classes = result.boxes.cls.cpu().numpy().astype(int)
+                    added += add(path, boxes, classes)
+            done += len(batch_paths)
+            if progress_callback is not None:
+                progress_callback(done, total)
+    return added
+
+
+def rank_project(project, weights, method="least_confidence", batch_size=16, imgsz=640, progress_callback=None):
+    """
+    Rank the open images of the project by model uncertainty and store the
+    ranking in project["active_queue"], which Next Image follows in the GUI
+    (see active_learning.py). Completion is not saved in project files, so
+    every unannotated image is a candidate (with "disagreement", every image).
+    Returns the (path, score, detections) list.
+    """
+    from .active_learning import ActiveQueue, candidate_images, rank_images
+    from .inference import model_registry
+
+    model = model_registry.get(weights)
+    store = project["annotation_store"]
+    paths = candidate_images(project["image_list"], store, {}, method)
+    ranking = rank_images(model, paths, method, store, batch_size=batch_size, imgsz=imgsz,
+                          progress_callback=progress_callback)
+    project["active_queue"] = ActiveQueue([(p, s) for p, s, _ in ranking], method, weights).to_dict()
+    return ranking
+
+
+# Quality checks and splitting
+
+def check_project(project, iou_threshold=0.9, image_sizes=None, workers=1, progress_callback=None):
+    """Run the quality checks of Tools -> Quality Check over the whole project; returns the QAIssue list."""
+    from .quality import run_quality_checks
+
+    store = project["annotation_store"]
+    annotated = [p for p, anns in store.items() if anns]
+    image_sizes = collect_image_sizes(annotated, image_sizes, workers, progress_callback)
+    return run_quality_checks(store, project["labels"], {p: image_sizes[p] for p in annotated if p in image_sizes},
+                              iou_threshold)
+
+
+def find_project_duplicates(project, workers=1, progress_callback=None, **thresholds):
+    """
+    Hash the project images and store the near-duplicate map in
+    project["duplicate_of"] (see dedup.py). Returns the groups.
+    """
+    from .dedup import compute_hashes, duplicate_map, find_duplicate_groups
+
+    paths = project["image_list"]
+    hashes = compute_hashes(paths, workers=workers, progress_callback=progress_callback)
+    groups = find_duplicate_groups(hashes, order=paths, **thresholds)
+    project["duplicate_of"] = duplicate_map(groups, project["annotation_store"])
+    return groups
+
+
+def audit_project(project, weights, batch_size=16, imgsz=640, progress_callback=None, **thresholds):
+    """Compare a model's detections with the annotations of every annotated image (see audit.py)."""
+    from .audit import audit_images
+    from .inference import model_registry
+
+    store = project["annotation_store"]
+    paths = [p for p in project["image_list"] if store.get(p)]
+    return audit_images(model_registry.get(weights), paths, store, batch_size=batch_size, imgsz=imgsz,
+                        progress_callback=progress_callback, **thresholds)
+
+
+def split_dataset_files(project, out_dir, ratios=(0.8, 0.1, 0.1), group_mode="none", link_mode="hardlink",
+                        seed=0, image_sizes=None, exclude_duplicates=False, workers=1, progress_callback=None):
+    """
+    Write a train/val/test YOLO dataset of the project (see dataset_tools.split_project).
+    exclude_duplicates leaves out the images in project["duplicate_of"].
+    """
+    from .class_index import export_ids
+    from .dataset_tools import split_project
+
+    store = project["annotation_store"]
+    exclude = set(project.get("duplicate_of", {})) if exclude_duplicates else set()
+    annotated = [p for p in project["image_list"] if store.get(p) and p not in exclude]
+    # Image headers are read in parallel up front; split_project then only links files.
+    image_sizes = collect_image_sizes(annotated, image_sizes, workers)
+    return split_project(project["image_list"], store, project["labels"], out_dir, ratios,
+                         group_mode=group_mode, link_mode=link_mode, seed=seed, image_sizes=image_sizes,
+                         exclude=exclude, class_ids=export_ids(project["labels"], project["class_ids"]),
+                         progress_callback=progress_callback)
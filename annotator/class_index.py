@@ -0,0 +1,270 @@
+# annotator/class_index.py
+"""
+Dataset-wide class operations: a class -> image inverted index over the
+annotation store, rename / merge / delete of a class together with its
+annotations, and stable class ids.
+
+The index maps every label to {image path: number of annotations}. Annotation
+lists in the store are replaced, never changed in place, so refresh() only
+re-reads the images whose list object changed since they were indexed, and a
+rename, merge or delete touches only the images that contain the class.
+
+Class ids (the YOLO class number, the mask pixel value) are kept in the
+project's class_ids: a class keeps its id when other classes are removed or
+the class list is reordered, new classes get the next unused id and the ids
+of removed classes are not given out again.
+"""
+
+
+def assign_class_ids(labels, class_ids):
+    """Give the labels that have no id yet the next unused ids; updates and returns class_ids."""
+    next_id = max(class_ids.values(), default=-1) + 1
+    for label in labels:
+        if label not in class_ids:
+            class_ids[label] = next_id
+            next_id += 1
+    return class_ids
+
+
+def export_ids(labels, class_ids):
+    """{label: id} of the classes in the class list, for the exporters."""
+    assign_class_ids(labels, class_ids)
+    return {label: class_ids[label] for label in labels}
+
+
+def class_names(ids):
+    """Class names indexed by id (dataset.yaml, classes.txt); ids of removed classes are 'unused_<id>'."""
+    names = [f"unused_{i}" for i in range(max(ids.values(), default=-1) + 1)]
+    for label, i in ids.items():
+        names[i] = label
+    return names
+
+
+class ClassIndex:
+    """Which images use which label, kept up to date from the annotation store with refresh()."""
+
+    def __init__(self):
+        self.images = {}   # label -> {image path: annotation count}
+        self.indexed = {}  # image path -> the annotation list that was indexed
+
+    def _count(self, path, anns, sign):
+        for ann in anns:
+            per_image = self.images.setdefault(ann["label"], {})
+            count = per_image.get(path, 0) + sign
+            if count:
+                per_image[path] = count
+            else:
+                del per_image[path]
+                if not per_image:
+                    del self.images[ann["label"]]
+
+    def refresh(self, annotation_store):
+        """Re-index the images whose annotation list was replaced since the last refresh."""
+        indexed = self.indexed
+        for path, anns in annotation_store.items():
+            if indexed.get(path) is not anns:
+                self.reindex(path, anns)
+        if len(indexed) != len(annotation_store):
+            for path in [p for p in indexed if p not in annotation_store]:
+                self._count(path, indexed.pop(path), -1)
+        return self
+
+    def reindex(self, path, anns):
+        """Index the new annotation list of one image right away (cheaper than a refresh of the whole store)."""
+        old = self.indexed.get(path)
+        if old is not None:
+            self._count(path, old, -1)
+        self._count(path, anns, 1)
+        self.indexed[path] = anns
+
+    def images_with(self, label):
+        return list(self.images.get(label, ()))
+
+    def annotation_counts(self):
+        """{label: (images, annotations)} of every label used in the store."""
+        return {label: (len(per_image), sum(per_image.values())) for label, per_image in self.images.items()}
+
+
+def _relabel(annotation_store, index, label, new_label):
+    """Give the annotations of label new_label, or drop them when new_label is None."""
+    index.refresh(annotation_store)
+    paths = index.images_with(label)
+    changed = 0
+    for path in paths:
+        anns = annotation_store[path]
+        if new_label is None:
+            kept = [ann for ann in anns if ann["label"] != label]
+            changed += len(anns) - len(kept)
+        else:
+            kept = [dict(ann, label=new_label) if ann["label"] == label else ann for ann in anns]
+            changed += sum(1 for ann in anns if ann["label"] == label)
+        annotation_store[path] = kept
+        index.reindex(path, kept)
+    return len(paths), changed
+
+
+def rename_class(annotation_store, labels, class_ids, index, old, new):
+    """
+    Rename class old to new in the class list and in all annotations; when new
+    is already a class, old is merged into it. A renamed class keeps its id.
+    Returns (images, annotations) changed.
+    """
+    if old == new:
+        return 0, 0
+    result = _relabel(annotation_store, index, old, new)
+    if old in labels:
+        if new in labels:
+            labels.remove(old)
+        else:
+            labels[labels.index(old)] = new
+            if old in class_ids:
+                class_ids[new] = class_ids.pop(old)
+    elif new not in labels:
+        labels.append(new)
+    return result
+
+
+def delete_class(annotation_store, labels, index, label):
+    """Remove class label from the class list together with its annotations. Returns (images, annotations) removed."""
+    result = _relabel(annotation_store, index, label, None)
+    if label in labels:
+        labels.remove(label)
+    return result
+
+
+def _after_class_change(app):
+    """Reload the current image from the store and refresh everything that shows classes."""
+    from .models import Annotation
+
+    app.annotations = [Annotation.from_dict(d) for d in app.annotation_store.get(app.image_path, [])]
+    # Dataset-wide changes are not undoable per image; stale undo states would bring old labels back.
+    app.undo_stack = []
+    app.redo_stack = []
+    app.selected_annotation = None
+    if app.selected_class not in app.labels:
+        app.selected_class = app.labels[0] if app.labels else None
+    app.update_class_buttons()
+    app.update_image_filter_choices()
+    app.apply_image_filter()
+    app.redraw_canvas()
+
+
+def _blocked_by_sync(app, parent=None):
+    """
+    Renaming, merging and removing classes rewrite annotations of the whole project, which the
+    annotation server only learns about image by image and would undo with its own class list.
+    They are refused while connected; adding a class is synced and stays allowed.
+    """
+    from tkinter import messagebox
+
+    if getattr(app, "sync_session", None) is None:
+        return False
+    messagebox.showerror("Error", "Classes cannot be renamed, merged or removed while connected to an "
+                                  "annotation server.\nUse File -> Disconnect from Server first.", parent=parent)
+    return True
+
+
+def confirm_delete_class(app, label, parent=None):
+    """Ask, then remove label and its annotations from the whole project. Returns True when removed."""
+    from tkinter import messagebox
+
+    if _blocked_by_sync(app, parent):
+        return False
+    app.store_current_annotations()
+    images, annotations = app.class_index.refresh(app.annotation_store).annotation_counts().get(label, (0, 0))
+    if annotations and not messagebox.askyesno(
+            "Remove Class", f"Remove class '{label}' and its {annotations} annotations in {images} images?\n"
+                            "This cannot be undone.", parent=parent):
+        return False
+    delete_class(app.annotation_store, app.labels, app.class_index, label)
+    _after_class_change(app)
+    return True
+
+
+def manage_classes(app):
+    """The Manage Classes dialog: counts per class, add, rename, merge, remove and show images."""
+    import tkinter as tk
+    from tkinter import messagebox, simpledialog, ttk
+
+    app.store_current_annotations()
+    dialog = tk.Toplevel(app)
+    dialog.title("Manage Classes")
+    dialog.geometry("460x380")
+    tree = ttk.Treeview(dialog, columns=("id", "images", "annotations"), show="tree headings", selectmode="browse")
+    tree.heading("#0", text="Class")
+    tree.heading("id", text="Id")
+    tree.heading("images", text="Images")
+    tree.heading("annotations", text="Annotations")
+    tree.column("#0", width=180)
+    for column in ("id", "images", "annotations"):
+        tree.column(column, width=80, anchor="e")
+    tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+    def refresh():
+        app.store_current_annotations()
+        counts = app.class_index.refresh(app.annotation_store).annotation_counts()
+        assign_class_ids(app.labels, app.class_ids)
+        tree.delete(*tree.get_children())
+        for label in app.labels:
+            images, annotations = counts.get(label, (0, 0))
+            tree.insert("", "end", iid=label, text=label, values=(app.class_ids[label], images, annotations))
+        # Labels used by annotations but missing from the class list (e.g. removed before this dialog existed).
+        for label in sorted(set(counts) - set(app.labels)):
+            images, annotations = counts[label]
+            tree.insert("", "end", iid=label, text=f"{label} (not in class list)", values=("", images, annotations))
+
+    def selected():
+        sel = tree.selection()
+        return sel[0] if sel else None
+
+    def add_class():
+        name = simpledialog.askstring("Add Class", "Class name:", parent=dialog)
+        name = name.strip() if name else ""
+        if name and name not in app.labels:
+            app.labels.append(name)
+            _after_class_change(app)
+            refresh()
+
+    def rename(merge):
+        label = selected()
+        if label is None or _blocked_by_sync(app, dialog):
+            return
+        if merge:
+            targets = [lab for lab in app.labels if lab != label]
+            new = simpledialog.askstring("Merge Class", f"Merge '{label}' into which class?\n" + ", ".join(targets),
+                                         parent=dialog)
+            if new and new.strip() not in targets:
+                messagebox.showerror("Error", f"'{new.strip()}' is not a class.", parent=dialog)
+                return
+        else:
+            new = simpledialog.askstring("Rename Class", f"New name for '{label}':", initialvalue=label, parent=dialog)
+            if new and new.strip() in app.labels and new.strip() != label and not messagebox.askyesno(
+                    "Rename Class", f"'{new.strip()}' exists already. Merge '{label}' into it?", parent=dialog):
+                return
+        new = new.strip() if new else ""
+        if not new or new == label:
+            return
+        app.store_current_annotations()
+        images, annotations = rename_class(app.annotation_store, app.labels, app.class_ids, app.class_index,
+                                           label, new)
+        _after_class_change(app)
+        refresh()
+        app.system_message_label.config(text=f"'{label}' -> '{new}': {annotations} annotations in {images} images.")
+
+    def remove():
+        label = selected()
+        if label is not None and confirm_delete_class(app, label, parent=dialog):
+            refresh()
+
+    def show_images():
+        label = selected()
+        if label is not None:
+            app.image_filter_var.set(f"Has class: {label}")
+            app.apply_image_filter()
+
+    buttons = ttk.Frame(dialog, padding=5)
+    buttons.pack(fill=tk.X)
+    for text, command in (("Add", add_class), ("Rename", lambda: rename(False)), ("Merge Into...", lambda: rename(True)),
+                          ("Remove", remove), ("Show Images", show_images)):
+        ttk.Button(buttons, text=text, command=command).pack(side=tk.LEFT, padx=2)
+    refresh()
@@ -0,0 +1,311 @@
+# annotator/dataset_tools.py
+import hashlib
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+
+import numpy as np
+
+from .utils import get_image_size
+
+SPLITS = ("train", "val", "test")
+GROUP_MODES = ("none", "folder", "video")
+LINK_MODES = ("hardlink", "symlink", "copy")
+
+# A frame number needs a separator and a name with a non-digit before it (clip_0001, not IMG0001 or 000123).
+_FRAME_SUFFIX = re.compile(r"^(.*[^_\-. ])[_\-. ]\d+$")
+_NAME_CHAR = re.compile(r"[^\d_\-. ]")
+
+
+def group_key(image_path, mode):
+    """
+    Key of the group an image belongs to. Images of one group always land in the
+    same split: "none" (the default) keeps every image on its own, "folder"
+    groups by directory, "video" additionally strips a trailing frame number
+    so frame_0001.png and frame_0002.png stay together. "video" is meant for
+    folders of extracted frames; in a photo folder it would also join
+    IMG_0001.jpg and IMG_0002.jpg.
+    """
+    if mode == "folder":
+        return os.path.dirname(os.path.abspath(image_path))
+    if mode == "video":
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        match = _FRAME_SUFFIX.match(stem)
+        prefix = match.group(1) if match and _NAME_CHAR.search(match.group(1)) else stem
+        return os.path.join(os.path.dirname(os.path.abspath(image_path)), prefix)
+    return image_path
+
+
+def stratified_assign(class_counts, ratios, seed=0):
+    """
+    Assign groups to splits so that every class is spread according to ratios.
+    class_counts: (num_groups, num_classes) array of annotation counts per group.
+    Uses greedy iterative stratification: groups holding the rarest classes are
+    placed first, each into the split that still lacks most of that class.
+    Returns an array with the split index of every group.
+    """
+    rng = np.random.default_rng(seed)
+    ratios = np.asarray(ratios, dtype=np.float64)
+    ratios = ratios / ratios.sum()
+    num_groups, num_classes = class_counts.shape
+    present = class_counts > 0
+    desired = np.outer(ratios, class_counts.sum(axis=0)).astype(np.float64)  # (splits, classes)
+    desired_groups = ratios * num_groups
+    frequency = present.sum(axis=0)
+    # Rarest class of each group; groups without annotations sort last.
+    rarity = np.where(present, frequency[None, :], np.iinfo(np.int64).max)
+    rarest = rarity.argmin(axis=1) if num_classes else np.zeros(num_groups, dtype=int)
+    rarest_freq = rarity.min(axis=1) if num_classes else np.zeros(num_groups)
+    order = np.lexsort((rng.random(num_groups), -class_counts.sum(axis=1), rarest_freq))
+    disabled = ratios <= 0
+    assignment = np.full(num_groups, -1, dtype=int)
+    for g in order:
+        if num_classes and present[g].any():
+            need = np.where(disabled, -np.inf, desired[:, rarest[g]])
+            candidates = np.flatnonzero(need == need.max())
+        else:
+            candidates = np.flatnonzero(~disabled)
+        if len(candidates) > 1:
+            candidates = candidates[desired_groups[candidates] == desired_groups[candidates].max()]
+        split = int(candidates[0]) if len(candidates) == 1 else int(rng.choice(candidates))
+        assignment[g] = split
+        desired[split] -= class_counts[g]
+        desired_groups[split] -= 1
+    return assignment
+
+
+def _place_file(src, dst, link_mode):
+    """Hardlink, symlink or copy src to dst, falling back to the next option on failure."""
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        # dst is src itself (splitting in place) or already a hardlink to it; removing it could lose the image.
+        return "hardlink"
+    if os.path.lexists(dst):
+        os.remove(dst)
+    modes = LINK_MODES[LINK_MODES.index(link_mode):]
+    for mode in modes:
+        try:
+            if mode == "hardlink":
+                os.link(src, dst)
+            elif mode == "symlink":
+                os.symlink(os.path.abspath(src), dst)
+            else:
+                shutil.copy2(src, dst)
+            return mode
+        except (OSError, NotImplementedError):
+            if mode == "copy":
+                raise
+
+
+def yolo_label_lines(annotations, class_ids, width, height):
+    """Convert annotation dicts to YOLO detection label lines; polygons use their bounding box."""
+    lines = []
+    for ann in annotations:
+        if ann["label"] not in class_ids:
+            continue
+        xs, ys = ann["points"][0::2], ann["points"][1::2]
+        x1, x2 = max(min(xs), 0), min(max(xs), width)
+        y1, y2 = max(min(ys), 0), min(max(ys), height)
+        if x2 <= x1 or y2 <= y1:
+            continue
+        lines.append(f"{class_ids[ann['label']]} {(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+                     f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}")
+    return lines
+
+
+def write_dataset_yaml(out_dir, names, splits):
+    """Write the dataset.yaml consumed by ultralytics (and train_custom_model)."""
+    yaml_path = os.path.join(out_dir, "dataset.yaml")
+    with open(yaml_path, "w") as f:
+        f.write(f"path: {json.dumps(os.path.abspath(out_dir))}\n")
+        for split in splits:
+            f.write(f"{split}: images/{split}\n")
+        f.write("names:\n")
+        for class_id, name in names.items():
+            f.write(f"  {class_id}: {json.dumps(name)}\n")
+    return yaml_path
+
+
+def split_project(image_list, annotation_store, labels, out_dir, ratios=(0.8, 0.1, 0.1),
+                  group_mode="none", link_mode="hardlink", seed=0, image_sizes=None, exclude=None,
+                  class_ids=None, progress_callback=None):
+    """
+    Split the annotated images of a project into train/val/test and write a
+    YOLO dataset: images/<split>/ (linked, not copied), labels/<split>/ and
+    dataset.yaml. Images are processed one at a time; only their headers are
+    read to normalize coordinates. Images in exclude (e.g. near-duplicates,
+    which would leak between train and val) are left out. class_ids maps
+    labels to YOLO class ids (default: position in labels). Returns a summary dict.
+    """
+    from .class_index import class_names
+
+    image_sizes = {} if image_sizes is None else image_sizes
+    exclude = set(exclude or ())
+    images = [p for p in image_list if annotation_store.get(p) and p not in exclude]
+    if class_ids is None:
+        class_ids = {label: i for i, label in enumerate(labels)}
+    keys = [group_key(p, group_mode) for p in images]
+    group_index = {}
+    for key in keys:
+        group_index.setdefault(key, len(group_index))
+    counts = np.zeros((len(group_index), max(class_ids.values(), default=0) + 1), dtype=np.int64)
+    for path, key in zip(images, keys):
+        for ann in annotation_store[path]:
+            if ann["label"] in class_ids:
+                counts[group_index[key], class_ids[ann["label"]]] += 1
+    assignment = stratified_assign(counts, ratios, seed) if len(group_index) else np.zeros(0, dtype=int)
+
+    used_splits = [s for s, r in zip(SPLITS, ratios) if r > 0]
+    for split in used_splits:
+        os.makedirs(os.path.join(out_dir, "images", split), exist_ok=True)
+        os.makedirs(os.path.join(out_dir, "labels", split), exist_ok=True)
+    summary = {split: {"images": 0, "objects": {label: 0 for label in labels}} for split in used_splits}
+    used_names = set()
+    for n, (path, key) in enumerate(zip(images, keys)):
+        split = SPLITS[assignment[group_index[key]]]
+        name = os.path.basename(path)
+        stem, ext = os.path.splitext(name)
+        if (split, name) in used_names:
+            # Same file name from another folder; keep both.
+            folder = os.path.dirname(os.path.abspath(path))
+            stem = f"{stem}_{hashlib.md5(folder.encode('utf-8')).hexdigest()[:8]}"
+            name = stem + ext
+        used_names.add((split, name))
+        if path not in image_sizes:
+            image_sizes[path] = get_image_size(path)
+        width, height = image_sizes[path]
+        _place_file(path, os.path.join(out_dir, "images", split, name), link_mode)
+        lines = yolo_label_lines(annotation_store[path], class_ids, width, height)
+        with open(os.path.join(out_dir, "labels", split, stem + ".txt"), "w") as f:
+            f.write("\n".join(lines) + ("\n" if lines else ""))
+        summary[split]["images"] += 1
+        for ann in annotation_store[path]:
+            if ann["label"] in class_ids:
+                summary[split]["objects"][ann["label"]] += 1
+        if progress_callback is not None:
+            progress_callback(n + 1, len(images))
+    yaml_path = write_dataset_yaml(out_dir, dict(enumerate(class_names(class_ids))), used_splits)
+    return {"yaml": yaml_path, "groups": len(group_index), "splits": summary,
+            "excluded": sum(1 for p in image_list if annotation_store.get(p) and p in exclude)}
+
+
+def format_summary(summary):
+    lines = [f"dataset.yaml: {summary['yaml']}", f"Groups: {summary['groups']}"]
+    if summary.get("excluded"):
+        lines.append(f"Near-duplicates left out: {summary['excluded']}")
+    lines.append("")
+    for split, stats in summary["splits"].items():
+        objects = ", ".join(f"{label}: {count}" for label, count in stats["objects"].items())
+        lines.append(f"{split}: {stats['images']} images ({objects})")
+    return "\n".join(lines)
+
+
+def split_dataset(app):
+    """Ask for split settings and write a train/val/test YOLO dataset of the project."""
+    # Tk is imported here so split_project also runs headless (see cli.py).
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+    app.store_current_annotations()
+    if not any(app.annotation_store.values()):
+        messagebox.showerror("Error", "There are no annotated images to split.")
+        return
+
+    dialog = tk.Toplevel(app)
+    dialog.title("Split Dataset")
+    dialog.geometry("460x330")
+    form = ttk.Frame(dialog, padding=10)
+    form.pack(fill=tk.BOTH, expand=True)
+
+    ratio_vars = {}
+    for row, (split, default) in enumerate(zip(SPLITS, ("0.8", "0.1", "0.1"))):
+        ttk.Label(form, text=f"{split.capitalize()} ratio:").grid(row=row, column=0, sticky="w", pady=2)
+        ratio_vars[split] = tk.StringVar(value=default)
+        ttk.Entry(form, textvariable=ratio_vars[split], width=10).grid(row=row, column=1, sticky="w")
+    ttk.Label(form, text="Keep together:").grid(row=3, column=0, sticky="w", pady=2)
+    group_var = tk.StringVar(value="none")
+    ttk.Combobox(form, textvariable=group_var, values=GROUP_MODES, state="readonly",
+                 width=10).grid(row=3, column=1, sticky="w")
+    ttk.Label(form, text="Image files:").grid(row=4, column=0, sticky="w", pady=2)
+    link_var = tk.StringVar(value="hardlink")
+    ttk.Combobox(form, textvariable=link_var, values=LINK_MODES, state="readonly",
+                 width=10).grid(row=4, column=1, sticky="w")
+    ttk.Label(form, text="Output folder:").grid(row=5, column=0, sticky="w", pady=2)
+    out_var = tk.StringVar()
+    ttk.Entry(form, textvariable=out_var, width=30).grid(row=5, column=1, sticky="ew")
+    ttk.Button(form, text="...", width=3,
+               command=lambda: out_var.set(filedialog.askdirectory(parent=dialog) or out_var.get())
+               ).grid(row=5, column=2)
+    from .class_index import export_ids
+
+    duplicates = set(getattr(app, "duplicate_of", {}))
+    class_ids = export_ids(app.labels, app.class_ids)
+    skip_dups_var = tk.BooleanVar(value=bool(duplicates))
+    skip_dups = ttk.Checkbutton(form, text=f"Leave out near-duplicates ({len(duplicates)})", variable=skip_dups_var)
+    skip_dups.grid(row=6, column=0, columnspan=3, sticky="w", pady=2)
+    if not duplicates:
+        skip_dups.config(text="Leave out near-duplicates (run Tools -> Find Near-Duplicates first)")
+        skip_dups.state(["disabled"])
+    status = ttk.Label(form, text="")
+    status.grid(row=8, column=0, columnspan=3, sticky="w", pady=5)
+
+    def run():
+        try:
+            ratios = [float(ratio_vars[s].get()) for s in SPLITS]
+        except ValueError:
+            messagebox.showerror("Error", "Ratios must be numbers.", parent=dialog)
+            return
+        if min(ratios) < 0 or ratios[0] <= 0 or sum(ratios) <= 0:
+            messagebox.showerror("Error", "Ratios must be non-negative and train must be > 0.", parent=dialog)
+            return
+        out_dir = out_var.get()
+        if not out_dir:
+            messagebox.showerror("Error", "Please choose an output folder.", parent=dialog)
+            return
+        run_btn.state(["disabled"])
+        events = queue.Queue()
+        # The worker gets its own copies: the project can still be edited while it writes.
+        image_list = list(app.image_list)
+        store = {p: list(anns) for p, anns in app.annotation_store.items()}
+        labels = list(app.labels)
+        image_sizes = dict(app.image_sizes)
+        group_mode, link_mode = group_var.get(), link_var.get()
+
+        def worker():
+            try:
+                summary = split_project(
+                    image_list, store, labels, out_dir, ratios,
+                    group_mode=group_mode, link_mode=link_mode, image_sizes=image_sizes,
+                    exclude=duplicates if skip_dups_var.get() else None, class_ids=class_ids,
+                    progress_callback=lambda done, total: events.put(("progress", (done, total))))
+                events.put(("done", summary))
+            except Exception as e:
+                events.put(("error", e))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+        def poll():
+            try:
+                while True:
+                    kind, payload = events.get_nowait()
+                    if kind == "progress":
+                        status.config(text=f"Writing... {payload[0]}/{payload[1]} images")
+                    elif kind == "error":
+                        run_btn.state(["!disabled"])
+                        messagebox.showerror("Error", f"Split failed:\n{payload}", parent=dialog)
+                        return
+                    else:
+                        # Sizes read by the worker are kept for the next split or export.
+                        app.image_sizes.update(image_sizes)
+                        dialog.destroy()
+                        messagebox.showinfo("Split Dataset", format_summary(payload))
+                        return
+            except queue.Empty:
+                pass
+            dialog.after(100, poll)
+
+        poll()
+
+    run_btn = ttk.Button(form, text="Split", command=run)
+    run_btn.grid(row=7, column=0, columnspan=3, pady=10)
@@ -0,0 +1,335 @@
+# annotator/dedup.py
+"""
+Near-duplicate detection with perceptual hashes. Every image gets a 64-bit
+dHash (gradient signs of a 9x8 thumbnail) and a 64-bit pHash (signs of the low
+frequencies of a 32x32 DCT), computed from a draft-mode decode on a thread
+pool and cached on disk by path, mtime and size. Two images are
+near-duplicates when both hashes are within a small Hamming distance; a
+multi-index over the dHashes keeps the search well below all-pairs. Within
+a group every image is a near-duplicate of every other one, so a slowly
+changing run of video frames becomes several groups instead of one chain
+whose first and last frames look nothing alike, and the kept image's
+annotations fit every duplicate they are copied to.
+"""
+import json
+import os
+import threading
+
+DHASH_DISTANCE = 6
+PHASH_DISTANCE = 10
+_DCT_SIZE = 32
+
+
+def _default_cache_path():
+    return os.path.join(os.path.expanduser("~"), ".cache", "annotator", "image_hashes.json")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def image_hashes(image_path):
+    """(dHash, pHash) of an image as two 64-bit ints."""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        img.draft("L", (64, 64))
+        gray = img.convert("L")
+    small = np.asarray(gray.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    dhash = _bits_to_int((small[:, 1:] > small[:, :-1]).ravel())
+    pixels = np.asarray(gray.resize((_DCT_SIZE, _DCT_SIZE), Image.BILINEAR), dtype=np.float64)
+    n = np.arange(_DCT_SIZE)
+    basis = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * _DCT_SIZE))
+    low = (basis @ pixels @ basis.T)[:8, :8].ravel()
+    # The DC term only carries the mean brightness; leave it out of the median.
+    phash = _bits_to_int(low > np.median(low[1:]))
+    return dhash, phash
+
+
+class HashCache:
+    """Hashes of already seen images, stored as one JSON file keyed by path, mtime and size."""
+
+    def __init__(self, path=None):
+        self.path = path or _default_cache_path()
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def _key(image_path):
+        st = os.stat(image_path)
+        return f"{os.path.abspath(image_path)}|{st.st_mtime_ns}|{st.st_size}"
+
+    def get(self, image_path):
+        key = self._key(image_path)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None:
+            return int(entry[0], 16), int(entry[1], 16)
+        hashes = image_hashes(image_path)
+        with self.lock:
+            self.entries[key] = [f"{hashes[0]:016x}", f"{hashes[1]:016x}"]
+            self.dirty = True
+        return hashes
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError:
+            pass  # A read-only cache only costs speed.
+
+
+def compute_hashes(paths, workers=4, cache=None, progress_callback=None):
+    """Hash images on a thread pool; returns {path: (dhash, phash)}. Unreadable images are left out."""
+    from .batch import parallel_map
+
+    cache = HashCache() if cache is None else cache
+
+    def work(path):
+        try:
+            return cache.get(path)
+        except OSError:
+            return None
+
+    results = parallel_map(work, paths, workers, progress_callback)
+    cache.save()
+    return {path: hashes for path, hashes in zip(paths, results) if hashes is not None}
+
+
+class MultiIndex:
+    """
+    Multi-index hashing for Hamming-distance queries on 64-bit ints within a
+    fixed radius. The bits are cut into 16-bit chunks, each with its own hash
+    table. Two values within radius differ in at most radius // chunks bits of
+    at least one chunk (pigeonhole principle), so a query only looks up the
+    chunk values that close to its own and compares the values found there.
+    """
+
+    def __init__(self, radius, bits=64, chunk_bits=16):
+        self.radius = radius
+        self.chunk_bits = chunk_bits
+        self.shifts = list(range(0, bits, chunk_bits))
+        self.mask = (1 << chunk_bits) - 1
+        self.tables = [{} for _ in self.shifts]
+        self.values = []
+        # XOR patterns of chunk_bits bits with at most radius // chunks bits set.
+        sub_radius = radius // len(self.shifts)
+        self.flips = [0]
+        for _ in range(sub_radius):
+            self.flips = sorted({f | (1 << b) for f in self.flips for b in range(chunk_bits)} | set(self.flips))
+
+    def add(self, value, item):
+        n = len(self.values)
+        self.values.append((value, item))
+        for table, shift in zip(self.tables, self.shifts):
+            table.setdefault((value >> shift) & self.mask, []).append(n)
+
+    def query(self, value):
+        """Items within the radius of value, as (distance, item) pairs."""
+        candidates = set()
+        for table, shift in zip(self.tables, self.shifts):
+            chunk = (value >> shift) & self.mask
+            for flip in self.flips:
+                bucket = table.get(chunk ^ flip)
+                if bucket:
+                    candidates.update(bucket)
+        found = []
+        for n in candidates:
+            other, item = self.values[n]
+            d = hamming(value, other)
+            if d <= self.radius:
+                found.append((d, item))
+        return found
+
+
+def find_duplicate_groups(hashes, order=None, dhash_distance=DHASH_DISTANCE, phash_distance=PHASH_DISTANCE):
+    """
+    Group near-duplicate images. hashes maps path to (dhash, phash); order
+    (default: sorted paths) decides the order inside and between groups.
+    Every member of a group is a near-duplicate of every other member
+    (complete linkage): an image joins the group of its closest match only
+    if it matches all of that group's images, and starts a new group
+    otherwise. Images with a flat dHash (no gradients, e.g. black frames)
+    are left out. Returns a list of groups of 2 or more paths.
+    """
+    paths = [p for p in (order if order is not None else sorted(hashes)) if p in hashes and hashes[p][0] != 0]
+    group_of = []  # image index -> group index
+    groups = []    # lists of image indexes
+
+    index_by_dhash = MultiIndex(dhash_distance)
+    for n, path in enumerate(paths):
+        dhash, phash = hashes[path]
+        matches = sorted((d, other) for d, other in index_by_dhash.query(dhash)
+                         if hamming(phash, hashes[paths[other]][1]) <= phash_distance)
+        matched = {other for _, other in matches}
+        joined = None
+        for _, other in matches:
+            members = groups[group_of[other]]
+            if all(m in matched for m in members):
+                joined = group_of[other]
+                break
+        if joined is None:
+            joined = len(groups)
+            groups.append([])
+        groups[joined].append(n)
+        group_of.append(joined)
+        index_by_dhash.add(dhash, n)
+    return [[paths[n] for n in group] for group in groups if len(group) > 1]
+
+
+def duplicate_map(groups, annotation_store):
+    """
+    Map every near-duplicate to the representative of its group: the first
+    annotated image of the group, else its first image. Representatives are
+    not in the map.
+    """
+    duplicate_of = {}
+    for group in groups:
+        representative = next((p for p in group if annotation_store.get(p)), group[0])
+        for path in group:
+            if path != representative:
+                duplicate_of[path] = representative
+    return duplicate_of
+
+
+def copy_annotations_to_duplicates(duplicate_of, annotation_store):
+    """
+    Give near-duplicates without annotations a copy of their representative's
+    (a direct match, see find_duplicate_groups); returns the number of images filled.
+    """
+    import copy
+    filled = 0
+    for path, representative in duplicate_of.items():
+        if not annotation_store.get(path) and annotation_store.get(representative):
+            annotation_store[path] = copy.deepcopy(annotation_store[representative])
+            filled += 1
+    return filled
+
+
+def find_duplicates(app):
+    """Hash the project images in the background and show the near-duplicate groups."""
+    # Tk is imported here so the functions above also run headless (see cli.py).
+    import queue
+    import tkinter as tk
+    from tkinter import messagebox, ttk
+
+    if not app.image_list:
+        messagebox.showerror("Error", "Load images first.")
+        return
+    app.store_current_annotations()
+    paths = list(app.image_list)
+
+    win = tk.Toplevel(app)
+    win.title("Near-Duplicates")
+    win.geometry("800x450")
+    top = ttk.Frame(win, padding=5)
+    top.pack(fill=tk.X)
+    status = ttk.Label(top, text="Hashing images...")
+    status.pack(side=tk.LEFT)
+    tree = ttk.Treeview(win, columns=("images", "annotated", "first"), show="tree headings")
+    tree.heading("#0", text="Group")
+    tree.heading("images", text="Images")
+    tree.heading("annotated", text="Annotated")
+    tree.heading("first", text="Kept image")
+    tree.column("#0", width=90)
+    tree.column("images", width=70, anchor="e")
+    tree.column("annotated", width=80, anchor="e")
+    tree.pack(fill=tk.BOTH, expand=True)
+    buttons = ttk.Frame(win, padding=5)
+    buttons.pack(fill=tk.X)
+    state = {"groups": []}
+    events = queue.Queue()
+
+    def show(groups):
+        state["groups"] = groups
+        app.duplicate_of = duplicate_map(groups, app.annotation_store)
+        tree.delete(*tree.get_children())
+        for n, group in enumerate(groups):
+            annotated = sum(1 for p in group if app.annotation_store.get(p))
+            kept = next((p for p in group if p not in app.duplicate_of), group[0])
+            node = tree.insert("", "end", iid=f"g{n}", text=f"#{n + 1}",
+                               values=(len(group), annotated, os.path.basename(kept)))
+            for k, path in enumerate(group):
+                tree.insert(node, "end", iid=f"g{n}_{k}", text="kept" if path == kept else "duplicate",
+                            values=("", "yes" if app.annotation_store.get(path) else "",
+                                    os.path.relpath(path, os.path.dirname(kept))))
+        duplicates = len(app.duplicate_of)
+        status.config(text=f"{len(groups)} groups, {duplicates} near-duplicate images "
+                           f"({duplicates / max(len(paths), 1):.0%} of the project)")
+        app.apply_image_filter()
+
+    def on_select(event):
+        selection = tree.selection()
+        if selection and "_" in selection[0]:
+            n, k = (int(v) for v in selection[0][1:].split("_"))
+            app.goto_image(state["groups"][n][k])
+
+    def copy_to_duplicates():
+        app.store_current_annotations()
+        filled = copy_annotations_to_duplicates(app.duplicate_of, app.annotation_store)
+        if app.image_path in app.duplicate_of:
+            # Reload the current image so the copied annotations show up.
+            app.image_path, current = None, app.image_path
+            app.load_image(current)
+        show(state["groups"])
+        messagebox.showinfo("Near-Duplicates", f"Copied annotations to {filled} images.", parent=win)
+
+    def skip_duplicates():
+        app.image_filter_var.set("Skip near-duplicates")
+        app.apply_image_filter()
+
+    ttk.Button(buttons, text="Skip Duplicates in Image List", command=skip_duplicates).pack(side=tk.LEFT)
+    ttk.Button(buttons, text="Copy Annotations to Duplicates", command=copy_to_duplicates).pack(side=tk.LEFT,
+                                                                                               padx=5)
+    ttk.Label(buttons, text="Split Dataset can leave the duplicates out.").pack(side=tk.LEFT, padx=5)
+    tree.bind("<<TreeviewSelect>>", on_select)
+
+    def worker():
+        try:
+            hashes = compute_hashes(paths, workers=min(8, os.cpu_count() or 2),
+                                    progress_callback=lambda done, total: events.put(("progress", (done, total))))
+            events.put(("done", find_duplicate_groups(hashes, order=paths)))
+        except Exception as e:
+            events.put(("error", e))
+
+    threading.Thread(target=worker, daemon=True).start()
+
+    def poll():
+        if not win.winfo_exists():
+            return
+        try:
+            while True:
+                kind, payload = events.get_nowait()
+                if kind == "progress":
+                    status.config(text=f"Hashing images... {payload[0]}/{payload[1]}")
+                elif kind == "error":
+                    messagebox.showerror("Error", f"Hashing failed:\n{payload}", parent=win)
+                    return
+                else:
+                    show(payload)
+                    return
+        except queue.Empty:
+            pass
+        win.after(100, poll)
+
+    poll()
@@ -0,0 +1,235 @@
+# annotator/evaluation.py
+import contextlib
+import os
+import time
+
+import numpy as np
+
+from .geometry import box_iou
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+
+def find_label_file(image_path):
+    """
+    Locate the YOLO label file for an image. Both the layout written by
+    export_yolo_format (<image dir>/labels/<name>.txt) and the standard
+    images/ -> labels/ dataset layout are supported.
+    """
+    image_dir, filename = os.path.split(image_path)
+    base_name = os.path.splitext(filename)[0]
+    candidates = [os.path.join(image_dir, "labels", base_name + ".txt")]
+    parts = image_dir.split(os.sep)
+    if "images" in parts:
+        idx = len(parts) - 1 - parts[::-1].index("images")
+        parts[idx] = "labels"
+        candidates.append(os.path.join(os.sep.join(parts), base_name + ".txt"))
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def load_yolo_labels(label_file, width, height):
+    """Read a YOLO label file into (boxes xyxy in pixels, class ids)."""
+    if label_file is None:
+        return np.zeros((0, 4)), np.zeros(0, dtype=int)
+    rows = []
+    with open(label_file) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 5:
+                rows.append([float(p) for p in parts[:5]])
+    if not rows:
+        return np.zeros((0, 4)), np.zeros(0, dtype=int)
+    data = np.array(rows)
+    xc, yc = data[:, 1] * width, data[:, 2] * height
+    w, h = data[:, 3] * width, data[:, 4] * height
+    boxes = np.stack([xc - w / 2, yc - h / 2, xc + w / 2, yc + h / 2], axis=1)
+    return boxes, data[:, 0].astype(int)
+
+
+def match_predictions(pred_boxes, pred_classes, gt_boxes, gt_classes, iou_thresholds=IOU_THRESHOLDS):
+    """
+    Greedily match predictions (already sorted by descending score) to ground truth
+    of the same class. Returns a boolean (num_preds, num_thresholds) true-positive array.
+    """
+    tp = np.zeros((len(pred_boxes), len(iou_thresholds)), dtype=bool)
+    if len(pred_boxes) == 0 or len(gt_boxes) == 0:
+        return tp
+    iou = box_iou(pred_boxes, gt_boxes)
+    iou[pred_classes[:, None] != gt_classes[None, :]] = 0.0
+    for t, threshold in enumerate(iou_thresholds):
+        taken = np.zeros(len(gt_boxes), dtype=bool)
+        for i in range(len(pred_boxes)):
+            candidates = np.where(~taken & (iou[i] >= threshold))[0]
+            if candidates.size:
+                best = candidates[np.argmax(iou[i, candidates])]
+                taken[best] = True
+                tp[i, t] = True
+    return tp
+
+
+def average_precision(recall, precision):
+    """COCO-style 101-point interpolated average precision."""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    return float(np.mean(mpre[np.searchsorted(mrec, x, side="left").clip(max=len(mpre) - 1)]))
+
+
+def compute_detection_metrics(tp, scores, pred_classes, gt_classes, names=None, conf_threshold=0.25):
+    """
+    Compute mAP@0.5, mAP@0.5:0.95 and per-class precision/recall.
+    tp, scores and pred_classes cover every prediction in the dataset; gt_classes
+    lists the class of every ground-truth object. Precision and recall are
+    reported at IoU 0.5 for predictions scoring at least conf_threshold.
+    """
+    classes = np.unique(np.concatenate([gt_classes, pred_classes])).astype(int)
+    order = np.argsort(-scores)
+    tp, scores, pred_classes = tp[order], scores[order], pred_classes[order]
+    per_class = {}
+    ap = []
+    for cls in classes:
+        mask = pred_classes == cls
+        n_gt = int(np.sum(gt_classes == cls))
+        if n_gt == 0:
+            # Only false positives; AP is undefined and the class is left out of the mean.
+            n_pred = int(np.sum(mask & (scores >= conf_threshold)))
+            per_class[int(cls)] = {"precision": 0.0, "recall": 0.0, "ap50": None,
+                                   "ap50_95": None, "ground_truth": 0, "predictions": n_pred}
+            continue
+        cls_tp = tp[mask]
+        tpc = np.cumsum(cls_tp, axis=0)
+        fpc = np.cumsum(~cls_tp, axis=0)
+        recall = tpc / n_gt
+        precision = tpc / np.maximum(tpc + fpc, 1)
+        cls_ap = np.array([average_precision(recall[:, t], precision[:, t]) for t in range(tp.shape[1])]) \
+            if len(cls_tp) else np.zeros(tp.shape[1])
+        ap.append(cls_ap)
+        confident = scores[mask] >= conf_threshold
+        n_conf = int(confident.sum())
+        tp_conf = int(cls_tp[confident, 0].sum())
+        per_class[int(cls)] = {
+            "precision": tp_conf / n_conf if n_conf else 0.0,
+            "recall": tp_conf / n_gt,
+            "ap50": float(cls_ap[0]),
+            "ap50_95": float(cls_ap.mean()),
+            "ground_truth": n_gt,
+            "predictions": n_conf,
+        }
+    if names is not None:
+        for cls, stats in per_class.items():
+            stats["name"] = names.get(cls, str(cls)) if isinstance(names, dict) else \
+                (names[cls] if cls < len(names) else str(cls))
+    ap = np.array(ap) if ap else np.zeros((1, tp.shape[1]))
+    return {
+        "map50": float(ap[:, 0].mean()),
+        "map50_95": float(ap.mean()),
+        "per_class": per_class,
+    }
+
+
+def _percentiles(values_ms):
+    if not values_ms:
+        return {}
+    values = np.asarray(values_ms)
+    stats = {f"p{p}": float(np.percentile(values, p)) for p in (50, 90, 95, 99)}
+    stats["mean"] = float(values.mean())
+    return stats
+
+
+def evaluate_folder(model, image_files, batch_size=16, imgsz=640, conf_threshold=0.25,
+                    progress_callback=None, cancel_event=None, lock=None):
+    """
+    Run model over image_files in batches and compare against YOLO ground-truth labels.
+    Returns a report dict with accuracy metrics, latency percentiles and throughput.
+    progress_callback(done, total) is called after each batch; setting cancel_event
+    stops the run after the current batch. lock, if given, is held around each
+    batch so other users of the same model only wait for one batch.
+    """
+    all_tp, all_scores, all_pred_classes, all_gt_classes = [], [], [], []
+    per_image_ms, inference_ms = [], []
+    images_done = 0
+    missing_labels = 0
+    start = time.perf_counter()
+    for batch_start in range(0, len(image_files), batch_size):
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        batch = image_files[batch_start:batch_start + batch_size]
+        with lock or contextlib.nullcontext():
+            t0 = time.perf_counter()
+            results = model.predict(source=batch, imgsz=imgsz, conf=0.001, save=False, verbose=False)
+            batch_ms = (time.perf_counter() - t0) * 1000
+        per_image_ms.extend([batch_ms / len(batch)] * len(batch))
+        for image_path, result in zip(batch, results):
+            speed = getattr(result, "speed", None) or {}
+            if "inference" in speed:
+                inference_ms.append(speed["inference"])
+            height, width = result.orig_shape[:2]
+            label_file = find_label_file(image_path)
+            if label_file is None:
+                missing_labels += 1
+            gt_boxes, gt_classes = load_yolo_labels(label_file, width, height)
+            pred_boxes = result.boxes.xyxy.cpu().numpy()
+            scores = result.boxes.conf.cpu().numpy()
+            pred_classes = result.boxes.cls.cpu().numpy().astype(int)
+            order = np.argsort(-scores)
+            pred_boxes, scores, pred_classes = pred_boxes[order], scores[order], pred_classes[order]
+            all_tp.append(match_predictions(pred_boxes, pred_classes, gt_boxes, gt_classes))
+            all_scores.append(scores)
+            all_pred_classes.append(pred_classes)
+            all_gt_classes.append(gt_classes)
+        images_done += len(batch)
+        if progress_callback is not None:
+            progress_callback(images_done, len(image_files))
+    elapsed = time.perf_counter() - start
+
+    n_thresholds = len(IOU_THRESHOLDS)
+    metrics = compute_detection_metrics(
+        np.concatenate(all_tp) if all_tp else np.zeros((0, n_thresholds), dtype=bool),
+        np.concatenate(all_scores) if all_scores else np.zeros(0),
+        np.concatenate(all_pred_classes) if all_pred_classes else np.zeros(0, dtype=int),
+        np.concatenate(all_gt_classes) if all_gt_classes else np.zeros(0, dtype=int),
+        names=getattr(model, "names", None),
+        conf_threshold=conf_threshold,
+    )
+    metrics.update({
+        "images": images_done,
+        "images_without_labels": missing_labels,
+        "batch_size": batch_size,
+        "imgsz": imgsz,
+        "total_seconds": elapsed,
+        "images_per_second": images_done / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": _percentiles(per_image_ms),
+        "inference_latency_ms": _percentiles(inference_ms),
+    })
+    return metrics
+
+
+def format_report(report):
+    """Render an evaluation report as plain text for display."""
+    lines = [
+        f"Images evaluated: {report['images']} (without labels: {report['images_without_labels']})",
+        f"mAP@0.5: {report['map50']:.4f}",
+        f"mAP@0.5:0.95: {report['map50_95']:.4f}",
+        f"Throughput: {report['images_per_second']:.2f} images/sec "
+        f"(batch {report['batch_size']}, imgsz {report['imgsz']})",
+        "",
+        "Latency per image (ms, end-to-end):",
+    ]
+    for key, value in report["latency_ms"].items():
+        lines.append(f"  {key}: {value:.2f}")
+    if report["inference_latency_ms"]:
+        lines.append("Model inference latency per image (ms):")
+        for key, value in report["inference_latency_ms"].items():
+            lines.append(f"  {key}: {value:.2f}")
+    lines.append("")
+    lines.append(f"{'Class':<20}{'GT':>8}{'Pred':>8}{'P':>8}{'R':>8}{'AP50':>8}{'AP50-95':>9}")
+    for cls, stats in sorted(report["per_class"].items()):
+        ap50 = f"{stats['ap50']:.3f}" if stats["ap50"] is not None else "-"
+        ap = f"{stats['ap50_95']:.3f}" if stats["ap50_95"] is not None else "-"
+        lines.append(f"{stats.get('name', cls)!s:<20}{stats['ground_truth']:>8}{stats['predictions']:>8}"
+                     f"{stats['precision']:>8.3f}{stats['recall']:>8.3f}{ap50:>8}{ap:>9}")
+    return "\n".join(lines)
@@ -1,47 +1,53 @@
 # annotator/export_tools.py
 import os
 import json
-from tkinter import messagebox
 
-def export_yolo_format(app):
-    if not app.image_obj or not app.image_path:
-        return
+from .profiling import profiler
 
-    orig_width, orig_height = app.image_obj.size
-    image_dir = os.path.dirname(app.image_path)
+def write_yolo_annotations(image_path, annotations, labels, image_size, class_ids=None):
+    """
+    Write the label file of one image next to it, in <image dir>/labels/.
+    Boxes only are written in YOLO format (<name>.txt); as soon as there is a
+    polygon, all annotations go to <name>_mask.json in Mask R-CNN format.
+    annotations are Annotation objects; image_size is (width, height).
+    class_ids maps labels to class ids (default: position in labels);
+    annotations of other labels are left out.
+    Returns (annotation_file, format) with format "yolo" or "mask_json".
+    """
+    if class_ids is None:
+        class_ids = {label: i for i, label in enumerate(labels)}
+    annotations = [ann for ann in annotations if ann.label in class_ids]
+    orig_width, orig_height = image_size
+    image_dir = os.path.dirname(image_path)
     labels_dir = os.path.join(image_dir, "labels")
     os.makedirs(labels_dir, exist_ok=True)
-    base_name = os.path.splitext(os.path.basename(app.image_path))[0]
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
 
-    has_polygon = any(ann.type == "polygon" for ann in app.annotations)
+    has_polygon = any(ann.type == "polygon" for ann in annotations)
     if has_polygon:
+        from .geometry import polygon_area
+
         annotation_file = os.path.join(labels_dir, base_name + "_mask.json")
+        polygons = [ann for ann in annotations if ann.type == "polygon"]
+        areas = dict(zip(map(id, polygons), polygon_area([ann.points for ann in polygons]).tolist()))
         annotations_out = []
-        for ann in app.annotations:
+        for ann in annotations:
             if ann.type == "polygon":
                 xs = ann.points[0::2]
                 ys = ann.points[1::2]
                 bbox = [min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)]
-                try:
-                    category_id = app.labels.index(ann.label)
-                except ValueError:
-                    category_id = -1
                 annotations_out.append({
-                    "category_id": category_id,
+                    "category_id": class_ids[ann.label],
                     "segmentation": [ann.points],
                     "bbox": bbox,
-                    "area": bbox[2] * bbox[3]
+                    "area": areas[id(ann)]
                 })
             else:
                 x1, y1, x2, y2 = ann.points
                 bbox = [min(x1, x2), min(y1, y2), abs(x2 - x1), abs(y2 - y1)]
-                try:
-                    category_id = app.labels.index(ann.label)
-                except ValueError:
-                    category_id = -1
                 segmentation = [[x1, y1, x2, y1, x2, y2, x1, y2]]
                 annotations_out.append({
-                    "category_id": category_id,
+                    "category_id": class_ids[ann.label],
                     "segmentation": segmentation,
                     "bbox": bbox,
                     "area": bbox[2] * bbox[3]
@@ -49,40 +55,53 @@ def export_yolo_format(app):
         data = {"annotations": annotations_out}
         with open(annotation_file, "w") as f:
             json.dump(data, f, indent=2)
+        return annotation_file, "mask_json"
+
+    annotation_file = os.path.join(labels_dir, base_name + ".txt")
+    with open(annotation_file, "w") as f:
+        for ann in annotations:
+            x1, y1, x2, y2 = ann.points
+            box_width = abs(x2 - x1)
+            box_height = abs(y2 - y1)
+            x_center = min(x1, x2) + box_width / 2
+            y_center = min(y1, y2) + box_height / 2
+            x_center_norm = x_center / orig_width
+            y_center_norm = y_center / orig_height
+            width_norm = box_width / orig_width
+            height_norm = box_height / orig_height
+            f.write(f"{class_ids[ann.label]} {x_center_norm:.6f} {y_center_norm:.6f} "
+                    f"{width_norm:.6f} {height_norm:.6f}\n")
+    return annotation_file, "yolo"
+
+
+@profiler.timed("export.yolo")
+def export_yolo_format(app):
+    if not app.image_obj or not app.image_path:
+        return
+
+    from .class_index import export_ids
+
+    annotation_file, fmt = write_yolo_annotations(app.image_path, app.annotations, app.labels, app.image_obj.size,
+                                                  export_ids(app.labels, app.class_ids))
+    if fmt == "mask_json":
         app.system_message_label.config(
             text=f"Polygon annotations saved in Mask R-CNN format to:\n{annotation_file}"
         )
     else:
-        annotation_file = os.path.join(labels_dir, base_name + ".txt")
-        with open(annotation_file, "w") as f:
-            for ann in app.annotations:
-                x1, y1, x2, y2 = ann.points
-                box_width = abs(x2 - x1)
-                box_height = abs(y2 - y1)
-                x_center = min(x1, x2) + box_width / 2
-                y_center = min(y1, y2) + box_height / 2
-                x_center_norm = x_center / orig_width
-                y_center_norm = y_center / orig_height
-                width_norm = box_width / orig_width
-                height_norm = box_height / orig_height
-                try:
-                    class_index = app.labels.index(ann.label)
-                except ValueError:
-                    class_index = -1
-                f.write(f"{class_index} {x_center_norm:.6f} {y_center_norm:.6f} "
-                        f"{width_norm:.6f} {height_norm:.6f}\n")
         app.system_message_label.config(
             text=f"Annotations saved in YOLO format to:\n{annotation_file}"
         )
-        app.image_status[app.image_path] = True
-        app.tree.item(app.current_image_index, tags=("completed",))
+        app.set_image_completed(app.image_path)
     app.system_message_label.after(3000, lambda: app.system_message_label.config(text=""))
 
 def export_voc_format(app):
+    from tkinter import messagebox
     messagebox.showinfo("Export", "Exporting in Pascal VOC format... (Not fully implemented)")
 
 def export_coco_format(app):
+    from tkinter import messagebox
     messagebox.showinfo("Export", "Exporting in COCO JSON format... (Not fully implemented)")
 
 def export_csv_format(app):
+    from tkinter import messagebox
     messagebox.showinfo("Export", "Exporting annotations as CSV... (Not fully implemented)")
@@ -0,0 +1,184 @@
+# annotator/file_index.py
+import hashlib
+import os
+import sqlite3
+
+from .utils import get_image_size
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+# Version 1 records subdirectories of non-recursive scans; older indexes are rebuilt.
+SCHEMA_VERSION = 1
+DIMENSION_WORKERS = 8
+
+
+def _default_index_path(root):
+    """Indexes live in the user cache so scanning never writes into the dataset folder."""
+    cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "annotator")
+    os.makedirs(cache_dir, exist_ok=True)
+    digest = hashlib.md5(os.path.abspath(root).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"index-{digest}.sqlite")
+
+
+class FileIndex:
+    """
+    Persistent index of the image files below a folder: path, size, mtime and
+    dimensions. Directories are walked once with os.scandir and extensions
+    match case-insensitively. On a rescan, directories whose mtime is
+    unchanged are taken from the index without listing or stat-ing their
+    files; only changed directories are re-listed, and only new or changed
+    files have their header read for the dimensions. Subdirectories are
+    recorded (as not yet scanned) even by a non-recursive scan, so a later
+    recursive scan still descends into them.
+    """
+
+    def __init__(self, root, index_path=None, extensions=IMAGE_EXTENSIONS):
+        self.root = os.path.abspath(root)
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.index_path = index_path or _default_index_path(self.root)
+        self.db = sqlite3.connect(self.index_path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, dir TEXT NOT NULL, size INTEGER, mtime_ns INTEGER,
+                width INTEGER, height INTEGER);
+            CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER);
+            CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+        """)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            with self.db:
+                self.db.execute("DELETE FROM dirs")
+                self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        self.db.close()
+
+    def scan(self, recursive=True, full=False, progress_callback=None):
+        """
+        Update the index and return the sorted list of image paths.
+        full=True re-stats every file, which also catches files rewritten in
+        place without their directory changing.
+        """
+        db = self.db
+        self._new_files = []
+        visited = set()
+        stack = [(self.root, None)]
+        scanned = 0
+        with db:
+            while stack:
+                directory, parent = stack.pop()
+                try:
+                    dir_mtime = os.stat(directory).st_mtime_ns
+                except OSError:
+                    continue
+                visited.add(directory)
+                row = db.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (directory,)).fetchone()
+                if row is not None and row[0] == dir_mtime and not full:
+                    if recursive:
+                        stack.extend((sub, directory) for (sub,) in db.execute(
+                            "SELECT path FROM dirs WHERE parent = ?", (directory,)))
+                    continue
+                scanned += self._scan_directory(directory, recursive, stack)
+                db.execute("INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                           (directory, parent, dir_mtime))
+                if progress_callback is not None:
+                    progress_callback(len(visited), scanned)
+            stale = [path for (path,) in db.execute("SELECT path FROM dirs")
+                     if path not in visited and recursive]
+            for path in stale:
+                db.execute("DELETE FROM dirs WHERE path = ?", (path,))
+                db.execute("DELETE FROM files WHERE dir = ?", (path,))
+        self._read_dimensions(self._new_files)
+        return self.paths(recursive)
+
+    def _read_dimensions(self, paths):
+        """Store the (width, height) of paths, read from the image headers by a few threads."""
+        from .batch import parallel_map
+
+        def read(path):
+            try:
+                return get_image_size(path)
+            except OSError:
+                return None  # left empty; dimensions() tries again
+
+        sizes = parallel_map(read, paths, DIMENSION_WORKERS)
+        with self.db:
+            self.db.executemany("UPDATE files SET width = ?, height = ? WHERE path = ?",
+                                [(size[0], size[1], path) for path, size in zip(paths, sizes) if size is not None])
+
+    def _scan_directory(self, directory, recursive, stack):
+        db = self.db
+        cached, no_size = {}, set()
+        for path, size, mtime, width in db.execute(
+                "SELECT path, size, mtime_ns, width FROM files WHERE dir = ?", (directory,)):
+            cached[path] = (size, mtime)
+            if width is None:
+                no_size.add(path)
+        present = set()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return 0
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        stack.append((entry.path, directory))
+                    else:
+                        # Not scanned now (NULL mtime); a recursive scan finds it through its parent.
+                        db.execute("INSERT OR IGNORE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, NULL)",
+                                   (entry.path, directory))
+                    continue
+                if not entry.name.lower().endswith(self.extensions) or not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            present.add(entry.path)
+            if cached.get(entry.path) != (st.st_size, st.st_mtime_ns):
+                db.execute("INSERT OR REPLACE INTO files (path, dir, size, mtime_ns, width, height) "
+                           "VALUES (?, ?, ?, ?, NULL, NULL)", (entry.path, directory, st.st_size, st.st_mtime_ns))
+                self._new_files.append(entry.path)
+            elif entry.path in no_size:
+                self._new_files.append(entry.path)
+        removed = [path for path in cached if path not in present]
+        db.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+        return len(entries)
+
+    def paths(self, recursive=True):
+        if recursive:
+            rows = self.db.execute("SELECT path FROM files")
+        else:
+            rows = self.db.execute("SELECT path FROM files WHERE dir = ?", (self.root,))
+        return sorted(path for (path,) in rows)
+
+    def entry(self, path):
+        """Return (size, mtime_ns, width, height) for an indexed file, or None."""
+        return self.db.execute("SELECT size, mtime_ns, width, height FROM files WHERE path = ?",
+                               (path,)).fetchone()
+
+    def dimensions(self, path):
+        """Image (width, height), read from the header once and then served from the index."""
+        row = self.db.execute("SELECT width, height FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] is not None:
+            return row[0], row[1]
+        width, height = get_image_size(path)
+        with self.db:
+            self.db.execute("UPDATE files SET width = ?, height = ? WHERE path = ?", (width, height, path))
+        return width, height
+
+    def known_dimensions(self):
+        """All dimensions already stored in the index, as {path: (width, height)}."""
+        return {path: (w, h) for path, w, h in self.db.execute(
+            "SELECT path, width, height FROM files WHERE width IS NOT NULL")}
+
+
+def scan_images(folder, recursive=True):
+    """Return the sorted image paths below folder, using (and updating) its persistent index."""
+    index = FileIndex(folder)
+    try:
+        return index.scan(recursive=recursive)
+    finally:
+        index.close()
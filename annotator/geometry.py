@@ -0,0 +1,292 @@
+# annotator/geometry.py
+"""
+Batched geometry kernels on NumPy arrays, shared by hit-testing, QA, export,
+evaluation and tracking.
+
+Polygons are accepted either as flat [x1, y1, x2, y2, ...] lists (the
+annotation format) or as (n, 2) arrays; a "list of polygons" may mix both and
+the polygons may have different vertex counts. Boxes are (N, 4) xyxy arrays.
+Point-in-polygon tests use the even-odd rule with pixel centres at +0.5, and
+rasterization samples exactly the same rule, so masks and hit-tests agree.
+"""
+import math
+
+import numpy as np
+
+# Upper bound on the number of (point, edge) pairs evaluated at once.
+MAX_PAIRS_PER_CHUNK = 4_000_000
+
+
+def as_vertices(polygon):
+    """Return a polygon as an (n, 2) float64 array."""
+    return np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+
+
+def _pack(polygons):
+    """Concatenate polygons into one vertex array; returns (vertices, starts, counts)."""
+    verts = [as_vertices(p) for p in polygons]
+    counts = np.array([len(v) for v in verts], dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]) if len(counts) else np.zeros(0, dtype=np.int64)
+    vertices = np.concatenate(verts) if verts else np.zeros((0, 2))
+    return vertices, starts, counts
+
+
+def _edges(polygons):
+    """
+    Edges of all polygons, contiguous per polygon: (start points, end points,
+    polygon index of every edge, first edge of every polygon, edge counts).
+    """
+    vertices, starts, counts = _pack(polygons)
+    nxt = np.arange(1, len(vertices) + 1)
+    nonempty = counts > 0
+    # The last vertex of each polygon connects back to its first vertex.
+    nxt[(starts + counts - 1)[nonempty]] = starts[nonempty]
+    owner = np.repeat(np.arange(len(counts)), counts)
+    return vertices, vertices[nxt], owner, starts, counts
+
+
+def polygon_area(polygons):
+    """Absolute shoelace areas of a list of polygons, shape (K,)."""
+    start, end, owner, _, counts = _edges(polygons)
+    cross = start[:, 0] * end[:, 1] - end[:, 0] * start[:, 1]
+    return 0.5 * np.abs(np.bincount(owner, weights=cross, minlength=len(counts)))
+
+
+def polygon_bbox(polygons):
+    """xyxy bounding boxes of a list of polygons, shape (K, 4). Empty polygons give NaN."""
+    vertices, starts, counts = _pack(polygons)
+    out = np.full((len(counts), 4), np.nan)
+    nonempty = counts > 0
+    if nonempty.any():
+        s = starts[nonempty]
+        out[nonempty, 0] = np.minimum.reduceat(vertices[:, 0], s)
+        out[nonempty, 1] = np.minimum.reduceat(vertices[:, 1], s)
+        out[nonempty, 2] = np.maximum.reduceat(vertices[:, 0], s)
+        out[nonempty, 3] = np.maximum.reduceat(vertices[:, 1], s)
+    return out
+
+
+def points_in_polygons(points, polygons):
+    """
+    Even-odd test of many points against many polygons.
+    points: (P, 2). Returns a (P, K) boolean array.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    start, end, _, starts, counts = _edges(polygons)
+    result = np.zeros((len(points), len(counts)), dtype=bool)
+    if len(points) == 0 or len(start) == 0:
+        return result
+    x0, y0, x1, y1 = start[:, 0], start[:, 1], end[:, 0], end[:, 1]
+    dy = y1 - y0
+    slope = np.divide(x1 - x0, dy, out=np.zeros_like(dy), where=dy != 0)
+    nonempty = counts > 0
+    chunk = max(1, MAX_PAIRS_PER_CHUNK // len(start))
+    for s in range(0, len(points), chunk):
+        px = points[s:s + chunk, 0:1]
+        py = points[s:s + chunk, 1:2]
+        spans = (y0 > py) != (y1 > py)
+        crossing = spans & (px < x0 + (py - y0) * slope)
+        # Parity of the crossings of each polygon's (contiguous) edges.
+        result[s:s + chunk, nonempty] = np.logical_xor.reduceat(crossing, starts[nonempty], axis=1)
+    return result
+
+
+def point_in_polygon(x, y, polygon):
+    """Single point against a single polygon (list of (x, y) pairs, flat list or array)."""
+    return bool(points_in_polygons([[x, y]], [polygon])[0, 0])
+
+
+def box_area(boxes):
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def box_iou(boxes1, boxes2):
+    """Pairwise IoU between two sets of xyxy boxes. Returns an (N, M) array."""
+    boxes1 = np.asarray(boxes1, dtype=np.float64).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=np.float64).reshape(-1, 4)
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    lt = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    rb = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    return inter / (area1[:, None] + area2[None, :] - inter + 1e-9)
+
+
+def clip_polygon_to_box(polygon, box):
+    """Sutherland-Hodgman clip of a polygon against an xyxy box; returns an (n, 2) array (possibly empty)."""
+    pts = as_vertices(polygon)
+    x1, y1, x2, y2 = box
+    # Each clip edge: (axis, bound, keep_greater)
+    for axis, bound, keep_greater in ((0, x1, True), (0, x2, False), (1, y1, True), (1, y2, False)):
+        if len(pts) == 0:
+            break
+        nxt = np.roll(pts, -1, axis=0)
+        inside = pts[:, axis] >= bound if keep_greater else pts[:, axis] <= bound
+        inside_next = np.roll(inside, -1)
+        denom = nxt[:, axis] - pts[:, axis]
+        t = np.divide(bound - pts[:, axis], denom, out=np.zeros_like(denom), where=denom != 0)
+        crossing_points = pts + t[:, None] * (nxt - pts)
+        out = []
+        for i in range(len(pts)):
+            if inside[i]:
+                out.append(pts[i])
+            if inside[i] != inside_next[i]:
+                out.append(crossing_points[i])
+        pts = np.asarray(out).reshape(-1, 2)
+    return pts
+
+
+def box_polygon_iou(boxes, polygons):
+    """
+    Exact IoU between boxes (N, 4) and polygons (K), shape (N, K). The box is
+    convex, so the intersection is the polygon clipped to the box. Pairs whose
+    bounding boxes do not overlap are skipped.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    polygons = list(polygons)
+    result = np.zeros((len(boxes), len(polygons)))
+    if not len(boxes) or not polygons:
+        return result
+    poly_areas = polygon_area(polygons)
+    candidates = np.argwhere(box_iou(boxes, polygon_bbox(polygons)) > 0)
+    areas = box_area(boxes)
+    for i, k in candidates:
+        clipped = clip_polygon_to_box(polygons[k], boxes[i])
+        if len(clipped) < 3:
+            continue
+        inter = polygon_area([clipped])[0]
+        result[i, k] = inter / (areas[i] + poly_areas[k] - inter + 1e-9)
+    return result
+
+
+def rasterize_polygons(polygons, shape, values=None, dtype=np.uint8, out=None):
+    """
+    Paint polygons into a (height, width) array; a pixel belongs to a polygon
+    when its centre is inside (even-odd rule). Later polygons overwrite earlier
+    ones. values gives one value per polygon (default 1). Scanline based: every
+    row's edge crossings are computed at once and filled with a cumulative sum.
+    """
+    height, width = shape
+    if out is None:
+        out = np.zeros((height, width), dtype=dtype)
+    for k, polygon in enumerate(polygons):
+        value = 1 if values is None else values[k]
+        rows, mask = _polygon_rows(as_vertices(polygon), height, width)
+        if rows is not None:
+            out[rows][mask] = value
+    return out
+
+
+def _polygon_rows(pts, height, width):
+    """Rows covered by a polygon and the boolean mask of those rows."""
+    if len(pts) < 3:
+        return None, None
+    r0 = max(0, math.ceil(pts[:, 1].min() - 0.5))
+    r1 = min(height - 1, math.floor(pts[:, 1].max() - 0.5))
+    if r1 < r0:
+        return None, None
+    yc = np.arange(r0, r1 + 1, dtype=np.float64)[:, None] + 0.5
+    x0, y0 = pts[:, 0], pts[:, 1]
+    x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+    spans = (y0 > yc) != (y1 > yc)
+    dy = y1 - y0
+    slope = np.divide(x1 - x0, dy, out=np.zeros_like(dy), where=dy != 0)
+    xs = np.where(spans, x0 + (yc - y0) * slope, np.inf)
+    xs.sort(axis=1)
+    if xs.shape[1] % 2:
+        xs = np.concatenate([xs, np.full((len(xs), 1), np.inf)], axis=1)
+    starts, ends = xs[:, 0::2], xs[:, 1::2]
+    valid = np.isfinite(starts) & np.isfinite(ends)
+    # Column c is inside a span when start <= c + 0.5 < end.
+    c0 = np.clip(np.ceil(starts - 0.5), 0, width).astype(np.int64)
+    c1 = np.clip(np.ceil(ends - 0.5), 0, width).astype(np.int64)
+    diff = np.zeros((len(xs), width + 1), dtype=np.int32)
+    row_idx = np.broadcast_to(np.arange(len(xs))[:, None], c0.shape)
+    np.add.at(diff, (row_idx[valid], c0[valid]), 1)
+    np.add.at(diff, (row_idx[valid], c1[valid]), -1)
+    mask = np.cumsum(diff, axis=1)[:, :width] > 0
+    return slice(r0, r1 + 1), mask
+
+
+def polygon_iou(polygons1, polygons2, resolution=256):
+    """
+    IoU between two lists of (possibly concave) polygons, shape (N, M). Each
+    pair whose bounding boxes overlap is rasterized on a common grid whose
+    longer side has `resolution` cells, so the result is approximate to about
+    1/resolution of the pair's extent.
+    """
+    polygons1, polygons2 = list(polygons1), list(polygons2)
+    result = np.zeros((len(polygons1), len(polygons2)))
+    if not polygons1 or not polygons2:
+        return result
+    bbox1, bbox2 = polygon_bbox(polygons1), polygon_bbox(polygons2)
+    for i, j in np.argwhere(box_iou(bbox1, bbox2) > 0):
+        lo = np.minimum(bbox1[i, :2], bbox2[j, :2])
+        hi = np.maximum(bbox1[i, 2:], bbox2[j, 2:])
+        scale = resolution / max(hi[0] - lo[0], hi[1] - lo[1], 1e-9)
+        shape = (int(math.ceil((hi[1] - lo[1]) * scale)) + 1, int(math.ceil((hi[0] - lo[0]) * scale)) + 1)
+        a = rasterize_polygons([(as_vertices(polygons1[i]) - lo) * scale], shape, dtype=bool)
+        b = rasterize_polygons([(as_vertices(polygons2[j]) - lo) * scale], shape, dtype=bool)
+        union = np.count_nonzero(a | b)
+        if union:
+            result[i, j] = np.count_nonzero(a & b) / union
+    return result
+
+
+def simplify_polygon(polygon, tolerance):
+    """
+    Ramer-Douglas-Peucker simplification of a closed polygon. Returns the
+    sorted indices of the vertices to keep; every dropped vertex lies within
+    tolerance of the simplified outline. At least 3 vertices are kept when the
+    polygon has them. All open chains of one recursion level are split in a
+    single vectorized pass, so the cost is O(n) per level instead of per chain.
+    """
+    pts = as_vertices(polygon)
+    n = len(pts)
+    if n <= 3 or tolerance <= 0:
+        return np.arange(n)
+    # Split the ring at vertex 0 and the vertex farthest from it; index n is vertex 0 again.
+    far = int(np.argmax(((pts - pts[0]) ** 2).sum(axis=1)))
+    ring = np.concatenate([pts, pts[:1]])
+    keep = np.zeros(n + 1, dtype=bool)
+    keep[[0, far, n]] = True
+    a, b = np.array([0, far]), np.array([far, n])
+    while len(a):
+        inner = b - a - 1
+        a, b, inner = a[inner > 0], b[inner > 0], inner[inner > 0]
+        if not len(a):
+            break
+        seg = np.repeat(np.arange(len(a)), inner)
+        offsets = np.concatenate([[0], np.cumsum(inner)[:-1]])
+        idx = a[seg] + 1 + np.arange(len(seg)) - offsets[seg]
+        p, d = ring[a][seg], (ring[b] - ring[a])[seg]
+        rel = ring[idx] - p
+        length = np.hypot(d[:, 0], d[:, 1])
+        dist = np.where(length > 0,
+                        np.abs(d[:, 0] * rel[:, 1] - d[:, 1] * rel[:, 0]) / np.where(length > 0, length, 1),
+                        np.hypot(rel[:, 0], rel[:, 1]))
+        seg_max = np.maximum.reduceat(dist, offsets)
+        # First index reaching the maximum of each chain.
+        at_max = np.flatnonzero(dist == seg_max[seg])
+        split_seg, first = np.unique(seg[at_max], return_index=True)
+        split = idx[at_max[first]]
+        wide = seg_max[split_seg] > tolerance
+        split_seg, split = split_seg[wide], split[wide]
+        keep[split] = True
+        a = np.concatenate([a[split_seg], split])
+        b = np.concatenate([split, b[split_seg]])
+    keep = keep[:n]
+    if keep.sum() < 3:
+        # Nearly flat polygon: add the vertex farthest from the chord (any other vertex if all are on it).
+        d = pts[far] - pts[0]
+        dist = np.abs(d[0] * (pts[:, 1] - pts[0, 1]) - d[1] * (pts[:, 0] - pts[0, 0]))
+        dist[keep] = -1
+        keep[int(np.argmax(dist))] = True
+    return np.flatnonzero(keep)
+
+
+def box_to_polygon(box):
+    x1, y1, x2, y2 = box
+    return [x1, y1, x2, y1, x2, y2, x1, y2]
@@ -1,25 +1,31 @@
 # annotator/gui.py
 import os
-import glob
 import copy
-import json
+import importlib.util
 import time
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog, ttk
 from PIL import Image, ImageTk
 
-try:
-    import cv2
-except ImportError:
-    cv2 = None
+# OpenCV is only imported when a video is loaded; checking for it is cheap.
+HAS_CV2 = importlib.util.find_spec("cv2") is not None
 
+from .class_index import ClassIndex, assign_class_ids
+from .lod import polygon_canvas_coords
 from .models import Annotation
-from .utils import point_in_polygon
+from .profiling import profiler
+from .project import read_project, write_project
+from .utils import extract_video_frames
+from .widgets import VirtualImageList
 
 
 # Constants for minimum canvas size.
 CANVAS_MIN_WIDTH = 800
 CANVAS_MIN_HEIGHT = 600
+# Coalesced redraws run at most once per display frame (~60 Hz); after a burst
+# of zoom steps the image is resampled once more at full quality.
+FRAME_INTERVAL_MS = 16
+SETTLE_MS = 150
 
 class ImageVideoAnnotator(tk.Tk):
     def __init__(self):
@@ -42,6 +48,7 @@ class ImageVideoAnnotator(tk.Tk):
         self.zoom_factor = 1.0
         self.pan_offset = [0, 0]
         self.labels = []
+        self.class_ids = {}  # label -> stable class id used by the exports (see class_index.py)
         self.annotations = []
         self.undo_stack = []
         self.redo_stack = []
@@ -58,6 +65,37 @@ class ImageVideoAnnotator(tk.Tk):
 
         self.image_status = {}
         self.selected_class = None
+        # Annotations of every image in the project, keyed by image path.
+        # self.annotations holds the live Annotation objects of the current image.
+        self.annotation_store = {}
+        self.image_sizes = {}  # image path -> (width, height), filled lazily
+        self.class_index = ClassIndex()  # label -> images, refreshed from annotation_store on use
+        self.duplicate_of = {}  # near-duplicate image path -> kept image of its group (see dedup.py)
+        self.active_queue = None  # ActiveQueue that Next Image follows (see active_learning.py)
+        self.project_path = None  # project file last loaded or saved
+        self.sync_session = None  # SyncSession while connected to an annotation server (see sync_client.py)
+        self.statistics = None  # DatasetStatistics once View -> Statistics was opened (see statistics.py)
+
+        # Redraw scheduling (see request_redraw) and the cached resized image.
+        self._redraw_job = None
+        self._redraw_fast = False
+        self._redraw_full = False
+        self._redraw_annotations = []  # annotations to redraw alone when no full redraw is pending
+        self._settle_job = None
+        self._last_redraw = 0.0
+        self._display_source = None
+        self._display_key = None
+
+        # Sliced (tiled) inference settings for large images.
+        self.tile_size = 640
+        self.tile_overlap = 0.2
+        self.tile_batch_size = 8
+        # Weights used by AI pre-labeling; models are cached in ai_tools.model_registry.
+        self.prelabel_model_path = "yolo11s.pt"
+
+        # Opt-in latency instrumentation (View -> Profiling, or ANNOTATOR_PROFILE=1).
+        profiler.enabled = os.environ.get("ANNOTATOR_PROFILE", "") not in ("", "0")
+        self.profiling_overlay = False
 
         self.create_header()
         self.create_menu()
@@ -80,8 +118,29 @@ class ImageVideoAnnotator(tk.Tk):
                              background="#007acc", foreground="white")
         self.style.map("SelectedClass.TButton", background=[("active", "#005b99")])
 
-    def point_in_polygon(self, x, y, poly_points):
-        return point_in_polygon(x, y, poly_points)
+    def annotation_at(self, x, y):
+        """
+        Topmost-in-list annotation under canvas point (x, y), or None. The click
+        is converted to image coordinates once and tested against all boxes and
+        polygons in one batch.
+        """
+        import numpy as np
+        from .geometry import points_in_polygons
+
+        ix, iy = self.canvas_to_image(x, y)
+        boxes = [(i, ann.points) for i, ann in enumerate(self.annotations) if ann.type == "bbox"]
+        polygons = [(i, ann.points) for i, ann in enumerate(self.annotations)
+                    if ann.type == "polygon" and len(ann.points) >= 6]
+        hits = []
+        if boxes:
+            b = np.asarray([pts for _, pts in boxes], dtype=np.float64)
+            inside = ((np.minimum(b[:, 0], b[:, 2]) <= ix) & (ix <= np.maximum(b[:, 0], b[:, 2]))
+                      & (np.minimum(b[:, 1], b[:, 3]) <= iy) & (iy <= np.maximum(b[:, 1], b[:, 3])))
+            hits.extend(boxes[k][0] for k in np.flatnonzero(inside))
+        if polygons:
+            inside = points_in_polygons([[ix, iy]], [pts for _, pts in polygons])[0]
+            hits.extend(polygons[k][0] for k in np.flatnonzero(inside))
+        return self.annotations[min(hits)] if hits else None
 
     def create_header(self):
         header_frame = ttk.Frame(self, padding=10)
@@ -90,18 +149,25 @@ class ImageVideoAnnotator(tk.Tk):
                                  text="YOLO / Mask R-CNN Annotator",
                                  style="Header.TLabel")
         header_label.pack(side=tk.TOP)
+        # Latency overlay; packed only while View -> Profiling -> Show Stats is on.
+        self.profiling_label = ttk.Label(header_frame, text="", font=("Courier", 9))
+        # Progress through the active-learning queue; packed only while one is active.
+        self.active_queue_label = ttk.Label(header_frame, text="")
 
     def create_menu(self):
         self.menu_bar = tk.Menu(self)
         # File Menu
         file_menu = tk.Menu(self.menu_bar, tearoff=0)
         file_menu.add_command(label="Load Image Folder", command=self.load_folder)
-        if cv2:
+        if HAS_CV2:
             file_menu.add_command(label="Load Video", command=self.load_video)
         file_menu.add_separator()
         file_menu.add_command(label="Save Project", command=self.save_project)
         file_menu.add_command(label="Load Project", command=self.load_project)
         file_menu.add_separator()
+        file_menu.add_command(label="Connect to Server...", command=self.connect_to_server)
+        file_menu.add_command(label="Disconnect from Server", command=self.disconnect_from_server)
+        file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.on_exit)
         self.menu_bar.add_cascade(label="File", menu=file_menu)
         # Edit Menu
@@ -117,6 +183,19 @@ class ImageVideoAnnotator(tk.Tk):
         theme_menu.add_command(label="Light Mode", command=lambda: self.set_theme("light"))
         theme_menu.add_command(label="Dark Mode", command=lambda: self.set_theme("dark"))
         view_menu.add_cascade(label="Themes", menu=theme_menu)
+        view_menu.add_command(label="Thumbnail Grid", command=self.show_thumbnails)
+        view_menu.add_command(label="Statistics", command=self.show_statistics)
+        profiling_menu = tk.Menu(view_menu, tearoff=0)
+        self.profiling_var = tk.BooleanVar(value=profiler.enabled)
+        self.profiling_overlay_var = tk.BooleanVar(value=False)
+        profiling_menu.add_checkbutton(label="Record Latencies", variable=self.profiling_var,
+                                       command=self.toggle_profiling)
+        profiling_menu.add_checkbutton(label="Show Stats", variable=self.profiling_overlay_var,
+                                       command=self.toggle_profiling_overlay)
+        profiling_menu.add_command(label="Start/Stop cProfile Capture", command=self.toggle_cprofile_capture)
+        profiling_menu.add_command(label="Save Latency Report...", command=self.save_profiling_report)
+        profiling_menu.add_command(label="Reset Latencies", command=profiler.reset)
+        view_menu.add_cascade(label="Profiling", menu=profiling_menu)
         self.menu_bar.add_cascade(label="View", menu=view_menu)
         # Project Menu
         project_menu = tk.Menu(self.menu_bar, tearoff=0)
@@ -129,13 +208,22 @@ class ImageVideoAnnotator(tk.Tk):
         export_menu.add_command(label="Export Pascal VOC", command=self.export_voc)
         export_menu.add_command(label="Export COCO JSON", command=self.export_coco)
         export_menu.add_command(label="Export CSV", command=self.export_csv)
+        export_menu.add_command(label="Export Masks (PNG)", command=self.export_masks)
         self.menu_bar.add_cascade(label="Export", menu=export_menu)
         # Tools Menu
         tools_menu = tk.Menu(self.menu_bar, tearoff=0)
         tools_menu.add_command(label="AI Pre-label (YOLOv11)", command=self.ai_prelabel)
+        tools_menu.add_command(label="AI Pre-label (Tiled, Large Images)", command=self.ai_prelabel_tiled)
+        tools_menu.add_command(label="Select Pre-label Model", command=self.select_prelabel_model)
         tools_menu.add_command(label="Train Custom Model", command=self.train_custom_model)
+        tools_menu.add_command(label="Resume Training", command=self.resume_training)
         tools_menu.add_command(label="Test Model", command=self.test_model)  # New test model option
+        tools_menu.add_command(label="Propagate to Next Frames", command=self.propagate_to_next_frames)
         tools_menu.add_command(label="Quality Check", command=self.quality_check)
+        tools_menu.add_command(label="Audit Labels with Model", command=self.audit_labels)
+        tools_menu.add_command(label="Find Near-Duplicates", command=self.find_duplicates)
+        tools_menu.add_command(label="Active Learning Queue", command=self.active_learning)
+        tools_menu.add_command(label="Stop Active Learning Queue", command=self.stop_active_queue)
         tools_menu.add_command(label="Split Dataset", command=self.split_dataset)
         self.menu_bar.add_cascade(label="Tools", menu=tools_menu)
         
@@ -151,13 +239,14 @@ class ImageVideoAnnotator(tk.Tk):
         self.left_frame.pack(side=tk.LEFT, fill=tk.Y)
         self.btn_load_folder = ttk.Button(self.left_frame, text="Load Folder", command=self.load_folder)
         self.btn_load_folder.pack(fill=tk.X, pady=5)
-        self.tree = ttk.Treeview(self.left_frame, columns=("Filename",), show="headings", height=25)
-        self.tree.heading("Filename", text="Image Files")
-        self.tree.column("Filename", width=280)
+        self.image_filter_var = tk.StringVar(value="All images")
+        self.image_filter = ttk.Combobox(self.left_frame, textvariable=self.image_filter_var, state="readonly",
+                                         postcommand=self.update_image_filter_choices)
+        self.image_filter.pack(fill=tk.X, pady=(0, 5))
+        self.image_filter.bind("<<ComboboxSelected>>", lambda event: self.apply_image_filter())
+        self.update_image_filter_choices()
+        self.tree = VirtualImageList(self.left_frame, tag_for=self.image_tag, on_select=self.on_tree_select)
         self.tree.pack(fill=tk.BOTH, expand=True)
-        self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
-        self.tree.tag_configure("incomplete", background="light coral")
-        self.tree.tag_configure("completed", background="light green")
 
         # Right Frame: Canvas and Class Sidebar
         self.right_frame = ttk.Frame(self, padding=10)
@@ -256,7 +345,7 @@ class ImageVideoAnnotator(tk.Tk):
         self.canvas.bind("<Configure>", self.on_canvas_configure)
 
     def on_canvas_configure(self, event):
-        self.redraw_canvas()
+        self.request_redraw()
 
     def apply_theme(self):
         if self.current_theme == "dark":
@@ -278,24 +367,30 @@ class ImageVideoAnnotator(tk.Tk):
     def load_folder(self):
         folder = filedialog.askdirectory(title="Select Folder with Images")
         if folder:
-            extensions = ("*.jpg", "*.jpeg", "*.png", "*.bmp", "*.tiff", "*.webp")
-            self.image_list = []
-            for ext in extensions:
-                self.image_list.extend(glob.glob(os.path.join(folder, ext)))
-            self.image_list.sort()
+            self.disconnect_from_server()
+            from .file_index import FileIndex
+            index = FileIndex(folder)
+            try:
+                self.image_list = index.scan()
+                self.image_sizes = index.known_dimensions()
+            finally:
+                index.close()
             if not self.image_list:
                 messagebox.showerror("Error", "No image files found in this folder!")
                 return
             self.ask_labels()
+            self.class_ids = {}
             self.update_class_buttons()
-            self.image_status = {}
-            for widget in self.tree.get_children():
-                self.tree.delete(widget)
-            for idx, img in enumerate(self.image_list):
-                self.image_status[img] = False
-                self.tree.insert("", "end", iid=idx, values=(os.path.basename(img),), tags=("incomplete",))
+            self.image_status = {img: False for img in self.image_list}
+            self.annotation_store = {}
+            self.duplicate_of = {}
+            self.stop_active_queue()
+            self.image_path = None
+            self.reset_image_list()
             self.current_image_index = 0
+            self.tree.select(0)
             self.load_image(self.image_list[0])
+            self.project_loaded()
 
     def ask_labels(self):
         label_str = simpledialog.askstring("Input Labels",
@@ -306,13 +401,20 @@ class ImageVideoAnnotator(tk.Tk):
         else:
             self.labels = []
 
+    def store_current_annotations(self):
+        if self.image_path:
+            self.annotation_store[self.image_path] = [ann.to_dict() for ann in self.annotations]
+
+    @profiler.timed("load_image")
     def load_image(self, image_path):
-        self.image_path = image_path
+        self.store_current_annotations()
         try:
             self.image_obj = Image.open(image_path).convert("RGB")
         except Exception as e:
             messagebox.showerror("Error", f"Cannot open image: {e}")
             return
+        self.image_path = image_path
+        self.image_sizes[image_path] = self.image_obj.size
         self.zoom_factor = 1.0
         self.pan_offset = [0, 0]
         self.canvas.update_idletasks()
@@ -320,23 +422,91 @@ class ImageVideoAnnotator(tk.Tk):
         canvas_height = max(self.canvas.winfo_height(), CANVAS_MIN_HEIGHT)
         orig_width, orig_height = self.image_obj.size
         self.initial_scale = min(canvas_width / orig_width, canvas_height / orig_height, 1)
-        self.annotations = []
+        self.annotations = [Annotation.from_dict(d) for d in self.annotation_store.get(image_path, [])]
         self.undo_stack = []
         self.redo_stack = []
         self.selected_annotation = None
         self.redraw_canvas()
+        if self.sync_session is not None:
+            from .sync_client import sync_now
+            self.sync_session.request_checkout(image_path)
+            sync_now(self)
+
+    def request_redraw(self, fast=False, annotation=None):
+        """
+        Schedule a redraw instead of drawing right away. Motion, wheel and resize
+        events only update state and call this, so a burst of events costs one
+        redraw when Tk is idle, at most once per FRAME_INTERVAL_MS.
+        fast=True resamples the image with a cheap filter and schedules a
+        full-quality redraw once the requests have stopped for SETTLE_MS.
+        annotation limits the redraw to that annotation's canvas items.
+        """
+        if annotation is None:
+            self._redraw_full = True
+        elif not any(ann is annotation for ann in self._redraw_annotations):
+            self._redraw_annotations.append(annotation)
+        self._redraw_fast = self._redraw_fast or fast
+        if self._redraw_job is None:
+            wait = FRAME_INTERVAL_MS - (time.perf_counter() - self._last_redraw) * 1000
+            if wait > 0:
+                self._redraw_job = self.after(int(wait) + 1, self._run_scheduled_redraw)
+            else:
+                self._redraw_job = self.after_idle(self._run_scheduled_redraw)
+        if fast:
+            if self._settle_job is not None:
+                self.after_cancel(self._settle_job)
+            self._settle_job = self.after(SETTLE_MS, self._run_settle_redraw)
+
+    def _run_scheduled_redraw(self):
+        self._redraw_job = None
+        fast, self._redraw_fast = self._redraw_fast, False
+        if self._redraw_full:
+            self.redraw_canvas(fast=fast)
+            return
+        annotations, self._redraw_annotations = self._redraw_annotations, []
+        self._last_redraw = time.perf_counter()
+        for ann in annotations:
+            if any(ann is current for current in self.annotations):
+                self.draw_annotation(ann)
+
+    def _run_settle_redraw(self):
+        self._settle_job = None
+        self.redraw_canvas()
 
-    def redraw_canvas(self):
+    def get_display_image(self, size, fast=False):
+        """
+        PhotoImage of the current image resized to size. The last result is reused
+        while the image and size are unchanged, so pans and annotation edits do
+        not resample the image again.
+        """
+        key = (size, fast)
+        if self._display_source is self.image_obj and self._display_key in (key, (size, False)):
+            return self.display_image
+        try:
+            resample_filter = Image.Resampling.BILINEAR if fast else Image.Resampling.LANCZOS
+        except AttributeError:
+            resample_filter = Image.BILINEAR if fast else Image.LANCZOS
+        self.display_image = ImageTk.PhotoImage(self.image_obj.resize(size, resample_filter))
+        self._display_source = self.image_obj
+        self._display_key = key
+        return self.display_image
+
+    @profiler.timed("redraw_canvas")
+    def redraw_canvas(self, fast=False):
+        profiler.frame(self)
+        if self._redraw_job is not None:
+            # Drawing now satisfies any pending request.
+            self.after_cancel(self._redraw_job)
+            self._redraw_job = None
+            self._redraw_fast = False
+        self._redraw_full = False
+        self._redraw_annotations = []
+        self._last_redraw = time.perf_counter()
         self.canvas.delete("all")
         if self.image_obj:
             scale = self.initial_scale * self.zoom_factor
-            new_size = (int(self.image_obj.width * scale), int(self.image_obj.height * scale))
-            try:
-                resample_filter = Image.Resampling.LANCZOS
-            except AttributeError:
-                resample_filter = Image.LANCZOS
-            resized_image = self.image_obj.resize(new_size, resample_filter)
-            self.display_image = ImageTk.PhotoImage(resized_image)
+            new_size = (max(1, int(self.image_obj.width * scale)), max(1, int(self.image_obj.height * scale)))
+            self.get_display_image(new_size, fast)
             self.canvas.create_image(self.pan_offset[0], self.pan_offset[1], anchor=tk.NW, image=self.display_image)
             for ann in self.annotations:
                 self.draw_annotation(ann)
@@ -353,24 +523,23 @@ class ImageVideoAnnotator(tk.Tk):
         for cid in ann.canvas_ids:
             self.canvas.delete(cid)
         ann.canvas_ids = []
+        selected = ann is self.selected_annotation
         if ann.type == "bbox":
             x1, y1, x2, y2 = ann.points
             c1 = self.image_to_canvas(x1, y1)
             c2 = self.image_to_canvas(x2, y2)
             rect_id = self.canvas.create_rectangle(c1[0], c1[1], c2[0], c2[1],
-                                                   outline="red", width=2, tags=("annotation", "bbox"))
+                                                   outline="cyan" if selected else "red",
+                                                   width=3 if selected else 2, tags=("annotation", "bbox"))
             ann.canvas_ids.append(rect_id)
             text_id = self.canvas.create_text(c1[0] + 5, c1[1] + 5,
                                               anchor=tk.NW, text=ann.label, fill="yellow",
                                               tags=("annotation", "annotation_text"))
             ann.canvas_ids.append(text_id)
         elif ann.type == "polygon":
-            pts = []
-            for i in range(0, len(ann.points), 2):
-                cx, cy = self.image_to_canvas(ann.points[i], ann.points[i+1])
-                pts.extend([cx, cy])
-            poly_id = self.canvas.create_polygon(pts, outline="green", fill="", width=2,
-                                                   tags=("annotation", "polygon"))
+            pts = polygon_canvas_coords(ann, self.initial_scale * self.zoom_factor, self.pan_offset)
+            poly_id = self.canvas.create_polygon(pts, outline="cyan" if selected else "green", fill="",
+                                                 width=3 if selected else 2, tags=("annotation", "polygon"))
             ann.canvas_ids.append(poly_id)
             if len(pts) >= 2:
                 text_id = self.canvas.create_text(pts[0] + 5, pts[1] + 5,
@@ -402,51 +571,60 @@ class ImageVideoAnnotator(tk.Tk):
         if not self.selected_class:
             messagebox.showerror("Error", "Please select a class to remove.")
         else:
-            self.labels.remove(self.selected_class)
-            self.selected_class = self.labels[0] if self.labels else None
-            self.update_class_buttons()
+            from .class_index import confirm_delete_class
+            confirm_delete_class(self, self.selected_class)
 
+    @profiler.timed("mouse.press")
     def on_left_button_press(self, event):
+        previous = self.selected_annotation
+        try:
+            self._handle_left_button_press(event)
+        finally:
+            if self.selected_annotation is not previous:
+                self.refresh_selection(previous)
+
+    def refresh_selection(self, previous):
+        """Recolor the previously and the newly selected annotation without a full redraw."""
+        for ann in (previous, self.selected_annotation):
+            if ann is not None and ann in self.annotations:
+                self.draw_annotation(ann)
+
+    def move_annotation_items(self, ann, dx, dy):
+        """Drag preview: shift the annotation's canvas items instead of redrawing everything."""
+        for cid in ann.canvas_ids:
+            self.canvas.move(cid, dx, dy)
+
+    def _handle_left_button_press(self, event):
         if self.edit_mode:
             found = False
             threshold = 10
-            for ann in self.annotations:
+            ann = self.annotation_at(event.x, event.y)
+            if ann is not None:
+                self.selected_annotation = ann
+                found = True
                 if ann.type == "bbox":
                     x1, y1, x2, y2 = ann.points
                     c1 = self.image_to_canvas(x1, y1)
                     c2 = self.image_to_canvas(x2, y2)
                     left, right = min(c1[0], c2[0]), max(c1[0], c2[0])
                     top, bottom = min(c1[1], c2[1]), max(c1[1], c2[1])
-                    if left <= event.x <= right and top <= event.y <= bottom:
-                        self.selected_annotation = ann
-                        found = True
-                        handles = {
-                            "tl": (left, top),
-                            "tr": (right, top),
-                            "bl": (left, bottom),
-                            "br": (right, bottom)
-                        }
-                        self.resize_mode = False
-                        self.move_mode = False
-                        for key, pos in handles.items():
-                            dist = ((event.x - pos[0])**2 + (event.y - pos[1])**2)**0.5
-                            if dist < threshold:
-                                self.resize_mode = True
-                                self.resize_handle = key
-                                break
-                        if not self.resize_mode:
-                            self.move_mode = True
-                        self.start_point = (event.x, event.y)
-                        break
-                elif ann.type == "polygon":
-                    poly_canvas = []
-                    for i in range(0, len(ann.points), 2):
-                        pt = self.image_to_canvas(ann.points[i], ann.points[i+1])
-                        poly_canvas.append(pt)
-                    if self.point_in_polygon(event.x, event.y, poly_canvas):
-                        self.selected_annotation = ann
-                        found = True
-                        break
+                    handles = {
+                        "tl": (left, top),
+                        "tr": (right, top),
+                        "bl": (left, bottom),
+                        "br": (right, bottom)
+                    }
+                    self.resize_mode = False
+                    self.move_mode = False
+                    for key, pos in handles.items():
+                        dist = ((event.x - pos[0])**2 + (event.y - pos[1])**2)**0.5
+                        if dist < threshold:
+                            self.resize_mode = True
+                            self.resize_handle = key
+                            break
+                    if not self.resize_mode:
+                        self.move_mode = True
+                    self.start_point = (event.x, event.y)
             if not found:
                 self.selected_annotation = None
             return
@@ -473,6 +651,7 @@ class ImageVideoAnnotator(tk.Tk):
                     self.canvas.create_line(self.temp_polygon_points[-2][0], self.temp_polygon_points[-2][1],
                                             event.x, event.y, fill="blue", dash=(2, 2), tags="temp_polygon")
 
+    @profiler.timed("mouse.drag")
     def on_left_button_drag(self, event):
         if self.edit_mode:
             if self.selected_annotation is None:
@@ -494,7 +673,7 @@ class ImageVideoAnnotator(tk.Tk):
                     elif self.resize_handle == "br":
                         self.selected_annotation.points[2] = x_new
                         self.selected_annotation.points[3] = y_new
-                    self.redraw_canvas()
+                    self.request_redraw(annotation=self.selected_annotation)
                 elif self.move_mode:
                     dx = event.x - self.start_point[0]
                     dy = event.y - self.start_point[1]
@@ -505,7 +684,7 @@ class ImageVideoAnnotator(tk.Tk):
                     self.selected_annotation.points[2] += dx_img
                     self.selected_annotation.points[3] += dy_img
                     self.start_point = (event.x, event.y)
-                    self.redraw_canvas()
+                    self.move_annotation_items(self.selected_annotation, dx, dy)
             return
         else:
             if self.drawing and self.annotation_mode == "bbox" and hasattr(self, "temp_draw"):
@@ -523,8 +702,9 @@ class ImageVideoAnnotator(tk.Tk):
                     self.selected_annotation.points = [p + dx_img if i % 2 == 0 else p + dy_img
                                                        for i, p in enumerate(self.selected_annotation.points)]
                 self.start_point = (event.x, event.y)
-                self.redraw_canvas()
+                self.move_annotation_items(self.selected_annotation, dx, dy)
 
+    @profiler.timed("mouse.release")
     def on_left_button_release(self, event):
         if self.edit_mode:
             self.move_mode = False
@@ -553,7 +733,8 @@ class ImageVideoAnnotator(tk.Tk):
                     self.redraw_canvas()
             elif self.selected_annotation:
                 self.push_undo_state()
-                self.selected_annotation = None
+                previous, self.selected_annotation = self.selected_annotation, None
+                self.refresh_selection(previous)
 
     def on_double_click(self, event):
         if self.annotation_mode == "polygon" and len(self.temp_polygon_points) > 2:
@@ -577,6 +758,7 @@ class ImageVideoAnnotator(tk.Tk):
             self.temp_polygon_points = []
             self.redraw_canvas()
 
+    @profiler.timed("mouse.wheel")
     def on_mouse_wheel(self, event):
         if event.num == 5 or event.delta < 0:
             factor = 0.9
@@ -585,18 +767,24 @@ class ImageVideoAnnotator(tk.Tk):
         else:
             factor = 1.0
         self.zoom_factor *= factor
-        self.redraw_canvas()
+        self.request_redraw(fast=True)
 
     def on_right_button_press(self, event):
         self.pan_start = (event.x, event.y)
 
+    @profiler.timed("mouse.pan")
     def on_right_button_drag(self, event):
         dx = event.x - self.pan_start[0]
         dy = event.y - self.pan_start[1]
         self.pan_offset[0] += dx
         self.pan_offset[1] += dy
         self.pan_start = (event.x, event.y)
-        self.redraw_canvas()
+        # Everything on the canvas is positioned relative to the pan offset, so
+        # panning is a translation of all items; nothing has to be redrawn.
+        self.canvas.move("all", dx, dy)
+        self.temp_polygon_points = [(x + dx, y + dy) for x, y in self.temp_polygon_points]
+        if self.drawing and self.start_point:
+            self.start_point = (self.start_point[0] + dx, self.start_point[1] + dy)
 
     def toggle_annotation_mode(self):
         if self.annotation_mode == "bbox":
@@ -628,19 +816,30 @@ class ImageVideoAnnotator(tk.Tk):
         state = copy.deepcopy([ann.to_dict() for ann in self.annotations])
         self.undo_stack.append(state)
         self.redo_stack.clear()
+        self.annotations_changed()
+
+    def annotations_changed(self):
+        """Called after every add, edit and delete of the current image's annotations (and undo / redo)."""
+        if self.statistics is not None:
+            from .statistics import update_current_image
+            update_current_image(self)
 
+    @profiler.timed("undo")
     def undo(self):
         if self.undo_stack:
             state = self.undo_stack.pop()
             self.redo_stack.append(copy.deepcopy([ann.to_dict() for ann in self.annotations]))
             self.annotations = [Annotation.from_dict(d) for d in state]
+            self.annotations_changed()
             self.redraw_canvas()
 
+    @profiler.timed("redo")
     def redo(self):
         if self.redo_stack:
             state = self.redo_stack.pop()
             self.undo_stack.append(copy.deepcopy([ann.to_dict() for ann in self.annotations]))
             self.annotations = [Annotation.from_dict(d) for d in state]
+            self.annotations_changed()
             self.redraw_canvas()
 
     def delete_selected_annotation(self):
@@ -661,167 +860,268 @@ class ImageVideoAnnotator(tk.Tk):
         export_yolo_format(self)
 
     def next_image(self):
+        if self.active_queue is not None:
+            self.store_current_annotations()
+            path = self.active_queue.next_path(self.image_path, self.image_done_for_queue)
+            if path is None:
+                self.stop_active_queue()
+                messagebox.showinfo("Info", "Active-learning queue finished; Next Image follows the file order again.")
+            else:
+                self.goto_image(path)
+                self.update_active_queue_status()
+            return
         if self.current_image_index < len(self.image_list) - 1:
             self.current_image_index += 1
-            self.tree.selection_set(self.current_image_index)
+            self.tree.select(self.current_image_index)
             self.load_image(self.image_list[self.current_image_index])
         else:
             messagebox.showinfo("Info", "Last image reached.")
 
+    def image_done_for_queue(self, path):
+        """Completed images, and images annotated since ranking, are skipped by the queue."""
+        if self.image_status.get(path, False):
+            return True
+        return self.active_queue.method != "disagreement" and bool(self.annotation_store.get(path))
+
+    def update_active_queue_status(self):
+        if self.active_queue is None:
+            self.active_queue_label.pack_forget()
+            return
+        remaining = self.active_queue.remaining(self.image_done_for_queue)
+        self.active_queue_label.config(
+            text=f"Active learning ({self.active_queue.method}): {remaining} of {len(self.active_queue)} images left")
+        self.active_queue_label.pack(side=tk.TOP)
+
+    def stop_active_queue(self):
+        self.active_queue = None
+        self.update_active_queue_status()
+
     def previous_image(self):
         if self.current_image_index > 0:
             self.current_image_index -= 1
-            self.tree.selection_set(self.current_image_index)
+            self.tree.select(self.current_image_index)
             self.load_image(self.image_list[self.current_image_index])
         else:
             messagebox.showinfo("Info", "This is the first image.")
 
-    def on_tree_select(self, event):
-        selected = self.tree.selection()
-        if selected:
-            idx = int(selected[0])
+    def on_tree_select(self, idx):
+        if idx == self.current_image_index and self.image_path == self.image_list[idx]:
+            return
+        self.current_image_index = idx
+        self.load_image(self.image_list[idx])
+
+    def image_tag(self, idx):
+        return "completed" if self.image_status.get(self.image_list[idx], False) else "incomplete"
+
+    def set_image_completed(self, image_path, completed=True):
+        self.image_status[image_path] = completed
+        if image_path == self.image_path:
+            self.tree.refresh_row(self.current_image_index)
+        elif image_path in self.image_list:
+            self.tree.refresh_row(self.image_list.index(image_path))
+
+    def reset_image_list(self):
+        self.image_filter_var.set("All images")
+        self.tree.set_items(self.image_list)
+
+    def update_image_filter_choices(self):
+        self.image_filter["values"] = ["All images", "Completed", "Incomplete", "Skip near-duplicates"] + \
+            [f"Has class: {lab}" for lab in self.labels]
+
+    def apply_image_filter(self):
+        """Filter the image list without rebuilding it."""
+        choice = self.image_filter_var.get()
+        if choice == "Completed":
+            predicate = lambda i: self.image_status.get(self.image_list[i], False)
+        elif choice == "Incomplete":
+            predicate = lambda i: not self.image_status.get(self.image_list[i], False)
+        elif choice == "Skip near-duplicates":
+            predicate = lambda i: self.image_list[i] not in self.duplicate_of
+        elif choice.startswith("Has class: "):
+            label = choice[len("Has class: "):]
+            self.store_current_annotations()
+            with_label = set(self.class_index.refresh(self.annotation_store).images_with(label))
+            predicate = lambda i: self.image_list[i] in with_label
+        else:
+            predicate = None
+        self.tree.set_filter(predicate)
+
+    def goto_image(self, image_path, annotation_index=None):
+        """Show image_path and optionally highlight one of its annotations."""
+        if image_path not in self.image_list:
+            return
+        idx = self.image_list.index(image_path)
+        if image_path != self.image_path:
             self.current_image_index = idx
-            self.load_image(self.image_list[idx])
+            self.load_image(image_path)
+            self.tree.select(idx)
+        if annotation_index is not None and annotation_index < len(self.annotations):
+            self.selected_annotation = self.annotations[annotation_index]
+        self.redraw_canvas()
 
     def save_project(self):
+        self.store_current_annotations()
         project = {
             "image_list": self.image_list,
             "current_image_index": self.current_image_index,
             "labels": self.labels,
-            "annotations": [ann.to_dict() for ann in self.annotations]
+            "class_ids": assign_class_ids(self.labels, self.class_ids),
+            "annotations": [ann.to_dict() for ann in self.annotations],
+            "annotation_store": self.annotation_store,
+            "duplicate_of": self.duplicate_of,
+            "active_queue": self.active_queue.to_dict() if self.active_queue else None
         }
         file_path = filedialog.asksaveasfilename(defaultextension=".json",
                                                  filetypes=[("JSON files", "*.json")])
         if file_path:
-            with open(file_path, "w") as f:
-                json.dump(project, f, indent=2)
+            write_project(file_path, project)
+            self.project_path = file_path
             messagebox.showinfo("Project Saved", f"Project saved to {file_path}")
 
     def load_project(self):
         file_path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
         if file_path:
-            with open(file_path, "r") as f:
-                project = json.load(f)
-            self.image_list = project.get("image_list", [])
-            self.current_image_index = project.get("current_image_index", 0)
-            self.labels = project.get("labels", [])
+            self.disconnect_from_server()
+            project = read_project(file_path)
+            self.project_path = file_path
+            self.image_list = project["image_list"]
+            self.current_image_index = project["current_image_index"]
+            self.labels = project["labels"]
+            self.class_ids = project["class_ids"]
             self.update_class_buttons()
-            ann_dicts = project.get("annotations", [])
-            self.annotations = [Annotation.from_dict(d) for d in ann_dicts]
-            for widget in self.tree.get_children():
-                self.tree.delete(widget)
-            for idx, img in enumerate(self.image_list):
-                tag = "completed" if self.image_status.get(img, False) else "incomplete"
-                self.tree.insert("", "end", iid=idx, values=(os.path.basename(img),), tags=(tag,))
+            self.annotation_store = project["annotation_store"]
+            self.duplicate_of = project["duplicate_of"]
+            self.active_queue = None
+            if project["active_queue"]:
+                from .active_learning import ActiveQueue
+                self.active_queue = ActiveQueue.from_dict(project["active_queue"], self.image_list)
+            self.update_active_queue_status()
+            self.image_path = None
+            self.annotations = []
+            self.reset_image_list()
             if self.image_list:
+                self.tree.select(self.current_image_index)
                 self.load_image(self.image_list[self.current_image_index])
+            self.project_loaded()
             messagebox.showinfo("Project Loaded", f"Project loaded from {file_path}")
 
     def auto_save_project(self):
         temp_file = "autosave_project.json"
+        self.store_current_annotations()
         project = {
             "image_list": self.image_list,
             "current_image_index": self.current_image_index,
             "labels": self.labels,
+            "class_ids": assign_class_ids(self.labels, self.class_ids),
             "annotations": [ann.to_dict() for ann in self.annotations],
+            "annotation_store": self.annotation_store,
+            "duplicate_of": self.duplicate_of,
+            "active_queue": self.active_queue.to_dict() if self.active_queue else None,
             "timestamp": time.time()
         }
-        with open(temp_file, "w") as f:
-            json.dump(project, f, indent=2)
+        write_project(temp_file, project)
         self.after(self.auto_save_interval, self.auto_save_project)
 
+    def project_loaded(self):
+        if self.statistics is not None:
+            from .statistics import project_loaded
+            project_loaded(self)
+
+    def connect_to_server(self):
+        from .sync_client import connect_to_server
+        connect_to_server(self)
+
+    def disconnect_from_server(self):
+        if self.sync_session is None:
+            return
+        from .sync_client import disconnect_from_server
+        disconnect_from_server(self)
+        self.system_message_label.config(text="Disconnected from the annotation server.")
+
     def load_video(self):
-        if not cv2:
+        if not HAS_CV2:
             messagebox.showerror("Error", "OpenCV is not installed. Video annotation is unavailable.")
             return
         video_path = filedialog.askopenfilename(title="Select Video File",
                                                 filetypes=[("Video files", "*.mp4;*.avi;*.mov")])
         if video_path:
-            cap = cv2.VideoCapture(video_path)
-            frames = []
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                pil_img = Image.fromarray(frame)
-                frames.append(pil_img)
-            cap.release()
-            temp_dir = "video_frames_temp"
-            os.makedirs(temp_dir, exist_ok=True)
-            self.image_list = []
-            for idx, frame in enumerate(frames):
-                frame_path = os.path.join(temp_dir, f"frame_{idx}.png")
-                frame.save(frame_path)
-                self.image_list.append(frame_path)
-            for widget in self.tree.get_children():
-                self.tree.delete(widget)
-            for idx, img in enumerate(self.image_list):
-                self.tree.insert("", "end", iid=idx, values=(os.path.basename(img),))
+            self.disconnect_from_server()
+            frame_paths = extract_video_frames(video_path, "video_frames_temp")
+            if not frame_paths:
+                messagebox.showerror("Error", "No frames could be read from the video.")
+                return
+            self.image_list = frame_paths
+            self.annotation_store = {}
+            self.duplicate_of = {}
+            self.stop_active_queue()
+            self.image_path = None
+            self.image_status = {img: False for img in self.image_list}
+            self.reset_image_list()
             self.current_image_index = 0
+            self.tree.select(0)
             self.load_image(self.image_list[0])
+            self.project_loaded()
             messagebox.showinfo("Video Loaded", f"Loaded {len(self.image_list)} frames from video.")
 
     def ai_prelabel(self):
         from .ai_tools import ai_prelabel
         ai_prelabel(self)
 
+    def ai_prelabel_tiled(self):
+        from .ai_tools import ai_prelabel_tiled
+        ai_prelabel_tiled(self)
+
+    def select_prelabel_model(self):
+        from .ai_tools import select_prelabel_model
+        select_prelabel_model(self)
+
     def train_custom_model(self):
         from .ai_tools import train_custom_model
         train_custom_model(self)
 
+    def resume_training(self):
+        from .ai_tools import resume_training
+        resume_training(self)
+
+    def propagate_to_next_frames(self):
+        from .tracking import propagate_to_next_frames
+        propagate_to_next_frames(self)
+
+    def show_thumbnails(self):
+        from .thumbnails import show_thumbnail_grid
+        show_thumbnail_grid(self)
+
+    def show_statistics(self):
+        from .statistics import show_statistics
+        show_statistics(self)
+
     def quality_check(self):
-        overlaps = 0
-        for i, ann1 in enumerate(self.annotations):
-            if ann1.type != "bbox":
-                continue
-            x1, y1, x2, y2 = ann1.points
-            for j, ann2 in enumerate(self.annotations):
-                if i >= j or ann2.type != "bbox":
-                    continue
-                a1 = max(x1, ann2.points[0])
-                b1 = max(y1, ann2.points[1])
-                a2 = min(x2, ann2.points[2])
-                b2 = min(y2, ann2.points[3])
-                if a2 > a1 and b2 > b1:
-                    overlaps += 1
-        messagebox.showinfo("Quality Check", f"Found {overlaps} overlapping bounding boxes.")
+        from .quality import quality_check
+        quality_check(self)
+
+    def active_learning(self):
+        from .active_learning import active_learning
+        active_learning(self)
+
+    def find_duplicates(self):
+        from .dedup import find_duplicates
+        find_duplicates(self)
+
+    def audit_labels(self):
+        from .audit import audit_labels
+        audit_labels(self)
 
     def split_dataset(self):
-        messagebox.showinfo("Split Dataset", "Dataset split functionality is not fully implemented in this demo.")
+        from .dataset_tools import split_dataset
+        split_dataset(self)
 
     def manage_labels(self):
-        dialog = tk.Toplevel(self)
-        dialog.title("Manage Classes")
-        dialog.geometry("300x300")
-        listbox = tk.Listbox(dialog)
-        listbox.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        for lab in self.labels:
-            listbox.insert(tk.END, lab)
-        entry = ttk.Entry(dialog)
-        entry.pack(padx=5, pady=5)
-        def add_label():
-            new_lab = entry.get().strip()
-            if new_lab and new_lab not in self.labels:
-                self.labels.append(new_lab)
-                listbox.insert(tk.END, new_lab)
-                entry.delete(0, tk.END)
-                self.update_class_buttons()
-        def remove_label():
-            sel = listbox.curselection()
-            if sel:
-                lab = listbox.get(sel)
-                self.labels.remove(lab)
-                listbox.delete(sel)
-                if self.selected_class == lab:
-                    self.selected_class = self.labels[0] if self.labels else None
-                self.update_class_buttons()
-        ttk.Button(dialog, text="Add Class", command=add_label).pack(pady=5)
-        ttk.Button(dialog, text="Remove Selected", command=remove_label).pack(pady=5)
+        from .class_index import manage_classes
+        manage_classes(self)
 
     def test_model(self):
-        from annotator.ai_tools import test_model
-        test_model(self)
+        from annotator.ai_tools import test_model_ui
+        test_model_ui(self)
 
 
     def export_yolo(self):
@@ -840,9 +1140,64 @@ class ImageVideoAnnotator(tk.Tk):
         from .export_tools import export_csv_format
         export_csv_format(self)
 
+    def export_masks(self):
+        from .mask_export import export_masks
+        export_masks(self)
+
+    def toggle_profiling(self):
+        profiler.enabled = self.profiling_var.get()
+        if profiler.enabled and not self.profiling_overlay:
+            self.system_message_label.config(text="Recording latencies.\nView -> Profiling -> Show Stats")
+
+    def toggle_profiling_overlay(self):
+        self.profiling_overlay = self.profiling_overlay_var.get()
+        if self.profiling_overlay:
+            if not profiler.enabled:
+                self.profiling_var.set(True)
+                profiler.enabled = True
+            self.profiling_label.pack(side=tk.TOP)
+            self.update_profiling_overlay()
+        else:
+            self.profiling_label.pack_forget()
+
+    def update_profiling_overlay(self):
+        if not self.profiling_overlay:
+            return
+        text = profiler.summary_text()
+        if profiler.capturing:
+            text = "[cProfile recording] " + text
+        self.profiling_label.config(text=text)
+        self.after(500, self.update_profiling_overlay)
+
+    def toggle_cprofile_capture(self):
+        if not profiler.capturing:
+            profiler.start_capture()
+            self.system_message_label.config(text="cProfile capture started.\nRepeat the slow action, then stop.")
+            return
+        path = filedialog.asksaveasfilename(title="Save cProfile Capture", defaultextension=".prof",
+                                            filetypes=[("cProfile data", "*.prof")])
+        summary = profiler.stop_capture(path or None)
+        win = tk.Toplevel(self)
+        win.title("cProfile Capture")
+        text = tk.Text(win, wrap="none", font=("Courier", 9), width=120, height=35)
+        text.insert("1.0", summary)
+        text.config(state="disabled")
+        text.pack(fill=tk.BOTH, expand=True)
+
+    def save_profiling_report(self):
+        if not profiler.stats:
+            messagebox.showinfo("Profiling", "No latencies recorded yet.\nEnable View -> Profiling -> Record Latencies.")
+            return
+        path = filedialog.asksaveasfilename(title="Save Latency Report", defaultextension=".json",
+                                            filetypes=[("JSON", "*.json")])
+        if path:
+            profiler.dump_json(path)
+            self.system_message_label.config(text=f"Latency report saved to:\n{path}")
+
     def show_about(self):
         messagebox.showinfo("About", "Image and Video Annotator\nVersion 1.0\nSupports YOLO and Mask R-CNN export formats.")
 
     def on_exit(self):
         if messagebox.askokcancel("Quit", "Do you really want to quit?"):
+            self.disconnect_from_server()
             self.destroy()
@@ -0,0 +1,199 @@
+# annotator/inference.py
+"""
+Model loading and inference helpers shared by the GUI tools and the headless
+batch commands. Nothing here imports Tk, and Ultralytics (which pulls in
+torch) is only imported on first use.
+"""
+import functools
+import importlib.util
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .profiling import profiler
+
+
+def ultralytics_installed():
+    return importlib.util.find_spec("ultralytics") is not None
+
+
+@functools.lru_cache(maxsize=None)
+def get_yolo():
+    """Return the ultralytics YOLO class, importing it on first call, or None if not installed."""
+    try:
+        from ultralytics import YOLO
+    except ImportError:
+        return None
+    return YOLO
+
+
+DEFAULT_PRELABEL_MODEL = "yolo11s.pt"
+
+
+def _model_nbytes(model, weights):
+    """Approximate resident size of a loaded model from its parameters and buffers."""
+    try:
+        module = model.model
+        tensors = list(module.parameters()) + list(module.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        return os.path.getsize(weights) if os.path.isfile(weights) else 0
+
+
+class ModelRegistry:
+    """
+    Loads each weights file once and keeps recently used models warm in an LRU.
+    Models are evicted least-recently-used first once either max_models or the
+    max_bytes memory cap is exceeded; the model just requested is never evicted.
+    """
+
+    def __init__(self, max_bytes=2 * 1024 ** 3, max_models=4):
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+        self._models = OrderedDict()  # key -> (model, nbytes)
+        self._lock = threading.RLock()
+        self._call_locks = {}  # id(model) -> Lock serializing inference calls
+
+    @staticmethod
+    def _key(weights):
+        # Hub names such as "yolo11s.pt" are kept as-is, local files by absolute path.
+        return os.path.abspath(weights) if os.path.exists(weights) else weights
+
+    def get(self, weights):
+        YOLO = get_yolo()
+        if YOLO is None:
+            raise RuntimeError("Ultralytics package not installed!")
+        key = self._key(weights)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key][0]
+            with profiler.measure("ai.load_model"):
+                model = YOLO(weights)
+            self._models[key] = (model, _model_nbytes(model, key))
+            self._evict(keep=key)
+            return model
+
+    def _evict(self, keep):
+        while len(self._models) > 1 and (len(self._models) > self.max_models or
+                                         self.total_bytes() > self.max_bytes):
+            oldest = next(iter(self._models))
+            if oldest == keep:
+                break
+            del self._models[oldest]
+
+    def call_lock(self, model):
+        """
+        The lock to hold while running model. The same instance is handed to every
+        caller of get(), and ultralytics predictors are not safe to run from two
+        threads at once (e.g. a folder evaluation and a pre-label click).
+        """
+        with self._lock:
+            return self._call_locks.setdefault(id(model), threading.Lock())
+
+    def total_bytes(self):
+        return sum(nbytes for _, nbytes in self._models.values())
+
+    def loaded(self):
+        """Return the keys of the warm models, most recently used last."""
+        with self._lock:
+            return list(self._models)
+
+    def unload(self, weights):
+        with self._lock:
+            self._models.pop(self._key(weights), None)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+model_registry = ModelRegistry()
+
+def _label_for(model, cls_id):
+    if isinstance(model.names, dict):
+        return model.names.get(cls_id, "object")
+    return model.names[cls_id]
+
+
+def _tile_origins(length, tile_size, stride):
+    if length <= tile_size:
+        return [0]
+    origins = list(range(0, length - tile_size, stride))
+    origins.append(length - tile_size)
+    return origins
+
+
+def nms(boxes, scores, classes, iou_threshold=0.5):
+    """Class-aware greedy non-maximum suppression. Returns the indices to keep."""
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=int)
+    # Offset each class into its own coordinate range so boxes of different
+    # classes never overlap and a single suppression pass handles all of them.
+    offset = classes.astype(np.float64)[:, None] * (boxes.max() + 1)
+    b = boxes.astype(np.float64) + offset
+    areas = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    order = np.argsort(-scores)
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(b[i, 0], b[rest, 0])
+        yy1 = np.maximum(b[i, 1], b[rest, 1])
+        xx2 = np.minimum(b[i, 2], b[rest, 2])
+        yy2 = np.minimum(b[i, 3], b[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=int)
+
+
+@profiler.timed("ai.sliced_predict")
+def sliced_predict(model, img, tile_size=640, overlap=0.2, batch_size=8, conf=0.25,
+                   iou_threshold=0.5, full_frame=True):
+    """
+    Run SAHI-style sliced inference on a large image.
+    img: BGR numpy array as returned by cv2.imread.
+    The image is cut into overlapping tile_size x tile_size tiles which are fed to
+    the model batch_size at a time. Tile detections are shifted back into image
+    coordinates and merged with class-aware NMS across tiles. When full_frame is
+    True a downsampled full-image pass is added so objects larger than a tile are
+    still found in one piece.
+    Returns (boxes, scores, classes) as numpy arrays, boxes in xyxy pixels.
+    """
+    height, width = img.shape[:2]
+    stride = max(1, int(tile_size * (1 - overlap)))
+    offsets = [(x, y)
+               for y in _tile_origins(height, tile_size, stride)
+               for x in _tile_origins(width, tile_size, stride)]
+
+    all_boxes, all_scores, all_classes = [], [], []
+
+    def collect(results, batch_offsets):
+        for result, (ox, oy) in zip(results, batch_offsets):
+            if result.boxes is None or len(result.boxes) == 0:
+                continue
+            xyxy = result.boxes.xyxy.cpu().numpy().astype(np.float64)
+            xyxy[:, [0, 2]] += ox
+            xyxy[:, [1, 3]] += oy
+            all_boxes.append(xyxy)
+            all_scores.append(result.boxes.conf.cpu().numpy())
+            all_classes.append(result.boxes.cls.cpu().numpy().astype(int))
+
+    for start in range(0, len(offsets), batch_size):
+        batch_offsets = offsets[start:start + batch_size]
+        tiles = [img[y:y + tile_size, x:x + tile_size] for x, y in batch_offsets]
+        collect(model(tiles, conf=conf, verbose=False), batch_offsets)
+    if full_frame and len(offsets) > 1:
+        collect(model(img, conf=conf, verbose=False), [(0, 0)])
+
+    if not all_boxes:
+        return np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=int)
+    boxes = np.concatenate(all_boxes)
+    scores = np.concatenate(all_scores)
+    classes = np.concatenate(all_classes)
+    keep = nms(boxes, scores, classes, iou_threshold)
+    return boxes[keep], scores[keep], classes[keep]
@@ -0,0 +1,65 @@
+# annotator/lod.py
+"""
+Level of detail for drawing dense polygons. Canvas coordinates are computed
+from a simplified outline that stays within LOD_TOLERANCE_PX screen pixels of
+the real one. Simplifications are cached on the annotation per zoom bucket
+(half an octave of zoom), so zooming and panning only transform the cached
+vertices. ann.points is never modified: editing, hit-testing and export keep
+using the full-resolution vertices.
+"""
+import math
+
+LOD_TOLERANCE_PX = 0.5
+# Polygons with fewer vertices are drawn as-is; simplifying them saves nothing.
+MIN_LOD_VERTICES = 64
+MAX_CACHED_BUCKETS = 8
+
+
+def zoom_bucket(scale):
+    return math.floor(2 * math.log2(scale))
+
+
+def bucket_scale(bucket):
+    """Smallest scale of a zoom bucket; bucket_scale(bucket + 1) is the bucket's upper bound."""
+    return 2 ** (bucket / 2)
+
+
+def _points_key(points):
+    return len(points), hash(tuple(points))
+
+
+def simplified_vertices(ann, scale):
+    """
+    Image-space (n, 2) array of the vertices of polygon ann to draw at scale.
+    The cache lives in ann.lod_cache and is dropped when the points change.
+    """
+    from .geometry import as_vertices, simplify_polygon
+
+    key = _points_key(ann.points)
+    cache = ann.lod_cache
+    if cache.get("key") != key:
+        cache.clear()
+        cache["key"] = key
+        cache["vertices"] = as_vertices(ann.points)
+    bucket = zoom_bucket(scale)
+    vertices = cache.get(bucket)
+    if vertices is None:
+        if len(cache) - 2 >= MAX_CACHED_BUCKETS:
+            for old in [k for k in cache if k not in ("key", "vertices")]:
+                del cache[old]
+        full = cache["vertices"]
+        # The image-space tolerance shrinks as the zoom grows, so the bucket's largest scale bounds the error.
+        vertices = cache[bucket] = full[simplify_polygon(full, LOD_TOLERANCE_PX / bucket_scale(bucket + 1))]
+    return vertices
+
+
+def polygon_canvas_coords(ann, scale, offset):
+    """Flat [x1, y1, x2, y2, ...] canvas coordinates of polygon ann at the given scale and pan offset."""
+    points = ann.points
+    if len(points) < 2 * MIN_LOD_VERTICES:
+        ox, oy = offset
+        return [p * scale + (ox if i % 2 == 0 else oy) for i, p in enumerate(points)]
+    vertices = simplified_vertices(ann, scale) * scale
+    vertices[:, 0] += offset[0]
+    vertices[:, 1] += offset[1]
+    return vertices.ravel().tolist()
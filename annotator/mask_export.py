@@ -0,0 +1,229 @@
+# annotator/mask_export.py
+"""
+Pixel masks for segmentation training. For every annotated image this writes
+
+    <out_dir>/class/<stem>.png     class index per pixel: 0 is background, the class with
+                                   id k is k + 1 (8-bit, 16-bit above 254 classes)
+    <out_dir>/instance/<stem>.png  instance id per pixel: 0 is background, annotation n
+                                   of the image is n + 1 (16-bit)
+
+plus classes.txt (one class per line, in id order) and a manifest that lets a
+re-export skip images whose annotations, image file and class ids did not
+change. Class ids are the project's stable ids (see class_index.py).
+Polygons and boxes are painted in annotation order, so later annotations
+cover earlier ones; a pixel belongs to a shape when its centre is inside it
+(see geometry.rasterize_polygons). Annotations whose label is not in
+the class list are left out.
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = ".mask_manifest.json"
+MANIFEST_VERSION = 2
+
+
+def _fingerprint(image_path, annotations):
+    st = os.stat(image_path)
+    payload = json.dumps([annotations, st.st_mtime_ns, st.st_size], sort_keys=True)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+def render_masks(annotations, class_ids, size):
+    """
+    Rasterize annotation dicts into (class mask, instance mask) arrays of the
+    given (width, height). Every shape is rasterized once, into the instance
+    mask; the class mask is a lookup of the instance ids.
+    """
+    import numpy as np
+
+    from .geometry import box_to_polygon, rasterize_polygons
+
+    width, height = size
+    polygons, instance_ids, classes = [], [], []
+    for n, ann in enumerate(annotations):
+        if ann["label"] not in class_ids:
+            continue
+        points = ann["points"]
+        if ann["type"] == "bbox":
+            x1, y1, x2, y2 = points
+            points = box_to_polygon((min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)))
+        elif len(points) < 6:
+            continue
+        polygons.append(points[:len(points) // 2 * 2])
+        instance_ids.append(n + 1)
+        classes.append(class_ids[ann["label"]] + 1)
+    instance = rasterize_polygons(polygons, (height, width), values=instance_ids, dtype=np.uint16)
+    lookup = np.zeros(len(annotations) + 1, dtype=np.uint16)
+    lookup[instance_ids] = classes
+    class_mask = lookup[instance]
+    if max(class_ids.values(), default=0) < 254:
+        class_mask = class_mask.astype(np.uint8)
+    return class_mask, instance
+
+
+def _save_png(array, path):
+    from PIL import Image
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    Image.fromarray(array).save(tmp_path, "PNG")
+    os.replace(tmp_path, path)
+
+
+def _render_job(job):
+    """Process pool worker: read the image header, rasterize and write both PNGs."""
+    from .utils import get_image_size
+
+    image_path, annotations, class_ids, class_path, instance_path = job
+    try:
+        size = get_image_size(image_path)
+    except OSError:
+        return image_path, None
+    class_mask, instance = render_masks(annotations, class_ids, size)
+    _save_png(class_mask, class_path)
+    _save_png(instance, instance_path)
+    return image_path, size
+
+
+def _output_names(images):
+    """PNG file name of every image; same-named images from different folders get a folder hash."""
+    names, used = {}, set()
+    for path in images:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if stem in used:
+            folder = os.path.dirname(os.path.abspath(path))
+            stem = f"{stem}_{hashlib.md5(folder.encode('utf-8')).hexdigest()[:8]}"
+        used.add(stem)
+        names[path] = stem + ".png"
+    return names
+
+
+def write_mask_pngs(image_list, annotation_store, labels, out_dir, workers=1, force=False, class_ids=None,
+                    progress_callback=None):
+    """
+    Write class and instance mask PNGs of the annotated images to out_dir.
+    Images are rasterized in parallel by a pool of `workers` processes. Unless
+    force, images already exported with the same annotations, image file and
+    class ids are skipped. class_ids maps labels to ids (default: position in
+    labels). Returns a summary dict (written, skipped, missing).
+    """
+    from .batch import parallel_map
+    from .class_index import class_names
+
+    listed = set(image_list)
+    images = [p for p in image_list if annotation_store.get(p)]
+    images += [p for p in annotation_store if annotation_store[p] and p not in listed]
+    if class_ids is None:
+        class_ids = {label: i for i, label in enumerate(labels)}
+    for sub in ("class", "instance"):
+        os.makedirs(os.path.join(out_dir, sub), exist_ok=True)
+    with open(os.path.join(out_dir, "classes.txt"), "w") as f:
+        f.write("".join(name + "\n" for name in class_names(class_ids)))
+
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    manifest = {}
+    if not force and os.path.isfile(manifest_path):
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("class_ids") != class_ids:
+        manifest = {}
+    previous = manifest.get("images", {})
+
+    names = _output_names(images)
+    entries, jobs, missing, skipped = {}, [], [], 0
+    for path in images:
+        try:
+            key = _fingerprint(path, annotation_store[path])
+        except OSError:
+            missing.append(path)
+            continue
+        class_path = os.path.join(out_dir, "class", names[path])
+        instance_path = os.path.join(out_dir, "instance", names[path])
+        entries[path] = {"key": key, "mask": names[path]}
+        if (previous.get(path) == entries[path] and os.path.exists(class_path)
+                and os.path.exists(instance_path)):
+            skipped += 1
+            continue
+        jobs.append((path, annotation_store[path], class_ids, class_path, instance_path))
+
+    results = parallel_map(_render_job, jobs, workers, progress_callback, processes=True)
+    unreadable = [path for path, size in results if size is None]
+    for path in unreadable:
+        del entries[path]
+
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "class_ids": class_ids, "images": entries}, f)
+    os.replace(tmp_path, manifest_path)
+    return {"out_dir": out_dir, "written": len(results) - len(unreadable), "skipped": skipped,
+            "missing": missing + unreadable}
+
+
+def format_summary(summary):
+    lines = [f"Masks written to {summary['out_dir']}",
+             f"Written: {summary['written']}, unchanged (skipped): {summary['skipped']}"]
+    if summary["missing"]:
+        lines.append(f"Unreadable or missing images: {len(summary['missing'])}")
+    return "\n".join(lines)
+
+
+def export_masks(app):
+    """Ask for an output folder and write the mask PNGs of the project in the background."""
+    # Tk is imported here so write_mask_pngs also runs headless (see cli.py).
+    import queue
+    import threading
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+
+    from .class_index import export_ids
+
+    app.store_current_annotations()
+    if not any(app.annotation_store.values()):
+        messagebox.showerror("Error", "There are no annotated images to export.")
+        return
+    out_dir = filedialog.askdirectory(title="Select output folder for mask PNGs")
+    if not out_dir:
+        return
+    image_list = list(app.image_list)
+    store = {p: list(anns) for p, anns in app.annotation_store.items()}
+    labels = list(app.labels)
+    class_ids = export_ids(app.labels, app.class_ids)
+
+    win = tk.Toplevel(app)
+    win.title("Export Masks")
+    status = ttk.Label(win, text="Preparing...", padding=10)
+    status.pack(fill=tk.X)
+    events = queue.Queue()
+
+    def worker():
+        try:
+            summary = write_mask_pngs(image_list, store, labels, out_dir, workers=os.cpu_count() or 1,
+                                      class_ids=class_ids,
+                                      progress_callback=lambda done, total: events.put(("progress", (done, total))))
+            events.put(("done", summary))
+        except Exception as e:
+            events.put(("error", e))
+
+    threading.Thread(target=worker, daemon=True).start()
+
+    def poll():
+        try:
+            while True:
+                kind, payload = events.get_nowait()
+                if kind == "progress":
+                    status.config(text=f"Rasterizing... {payload[0]}/{payload[1]} images")
+                elif kind == "error":
+                    win.destroy()
+                    messagebox.showerror("Error", f"Mask export failed:\n{payload}")
+                    return
+                else:
+                    win.destroy()
+                    messagebox.showinfo("Export Masks", format_summary(payload))
+                    return
+        except queue.Empty:
+            pass
+        win.after(100, poll)
+
+    poll()
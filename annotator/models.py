@@ -9,12 +9,14 @@ class Annotation:
         label: The object class label.
         attributes: Extra info (currently not used).
         canvas_ids: List of canvas item IDs (for redrawing).
+        lod_cache: Simplified outlines per zoom bucket (see lod.py); not saved.
         """
         self.type = ann_type
         self.points = points
         self.label = label
         self.attributes = attributes if attributes is not None else {}
         self.canvas_ids = canvas_ids if canvas_ids is not None else []
+        self.lod_cache = {}
 
     def to_dict(self):
         return {
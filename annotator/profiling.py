@@ -0,0 +1,163 @@
+# annotator/profiling.py
+"""
+Opt-in latency instrumentation for finding out where the GUI spends its time
+on an annotator's machine. View -> Profiling -> Record Latencies (or
+ANNOTATOR_PROFILE=1) turns it on: load_image, redraw_canvas, the mouse
+handlers, exports and AI calls then record their latency into per-operation
+histograms, and frame times are measured from a redraw until Tk is idle
+again. Show Stats puts p50 / p95 of the main ones in the header. The numbers
+can be saved as JSON, and a cProfile capture can be started and stopped
+around an interval. While disabled, every wrapper only checks a flag.
+"""
+import bisect
+import functools
+import io
+import json
+import platform
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in milliseconds; 16.7 / 33.3 ms are the 60 / 30 fps frame budgets.
+BUCKET_EDGES_MS = (1, 2, 5, 10, 16.7, 33.3, 50, 100, 250, 500, 1000, 5000)
+
+
+class OperationStats:
+    """Latency histogram of one operation plus a bounded window of recent samples for percentiles."""
+
+    def __init__(self, recent=1000):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKET_EDGES_MS) + 1)
+        self.recent = deque(maxlen=recent)
+
+    def add(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.buckets[bisect.bisect_left(BUCKET_EDGES_MS, ms)] += 1
+        self.recent.append(ms)
+
+    def percentile(self, q):
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def to_dict(self):
+        labels = [f"<={edge}ms" for edge in BUCKET_EDGES_MS] + [f">{BUCKET_EDGES_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "max_ms": self.max_ms,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "histogram": dict(zip(labels, self.buckets)),
+        }
+
+
+class Profiler:
+    """
+    Opt-in latency instrumentation. Hot paths are wrapped with timed() or
+    measure(); while the profiler is disabled the wrappers only check a flag.
+    A "frame" is a redraw plus the idle-time rendering Tk does afterwards.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stats = {}
+        self.started_at = time.time()
+        self._cprofile = None
+
+    def reset(self):
+        self.stats = {}
+        self.started_at = time.time()
+
+    def record(self, name, ms):
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = OperationStats()
+        stats.add(ms)
+
+    @contextmanager
+    def measure(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def timed(self, name):
+        """Decorator recording the latency of every call under name."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, (time.perf_counter() - start) * 1000)
+            return wrapper
+        return decorator
+
+    def frame(self, widget):
+        """Call at the start of a redraw; the frame ends when Tk is idle again."""
+        if not self.enabled:
+            return
+        start = time.perf_counter()
+        widget.after_idle(lambda: self.record("frame", (time.perf_counter() - start) * 1000))
+
+    def summary_text(self, names=("frame", "redraw_canvas", "load_image", "mouse.drag")):
+        parts = []
+        for name in names:
+            stats = self.stats.get(name)
+            if stats is not None and stats.count:
+                parts.append(f"{name} p50 {stats.percentile(50):.1f} / p95 {stats.percentile(95):.1f} ms")
+        return " | ".join(parts) if parts else "Profiling: no samples yet"
+
+    def to_dict(self):
+        return {
+            "started_at": self.started_at,
+            "duration_s": time.time() - self.started_at,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "operations": {name: stats.to_dict() for name, stats in sorted(self.stats.items())},
+        }
+
+    def dump_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    # cProfile capture of a user-selected interval
+
+    @property
+    def capturing(self):
+        return self._cprofile is not None
+
+    def start_capture(self):
+        import cProfile  # only needed for captures; pstats alone costs ~20 ms at startup
+        self._cprofile = cProfile.Profile()
+        self._cprofile.enable()
+
+    def stop_capture(self, path=None, top=25):
+        """Stop the capture, optionally save it (.prof, for snakeviz / pstats) and return a text summary."""
+        prof, self._cprofile = self._cprofile, None
+        if prof is None:
+            return ""
+        prof.disable()
+        import pstats
+        if path:
+            prof.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(top)
+        return out.getvalue()
+
+
+profiler = Profiler()
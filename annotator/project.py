@@ -0,0 +1,73 @@
+# annotator/project.py
+"""
+Reading and writing project files without a GUI. The format is the one
+written by File -> Save Project: image_list, current_image_index, labels,
+class_ids (label -> stable class id, see class_index.py), annotation_store
+(image path -> list of annotation dicts), duplicate_of (near-duplicate image
+path -> kept image of its group, see dedup.py) and active_queue (the
+active-learning ranking, see active_learning.py).
+"""
+import json
+import os
+import stat
+import tempfile
+
+# The process umask, for the mode of new project files (it can only be read by setting it).
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def new_project(image_list=(), labels=()):
+    return {
+        "image_list": list(image_list),
+        "current_image_index": 0,
+        "labels": list(labels),
+        "class_ids": {label: i for i, label in enumerate(labels)},
+        "annotations": [],
+        "annotation_store": {},
+        "duplicate_of": {},
+        "active_queue": None,
+    }
+
+
+def normalize_project(project):
+    """Fill in missing keys and upgrade projects saved before the per-image annotation store."""
+    project.setdefault("image_list", [])
+    project.setdefault("current_image_index", 0)
+    project.setdefault("labels", [])
+    # Projects saved before stable class ids numbered the classes by list position.
+    project.setdefault("class_ids", {label: i for i, label in enumerate(project["labels"])})
+    project.setdefault("annotations", [])
+    store = project.setdefault("annotation_store", {})
+    project.setdefault("duplicate_of", {})
+    project.setdefault("active_queue", None)
+    image_list = project["image_list"]
+    if not store and project["annotations"] and image_list:
+        index = min(max(project["current_image_index"], 0), len(image_list) - 1)
+        store[image_list[index]] = project["annotations"]
+    return project
+
+
+def read_project(path):
+    with open(path, "r") as f:
+        return normalize_project(json.load(f))
+
+
+def write_project(path, project):
+    """Write a project file atomically, so an interrupted batch job never leaves a truncated file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".project-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(project, f, indent=2)
+        # mkstemp creates the file 0600; keep the mode of the file being replaced (or the usual one for a new file).
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except OSError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,263 @@
+# annotator/quality.py
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from .geometry import polygon_area
+from .utils import get_image_size
+
+QAIssue = namedtuple("QAIssue", ["image_path", "index", "kind", "severity", "message"])
+
+SEVERITY_ORDER = {"error": 0, "warning": 1, "info": 2}
+MAX_PAIRS_PER_CHUNK = 4_000_000
+
+
+def _flatten(annotation_store):
+    """Collect every annotation of the project into flat arrays for vectorized checks."""
+    paths = list(annotation_store)
+    img_idx, ann_idx, labels, raw = [], [], [], []
+    polygons = []  # (flat position, points)
+    for i, path in enumerate(paths):
+        for j, ann in enumerate(annotation_store[path]):
+            pts = ann["points"]
+            if ann["type"] == "bbox" and len(pts) == 4:
+                raw.append(pts)
+            else:
+                xs, ys = pts[0::2], pts[1::2]
+                raw.append([min(xs), min(ys), max(xs), max(ys)] if xs and ys else [0, 0, 0, 0])
+                polygons.append((len(img_idx), pts))
+            img_idx.append(i)
+            ann_idx.append(j)
+            labels.append(ann["label"])
+    raw = np.asarray(raw, dtype=np.float64).reshape(-1, 4)
+    return paths, np.asarray(img_idx, dtype=np.int64), np.asarray(ann_idx, dtype=np.int64), \
+        np.asarray(labels, dtype=object), raw, polygons
+
+
+def _orient(p, q, r):
+    return (q[..., 0] - p[..., 0]) * (r[..., 1] - p[..., 1]) - (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0])
+
+
+def self_intersecting(polygons):
+    """
+    Test a stack of polygons with the same vertex count, shape (P, n, 2), for
+    proper crossings between non-adjacent edges. Returns a boolean array of length P.
+    """
+    n = polygons.shape[1]
+    if n < 4:
+        return np.zeros(len(polygons), dtype=bool)
+    i, j = np.triu_indices(n, 2)
+    keep = ~((i == 0) & (j == n - 1))  # first and last edge share a vertex
+    i, j = i[keep], j[keep]
+    start = polygons
+    end = np.roll(polygons, -1, axis=1)
+    out = np.zeros(len(polygons), dtype=bool)
+    chunk = max(1, MAX_PAIRS_PER_CHUNK // len(i))
+    for s in range(0, len(polygons), chunk):
+        a, b = start[s:s + chunk][:, i], end[s:s + chunk][:, i]
+        c, d = start[s:s + chunk][:, j], end[s:s + chunk][:, j]
+        cross = (_orient(a, b, c) * _orient(a, b, d) < 0) & (_orient(c, d, a) * _orient(c, d, b) < 0)
+        out[s:s + chunk] = cross.any(axis=1)
+    return out
+
+
+def overlapping_pairs(boxes, groups, iou_threshold):
+    """
+    Find all pairs of boxes in the same group with IoU >= iou_threshold using
+    sweep-and-prune. Groups are laid out side by side along x so one sorted
+    sweep handles the whole dataset; only boxes whose x-extents overlap are
+    ever compared. Returns (first, second, iou) arrays of indices into boxes.
+    """
+    if len(boxes) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    x_min = boxes[:, [0, 2]].min()
+    stride = boxes[:, [0, 2]].max() - x_min + 1.0
+    x1 = boxes[:, 0] - x_min + groups * stride
+    x2 = boxes[:, 2] - x_min + groups * stride
+    order = np.argsort(x1, kind="stable")
+    sx1, sx2 = x1[order], x2[order]
+    # Boxes sorted after i and starting before i ends are the only candidates.
+    ends = np.searchsorted(sx1, sx2, side="left")
+    counts = np.maximum(ends - np.arange(len(order)) - 1, 0)
+    firsts, seconds, ious = [], [], []
+    start = 0
+    cumulative = np.cumsum(counts)
+    while start < len(order):
+        base = cumulative[start - 1] if start else 0
+        stop = int(np.searchsorted(cumulative, base + MAX_PAIRS_PER_CHUNK, side="right"))
+        stop = max(stop, start + 1)
+        c = counts[start:stop]
+        if c.sum():
+            a = np.repeat(np.arange(start, stop), c)
+            offsets = np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c)
+            b = a + 1 + offsets
+            ba, bb = boxes[order[a]], boxes[order[b]]
+            iw = np.minimum(ba[:, 2], bb[:, 2]) - np.maximum(ba[:, 0], bb[:, 0])
+            ih = np.minimum(ba[:, 3], bb[:, 3]) - np.maximum(ba[:, 1], bb[:, 1])
+            inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+            area_a = (ba[:, 2] - ba[:, 0]) * (ba[:, 3] - ba[:, 1])
+            area_b = (bb[:, 2] - bb[:, 0]) * (bb[:, 3] - bb[:, 1])
+            iou = inter / np.maximum(area_a + area_b - inter, 1e-9)
+            hit = iou >= iou_threshold
+            firsts.append(order[a[hit]])
+            seconds.append(order[b[hit]])
+            ious.append(iou[hit])
+        start = stop
+    if not firsts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.concatenate(firsts), np.concatenate(seconds), np.concatenate(ious)
+
+
+def run_quality_checks(annotation_store, labels, image_sizes=None, iou_threshold=0.9):
+    """
+    Check every annotation of the project. annotation_store maps image path to a
+    list of annotation dicts; image_sizes optionally maps image path to
+    (width, height) and enables the out-of-bounds check.
+    Returns a list of QAIssue sorted by severity.
+    """
+    paths, img_idx, ann_idx, ann_labels, raw, polygons = _flatten(annotation_store)
+    issues = []
+
+    def report(positions, kind, severity, make_message):
+        for p in np.flatnonzero(positions):
+            issues.append(QAIssue(paths[img_idx[p]], int(ann_idx[p]), kind, severity, make_message(p)))
+
+    if len(raw) == 0:
+        return issues
+    boxes = np.stack([np.minimum(raw[:, 0], raw[:, 2]), np.minimum(raw[:, 1], raw[:, 3]),
+                      np.maximum(raw[:, 0], raw[:, 2]), np.maximum(raw[:, 1], raw[:, 3])], axis=1)
+    widths, heights = boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]
+    is_polygon = np.zeros(len(raw), dtype=bool)
+    is_polygon[[p for p, _ in polygons]] = True
+
+    report(~np.isin(ann_labels, np.asarray(list(labels), dtype=object)), "unknown_label", "error",
+           lambda p: f"Label '{ann_labels[p]}' is not in the class list")
+    report(~is_polygon & ((raw[:, 2] < raw[:, 0]) | (raw[:, 3] < raw[:, 1])), "inverted_box", "info",
+           lambda p: "Box corners are inverted (x2 < x1 or y2 < y1)")
+    report(~is_polygon & ((widths <= 0) | (heights <= 0)), "zero_area", "error",
+           lambda p: f"Box has zero area ({widths[p]:.1f} x {heights[p]:.1f})")
+
+    if image_sizes:
+        size = np.array([image_sizes.get(path, (np.inf, np.inf)) for path in paths], dtype=np.float64)
+        w, h = size[img_idx, 0], size[img_idx, 1]
+        oob = (boxes[:, 0] < 0) | (boxes[:, 1] < 0) | (boxes[:, 2] > w) | (boxes[:, 3] > h)
+        report(oob, "out_of_bounds", "warning",
+               lambda p: f"Coordinates fall outside the {int(w[p])}x{int(h[p])} image")
+
+    by_count = {}
+    valid = []
+    for pos, pts in polygons:
+        n = len(pts) // 2
+        if n < 3:
+            issues.append(QAIssue(paths[img_idx[pos]], int(ann_idx[pos]), "degenerate_polygon", "error",
+                                  f"Polygon has only {n} vertices"))
+            continue
+        valid.append((pos, pts[:2 * n]))
+        by_count.setdefault(n, []).append((pos, pts))
+    areas = polygon_area([pts for _, pts in valid])
+    for (pos, _), area in zip(valid, areas):
+        if area <= 0:
+            issues.append(QAIssue(paths[img_idx[pos]], int(ann_idx[pos]), "zero_area", "error",
+                                  "Polygon has zero area"))
+    for n, group in by_count.items():
+        stacked = np.asarray([pts[:2 * n] for _, pts in group], dtype=np.float64).reshape(len(group), n, 2)
+        crossing = self_intersecting(stacked)
+        for (pos, _), bad in zip(group, crossing):
+            if bad:
+                issues.append(QAIssue(paths[img_idx[pos]], int(ann_idx[pos]), "self_intersecting", "error",
+                                      "Polygon edges cross each other"))
+
+    bbox_positions = np.flatnonzero(~is_polygon)
+    first, second, ious = overlapping_pairs(boxes[bbox_positions], img_idx[bbox_positions], iou_threshold)
+    for a, b, iou in zip(bbox_positions[first], bbox_positions[second], ious):
+        a, b = sorted((a, b), key=lambda p: ann_idx[p])
+        same = ann_labels[a] == ann_labels[b]
+        issues.append(QAIssue(
+            paths[img_idx[b]], int(ann_idx[b]), "duplicate" if same else "conflicting_labels",
+            "warning" if same else "error",
+            f"IoU {iou:.2f} with annotation #{ann_idx[a]} ('{ann_labels[a]}' vs '{ann_labels[b]}')"))
+
+    issues.sort(key=lambda issue: (SEVERITY_ORDER[issue.severity], issue.image_path, issue.index))
+    return issues
+
+
+def show_issues_window(app, title, issues, columns=("severity", "kind", "image", "annotation", "details")):
+    """List issues in a navigable window; selecting a row jumps to the image and annotation."""
+    # Tk is imported here so the checks above also run headless (see cli.py).
+    import tkinter as tk
+    from tkinter import ttk
+    win = tk.Toplevel(app)
+    win.title(title)
+    win.geometry("900x500")
+
+    top = ttk.Frame(win, padding=5)
+    top.pack(fill=tk.X)
+    kinds = sorted({issue.kind for issue in issues})
+    counts = {kind: sum(1 for issue in issues if issue.kind == kind) for kind in kinds}
+    summary = ", ".join(f"{kind}: {counts[kind]}" for kind in kinds) or "No issues found."
+    ttk.Label(top, text=f"{len(issues)} issues   {summary}").pack(side=tk.LEFT)
+    kind_var = tk.StringVar(value="all")
+    kind_box = ttk.Combobox(top, textvariable=kind_var, values=["all"] + kinds, state="readonly", width=20)
+    kind_box.pack(side=tk.RIGHT)
+    ttk.Label(top, text="Show:").pack(side=tk.RIGHT, padx=5)
+
+    frame = ttk.Frame(win)
+    frame.pack(fill=tk.BOTH, expand=True)
+    tree = ttk.Treeview(frame, columns=columns, show="headings")
+    for col, width in zip(columns, (70, 140, 220, 80, 400)):
+        tree.heading(col, text=col.capitalize())
+        tree.column(col, width=width, stretch=(col == "details"))
+    scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+    tree.configure(yscrollcommand=scrollbar.set)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    tree.pack(fill=tk.BOTH, expand=True)
+
+    # Only the first rows are inserted into the Treeview; huge reports stay responsive.
+    max_rows = 5000
+
+    def populate(*_):
+        tree.delete(*tree.get_children())
+        shown = [i for i, issue in enumerate(issues) if kind_var.get() in ("all", issue.kind)]
+        for i in shown[:max_rows]:
+            issue = issues[i]
+            tree.insert("", "end", iid=str(i), values=(
+                issue.severity, issue.kind, os.path.basename(issue.image_path),
+                "" if issue.index is None else issue.index, issue.message))
+
+    def on_select(event):
+        sel = tree.selection()
+        if sel:
+            issue = issues[int(sel[0])]
+            app.goto_image(issue.image_path, issue.index)
+
+    kind_box.bind("<<ComboboxSelected>>", populate)
+    tree.bind("<<TreeviewSelect>>", on_select)
+    populate()
+    win.issue_tree = tree  # lets callers add actions for the selected issue
+    return win
+
+
+def quality_check(app):
+    """Run the dataset-wide quality checks and list the findings."""
+    from tkinter import messagebox, simpledialog
+    iou_threshold = simpledialog.askfloat("Quality Check", "IoU threshold for near-duplicate boxes",
+                                          initialvalue=0.9, minvalue=0.1, maxvalue=1.0)
+    if iou_threshold is None:
+        return
+    app.store_current_annotations()
+    image_sizes = {}
+    for path, anns in app.annotation_store.items():
+        if not anns:
+            continue
+        if path not in app.image_sizes:
+            try:
+                app.image_sizes[path] = get_image_size(path)
+            except OSError:
+                continue
+        image_sizes[path] = app.image_sizes[path]
+    issues = run_quality_checks(app.annotation_store, app.labels, image_sizes, iou_threshold)
+    if not issues:
+        messagebox.showinfo("Quality Check", "No issues found.")
+        return
+    show_issues_window(app, "Quality Check", issues)
@@ -0,0 +1,299 @@
+# annotator/server.py
+"""
+Local annotation server: one project file shared by several annotators.
+
+    python cli.py serve project.json --port 8765
+
+The server keeps the project in memory and writes it back (atomically, see
+project.write_project) a few seconds after the last change and on shutdown.
+Every image has a version number that goes up with each accepted change.
+Clients (see sync_client.py) send their edits in batches together with the
+version they are based on; an edit based on an older version is rejected as a
+conflict and the client gets the current annotations back (optimistic
+concurrency). An annotator who opens an image checks it out, which locks it
+for LOCK_SECONDS; others can read it but their edits to it are refused until
+the lock is released or expires. Locks are renewed by every sync. A batch
+with a malformed change, or a change to an image that is not in the project
+(unless the server allows new images), is refused as a whole with 400.
+
+Endpoints (JSON in and out, HTTP/1.1 keep-alive):
+
+    GET  /project              the whole project with versions, locks and the change sequence number
+    POST /sync                 {client, since, epoch, changes, checkout, release, labels} ->
+                               results and all images changed by others since `since`
+"""
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from .class_index import assign_class_ids
+from .project import read_project, write_project
+
+LOCK_SECONDS = 120
+SAVE_DELAY = 5.0
+MAX_BODY = 256 * 1024 * 1024
+
+
+class ProjectStore:
+    """The shared project with per-image versions, locks and a change log; all methods are thread-safe."""
+
+    def __init__(self, path, save_delay=SAVE_DELAY, allow_new_images=False):
+        self.path = path
+        self.save_delay = save_delay
+        self.allow_new_images = allow_new_images
+        self.project = read_project(path)
+        self.versions = self.project.setdefault("image_versions", {})
+        self.known = set(self.project["image_list"])
+        self.locks = {}  # image path -> (client, expiry time)
+        # Sequence numbers count from 0 again after a restart; the epoch tells clients to start over.
+        self.epoch = os.urandom(8).hex()
+        self.seq = 0
+        self.log_seqs, self.log_paths = [], []  # change log, ascending by seq
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.dirty_since = None
+        self.closed = False
+        self.saver = threading.Thread(target=self._save_loop, daemon=True)
+        self.saver.start()
+
+    # Locks -------------------------------------------------------------
+
+    def _holder(self, path, now):
+        holder = self.locks.get(path)
+        if holder is None or holder[1] < now:
+            self.locks.pop(path, None)
+            return None
+        return holder[0]
+
+    def _checkout(self, path, client, now):
+        holder = self._holder(path, now)
+        if holder is not None and holder != client:
+            return holder
+        self.locks[path] = (client, now + LOCK_SECONDS)
+        return client
+
+    # Reads and writes --------------------------------------------------
+
+    def _check_changes(self, changes):
+        """Raise ValueError (a 400 response) unless every change is well-formed and for an image it may change."""
+        if not isinstance(changes, (list, tuple)):
+            raise ValueError("changes must be a list")
+        for change in changes:
+            if not isinstance(change, dict) or not isinstance(change.get("path"), str):
+                raise ValueError("every change needs a path")
+            if change["path"] not in self.known and not self.allow_new_images:
+                raise ValueError(f"{change['path']} is not an image of this project")
+            if not isinstance(change.get("version", 0), int):
+                raise ValueError(f"bad version for {change['path']}")
+            annotations = change.get("annotations")
+            if not isinstance(annotations, list):
+                raise ValueError(f"annotations of {change['path']} must be a list")
+            for ann in annotations:
+                if not (isinstance(ann, dict) and isinstance(ann.get("type"), str)
+                        and isinstance(ann.get("label"), str) and isinstance(ann.get("points"), list)
+                        and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in ann["points"])
+                        and isinstance(ann.get("attributes", {}), dict)):
+                    raise ValueError(f"malformed annotation for {change['path']}")
+
+    def snapshot(self):
+        """The whole project with versions, current locks and change sequence number, for a client to start from."""
+        with self.lock:
+            now = time.time()
+            store = self.project["annotation_store"]
+            locks = {}
+            for path in list(self.locks):
+                holder = self._holder(path, now)
+                if holder is not None:
+                    locks[path] = holder
+            return {"labels": list(self.project["labels"]), "class_ids": dict(self.project["class_ids"]),
+                    "image_list": list(self.project["image_list"]),
+                    "annotation_store": {p: anns for p, anns in store.items() if anns},
+                    "versions": dict(self.versions), "locks": locks, "seq": self.seq, "epoch": self.epoch}
+
+    def sync(self, client, since=0, changes=(), checkout=None, release=(), epoch=None, labels=()):
+        """
+        Apply one client's batch. changes is a list of {path, version,
+        annotations} where version is the one the edit is based on; labels are
+        added to the class list. Returns
+        {results, checkout, seq, epoch, updates, labels, class_ids}: a status per change ("ok",
+        "conflict" or "locked", with the current version and, unless ok, the
+        current annotations), the holder of the requested checkout, and every
+        image changed by other clients since the client's last seq. A client
+        from before a restart (other epoch) gets every image that has a version.
+        """
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("the server is shutting down")
+            # Nothing is applied from a batch with a malformed change.
+            self._check_changes(changes)
+            if not all(isinstance(lab, str) for lab in labels):
+                raise ValueError("labels must be strings")
+            now = time.time()
+            new_labels = [lab for lab in labels if lab not in self.project["labels"]]
+            self.project["labels"].extend(new_labels)
+            assign_class_ids(new_labels, self.project["class_ids"])
+            for path in release:
+                if self._holder(path, now) == client:
+                    del self.locks[path]
+            holder = self._checkout(checkout, client, now) if checkout else None
+            store = self.project["annotation_store"]
+            results, own = [], set()
+            for change in changes:
+                path = change["path"]
+                current = self.versions.get(path, 0)
+                lock_holder = self._holder(path, now)
+                if lock_holder is not None and lock_holder != client:
+                    status = "locked"
+                elif change.get("version", 0) != current:
+                    status = "conflict"
+                else:
+                    status = "ok"
+                    current += 1
+                    self.versions[path] = current
+                    store[path] = change["annotations"]
+                    self.seq += 1
+                    self.log_seqs.append(self.seq)
+                    self.log_paths.append(path)
+                    own.add(path)
+                    if path not in self.known:
+                        self.known.add(path)
+                        self.project["image_list"].append(path)
+                result = {"path": path, "status": status, "version": current}
+                if status != "ok":
+                    result["annotations"] = store.get(path, [])
+                    result["holder"] = lock_holder
+                results.append(result)
+            if own or new_labels:
+                self._mark_dirty()
+            if epoch is not None and epoch != self.epoch:
+                updated = set(self.versions) - own
+            else:
+                start = bisect.bisect_right(self.log_seqs, since)
+                updated = {p for p in self.log_paths[start:] if p not in own}
+            updates = {p: {"version": self.versions[p], "annotations": store.get(p, [])} for p in updated}
+            return {"results": results, "checkout": holder, "seq": self.seq, "epoch": self.epoch,
+                    "updates": updates, "labels": list(self.project["labels"]),
+                    "class_ids": dict(self.project["class_ids"])}
+
+    # Saving ------------------------------------------------------------
+
+    def _mark_dirty(self):
+        if self.dirty_since is None:
+            self.dirty_since = time.time()
+            self.changed.notify()
+
+    def _save_loop(self):
+        with self.lock:
+            while not self.closed:
+                if self.dirty_since is None:
+                    self.changed.wait()
+                    continue
+                delay = self.dirty_since + self.save_delay - time.time()
+                if delay > 0:
+                    self.changed.wait(delay)
+                    continue
+                try:
+                    self._save_locked()
+                except OSError as e:
+                    # Keep the changes in memory and try again after the next delay.
+                    print(f"Could not save {self.path}: {e}", file=sys.stderr)
+                    self._mark_dirty()
+
+    def _save_locked(self):
+        # Annotation lists are replaced, never changed in place, so a shallow
+        # copy is a consistent snapshot that can be written without the lock.
+        project = dict(self.project, annotation_store=dict(self.project["annotation_store"]),
+                       image_list=list(self.project["image_list"]), labels=list(self.project["labels"]),
+                       class_ids=dict(self.project["class_ids"]),
+                       image_versions=dict(self.versions))
+        self.dirty_since = None
+        self.lock.release()
+        try:
+            write_project(self.path, project)
+        finally:
+            self.lock.acquire()
+
+    def close(self):
+        """Stop the background saver and write pending changes."""
+        with self.lock:
+            self.closed = True
+            self.changed.notify()
+        # The saver may be writing an older snapshot right now (without the
+        # lock); waiting for it keeps the final write below the last one.
+        self.saver.join()
+        with self.lock:
+            if self.dirty_since is not None:
+                self._save_locked()
+
+
+class AnnotationRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so a client reuses one connection
+    # Headers and body go out in separate writes; without TCP_NODELAY each
+    # response waits for the client's delayed ACK (about 40 ms).
+    disable_nagle_algorithm = True
+    server_version = "AnnotatorServer/1.0"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.store.closed:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            raise ValueError("request too large")
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        store = self.server.store
+        route = urlparse(self.path).path
+        if route == "/project":
+            self._send(200, store.snapshot())
+        else:
+            self._send(404, {"error": f"unknown endpoint {route}"})
+
+    def do_POST(self):
+        store = self.server.store
+        route = urlparse(self.path).path
+        try:
+            body = self._read_json()
+            if route == "/sync":
+                self._send(200, store.sync(str(body["client"]), int(body.get("since", 0)),
+                                           body.get("changes", ()), body.get("checkout"),
+                                           body.get("release", ()), body.get("epoch"), body.get("labels", ())))
+            else:
+                self._send(404, {"error": f"unknown endpoint {route}"})
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {"error": f"bad request: {e}"})
+        except RuntimeError as e:
+            self._send(503, {"error": str(e)})
+
+
+def make_server(project_path, host="127.0.0.1", port=8765, save_delay=SAVE_DELAY, quiet=False,
+                allow_new_images=False):
+    """
+    A ThreadingHTTPServer serving project_path; call serve_forever(), then
+    shutdown() and store.close(). Unless allow_new_images, clients can only
+    change images that are in the project.
+    """
+    server = ThreadingHTTPServer((host, port), AnnotationRequestHandler)
+    server.daemon_threads = True
+    server.store = ProjectStore(project_path, save_delay, allow_new_images)
+    server.quiet = quiet
+    return server
+
@@ -0,0 +1,327 @@
+# annotator/statistics.py
+"""
+Dataset statistics: class balance, box sizes, box aspect ratios, annotations
+per image and completion, shown as histograms in View -> Statistics and
+exportable as JSON (also `python cli.py stats`).
+
+recompute() computes everything in one vectorized pass over the project.
+After that the counters are kept up to date per image: every add, edit,
+delete, undo and redo of the current image calls update_image(), which
+subtracts the image's previous contribution and adds the new one, and
+refresh() does the same for the images whose annotation list was replaced by
+a tool (annotation lists in the store are replaced, never changed in place).
+
+Box size is the square root of the bounding-box area in pixels, so the
+32 / 96 edges are the COCO small / medium / large limits; aspect ratio is
+width / height of the bounding box. Polygons count with their bounding box;
+shapes without any extent have no aspect ratio.
+"""
+import json
+from collections import Counter
+from itertools import chain
+
+SIZE_EDGES = (8, 16, 32, 64, 96, 128, 256, 512, 1024)
+ASPECT_EDGES = (1 / 8, 1 / 4, 1 / 2, 1, 2, 4, 8)
+DENSITY_EDGES = (1, 2, 3, 5, 10, 20, 50, 100)
+# Refreshing image by image stops paying off when most of the project changed.
+FULL_RECOMPUTE_FRACTION = 0.25
+REFRESH_MS = 2000
+
+
+def bin_labels(edges, unit=""):
+    """Readable names of the len(edges) + 1 bins that np.searchsorted(edges, v, 'right') produces."""
+    def fmt(v):
+        return f"1/{round(1 / v)}" if 0 < v < 1 else f"{v:g}"
+    names = [f"<{fmt(edges[0])}{unit}"]
+    names += [f"{fmt(lo)}-{fmt(hi)}{unit}" for lo, hi in zip(edges, edges[1:])]
+    names.append(f">={fmt(edges[-1])}{unit}")
+    return names
+
+
+def count_bin_labels(edges):
+    """Names of the bins of whole-number counts: '0', then '1', '2', '3-4', ... and '>=100' for DENSITY_EDGES."""
+    names = ["0"] + [str(lo) if hi - lo == 1 else f"{lo}-{hi - 1}" for lo, hi in zip(edges, edges[1:])]
+    return names + [f">={edges[-1]}"]
+
+
+def _arrays(annotation_lists):
+    """Labels, types, box sizes, aspect ratios and image index of all annotations in a list of annotation lists."""
+    import numpy as np
+
+    anns = [ann for anns in annotation_lists for ann in anns]
+    owner = np.repeat(np.arange(len(annotation_lists)), [len(a) for a in annotation_lists])
+    # One flat coordinate array for all shapes instead of an array per shape.
+    counts = np.fromiter((len(ann["points"]) // 2 for ann in anns), dtype=np.int64, count=len(anns))
+    coords = np.fromiter(chain.from_iterable(ann["points"][:n * 2] for ann, n in zip(anns, counts.tolist())),
+                         dtype=np.float64, count=int(counts.sum()) * 2).reshape(-1, 2)
+    width = np.zeros(len(anns))
+    height = np.zeros(len(anns))
+    nonempty = counts > 0
+    if nonempty.any():
+        starts = (np.cumsum(counts) - counts)[nonempty]
+        width[nonempty] = np.maximum.reduceat(coords[:, 0], starts) - np.minimum.reduceat(coords[:, 0], starts)
+        height[nonempty] = np.maximum.reduceat(coords[:, 1], starts) - np.minimum.reduceat(coords[:, 1], starts)
+    size = np.sqrt(width * height)
+    # Shapes without extent have no aspect ratio; NaN sorts past the last bin and is dropped.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        aspect = width / height
+    return [ann["label"] for ann in anns], [ann["type"] for ann in anns], size, aspect, owner
+
+
+class DatasetStatistics:
+    """Counters over an annotation store. Histograms are NumPy int64 arrays, one count per bin."""
+
+    def __init__(self):
+        self.indexed = {}  # image path -> the annotation list counted for it
+        self.version = 0  # goes up with every change of the counts
+        self._reset()
+
+    def _reset(self):
+        import numpy as np
+
+        self.class_annotations = Counter()
+        self.class_images = Counter()
+        self.types = Counter()
+        self.size_hist = np.zeros(len(SIZE_EDGES) + 1, dtype=np.int64)
+        self.aspect_hist = np.zeros(len(ASPECT_EDGES) + 1, dtype=np.int64)
+        self.density_hist = np.zeros(len(DENSITY_EDGES) + 1, dtype=np.int64)  # bin 0: images without annotations
+        self.annotations = 0
+        self.annotated_images = 0
+
+    def _add(self, anns_by_image, sign):
+        import numpy as np
+
+        labels, types, size, aspect, owner = _arrays(anns_by_image)
+        self.version += 1
+        self.size_hist += sign * np.bincount(np.searchsorted(SIZE_EDGES, size, "right"),
+                                             minlength=len(self.size_hist))
+        self.aspect_hist += sign * np.bincount(np.searchsorted(ASPECT_EDGES, aspect[~np.isnan(aspect)], "right"),
+                                               minlength=len(self.aspect_hist))
+        per_image = np.bincount(owner, minlength=len(anns_by_image))
+        nonempty = per_image[per_image > 0]
+        self.density_hist += sign * np.bincount(np.searchsorted(DENSITY_EDGES, nonempty, "right"),
+                                                minlength=len(self.density_hist))
+        self.annotations += sign * len(labels)
+        self.annotated_images += sign * len(nonempty)
+        for label, count in Counter(labels).items():
+            self.class_annotations[label] += sign * count
+        for label, count in Counter(label for anns in anns_by_image for label in {a["label"] for a in anns}).items():
+            self.class_images[label] += sign * count
+        for kind, count in Counter(types).items():
+            self.types[kind] += sign * count
+
+    def recompute(self, annotation_store):
+        """Count the whole store from scratch in one vectorized pass."""
+        self._reset()
+        self.indexed = dict(annotation_store)
+        self._add(list(self.indexed.values()), 1)
+        return self
+
+    def update_image(self, path, anns):
+        """Replace the counts of one image with those of its new annotation list."""
+        old = self.indexed.get(path)
+        if old is anns:
+            return
+        if old is not None:
+            self._add([old], -1)
+        self._add([anns], 1)
+        self.indexed[path] = anns
+
+    def refresh(self, annotation_store):
+        """Apply the images whose annotation list was replaced since they were counted."""
+        indexed = self.indexed
+        changed = [p for p, anns in annotation_store.items() if indexed.get(p) is not anns]
+        removed = [p for p in indexed if p not in annotation_store] if len(indexed) + len(changed) > len(
+            annotation_store) else []
+        if len(changed) + len(removed) > FULL_RECOMPUTE_FRACTION * max(len(annotation_store), 1):
+            return self.recompute(annotation_store)
+        old = [indexed[p] for p in changed if p in indexed] + [indexed.pop(p) for p in removed]
+        if old:
+            self._add(old, -1)
+        if changed:
+            self._add([annotation_store[p] for p in changed], 1)
+            for p in changed:
+                indexed[p] = annotation_store[p]
+        return self
+
+    def to_dict(self, labels=(), image_list=None, image_status=None):
+        """The statistics as plain JSON data. Classes of the class list are included even when unused."""
+        images = len(image_list) if image_list is not None else self.annotated_images
+        density = self.density_hist.tolist()
+        density[0] = max(images - self.annotated_images, 0)
+        completed = sum(1 for p in image_list if image_status.get(p)) if image_list and image_status else 0
+        classes = list(labels) + sorted(set(self.class_annotations) - set(labels), key=str)
+        return {
+            "images": images,
+            "annotated_images": self.annotated_images,
+            "completed_images": completed,
+            "completion_rate": completed / images if images else 0.0,
+            "annotated_rate": self.annotated_images / images if images else 0.0,
+            "annotations": self.annotations,
+            "types": {kind: n for kind, n in self.types.items() if n},
+            "classes": {label: {"annotations": self.class_annotations.get(label, 0),
+                                "images": self.class_images.get(label, 0)} for label in classes
+                        if label in labels or self.class_annotations.get(label, 0)},
+            "box_size": {"bins": bin_labels(SIZE_EDGES, "px"), "counts": self.size_hist.tolist()},
+            # Bins 0-2 are below 32 px, 3-4 from 32 to 96 px.
+            "coco_sizes": {"small": int(self.size_hist[:3].sum()), "medium": int(self.size_hist[3:5].sum()),
+                           "large": int(self.size_hist[5:].sum())},
+            "aspect_ratio": {"bins": bin_labels(ASPECT_EDGES), "counts": self.aspect_hist.tolist()},
+            "annotations_per_image": {"bins": count_bin_labels(DENSITY_EDGES), "counts": density},
+        }
+
+
+def write_json(stats_dict, path):
+    with open(path, "w") as f:
+        json.dump(stats_dict, f, indent=2)
+
+
+def update_current_image(app):
+    """Count the current image's annotations again after an edit and redraw an open dashboard."""
+    if app.statistics is None or not app.image_path:
+        return
+    app.store_current_annotations()
+    app.statistics.update_image(app.image_path, app.annotation_store[app.image_path])
+    _schedule_redraw(app)
+
+
+def project_loaded(app):
+    """Recompute after a project, folder or video was loaded (only once the dashboard has been used)."""
+    if app.statistics is None:
+        return
+    app.statistics.recompute(app.annotation_store)
+    _schedule_redraw(app)
+
+
+def _schedule_redraw(app):
+    win = getattr(app, "statistics_window", None)
+    if win is None or not win.winfo_exists() or win.redraw_job is not None:
+        return
+    # A burst of edits (e.g. dragging a box) costs one redraw.
+    win.redraw_job = win.after(200, win.redraw)
+
+
+def _draw_bars(canvas, title, names, counts, color):
+    """Draw a bar chart of counts with names under the bars."""
+    canvas.delete("all")
+    width = max(canvas.winfo_width(), 100)
+    height = max(canvas.winfo_height(), 80)
+    pad, bottom = 30, 40
+    canvas.create_text(pad, 8, anchor="nw", text=title, fill="black")
+    if not counts:
+        return
+    top = max(max(counts), 1)
+    canvas.create_text(pad - 4, 24, anchor="ne", text=str(top), font=("Helvetica", 8))
+    canvas.create_line(pad, height - bottom, width - 10, height - bottom, fill="gray")
+    step = (width - pad - 10) / len(counts)
+    for i, (name, count) in enumerate(zip(names, counts)):
+        x0 = pad + i * step + step * 0.1
+        x1 = pad + (i + 1) * step - step * 0.1
+        y = height - bottom - (height - bottom - 24) * count / top
+        canvas.create_rectangle(x0, y, x1, height - bottom, fill=color, outline="")
+        if count:
+            canvas.create_text((x0 + x1) / 2, y - 2, anchor="s", text=str(count), font=("Helvetica", 7))
+        label = name if len(name) <= 10 else name[:9] + "…"
+        canvas.create_text((x0 + x1) / 2, height - bottom + 4, anchor="ne", text=label, angle=30,
+                           font=("Helvetica", 7))
+
+
+def show_statistics(app, max_classes=40):
+    """View -> Statistics: histograms of the project that follow the edits."""
+    import tkinter as tk
+    from tkinter import filedialog, ttk
+
+    win = getattr(app, "statistics_window", None)
+    if win is not None and win.winfo_exists():
+        win.lift()
+        return
+    app.store_current_annotations()
+    if app.statistics is None:
+        app.statistics = DatasetStatistics().recompute(app.annotation_store)
+    else:
+        app.statistics.refresh(app.annotation_store)
+
+    win = tk.Toplevel(app)
+    win.title("Dataset Statistics")
+    win.geometry("1000x700")
+    summary = ttk.Label(win, text="", padding=5, justify="left")
+    summary.pack(fill=tk.X)
+    grid = ttk.Frame(win)
+    grid.pack(fill=tk.BOTH, expand=True)
+    canvases = []
+    for n in range(4):
+        canvas = tk.Canvas(grid, bg="white", height=250)
+        canvas.grid(row=n // 2, column=n % 2, sticky="nsew", padx=3, pady=3)
+        canvases.append(canvas)
+    for n in range(2):
+        grid.rowconfigure(n, weight=1)
+        grid.columnconfigure(n, weight=1)
+    completion = tk.Canvas(win, bg="white", height=36)
+    completion.pack(fill=tk.X, padx=3)
+
+    def current():
+        return app.statistics.to_dict(app.labels, app.image_list, app.image_status)
+
+    def redraw():
+        win.redraw_job = None
+        if not win.winfo_exists():
+            return
+        win.drawn_version = app.statistics.version
+        stats = current()
+        classes = sorted(stats["classes"].items(), key=lambda item: -item[1]["annotations"])[:max_classes]
+        _draw_bars(canvases[0], f"Annotations per class ({len(stats['classes'])} classes)",
+                   [label for label, _ in classes], [c["annotations"] for _, c in classes], "#4363d8")
+        _draw_bars(canvases[1], "Box size (sqrt of area)", stats["box_size"]["bins"],
+                   stats["box_size"]["counts"], "#3cb44b")
+        _draw_bars(canvases[2], "Aspect ratio (width / height)", stats["aspect_ratio"]["bins"],
+                   stats["aspect_ratio"]["counts"], "#f58231")
+        _draw_bars(canvases[3], "Annotations per image", stats["annotations_per_image"]["bins"],
+                   stats["annotations_per_image"]["counts"], "#911eb4")
+        counts = [c["annotations"] for c in stats["classes"].values() if c["annotations"]]
+        balance = f"{max(counts) / min(counts):.1f}x" if counts else "-"
+        sizes = stats["coco_sizes"]
+        summary.config(text=f"{stats['images']} images, {stats['annotated_images']} annotated, "
+                            f"{stats['completed_images']} completed; {stats['annotations']} annotations "
+                            f"({', '.join(f'{k}: {v}' for k, v in stats['types'].items()) or 'none'}). "
+                            f"Most / least frequent class: {balance}. "
+                            f"Small / medium / large boxes: {sizes['small']} / {sizes['medium']} / {sizes['large']}")
+        completion.delete("all")
+        width = max(completion.winfo_width(), 100)
+        for rate, color in ((stats["annotated_rate"], "#aaffc3"), (stats["completion_rate"], "#3cb44b")):
+            completion.create_rectangle(5, 8, 5 + (width - 10) * rate, 28, fill=color, outline="")
+        completion.create_rectangle(5, 8, width - 5, 28, outline="gray")
+        completion.create_text(width / 2, 18, text=f"completed {stats['completion_rate']:.0%}, "
+                                                   f"annotated {stats['annotated_rate']:.0%}")
+
+    def recompute():
+        app.store_current_annotations()
+        app.statistics.recompute(app.annotation_store)
+        redraw()
+
+    def export():
+        path = filedialog.asksaveasfilename(parent=win, defaultextension=".json", filetypes=[("JSON files", "*.json")])
+        if path:
+            app.store_current_annotations()
+            app.statistics.refresh(app.annotation_store)
+            write_json(current(), path)
+
+    buttons = ttk.Frame(win, padding=5)
+    buttons.pack(fill=tk.X)
+    ttk.Button(buttons, text="Recompute", command=recompute).pack(side=tk.LEFT)
+    ttk.Button(buttons, text="Export JSON...", command=export).pack(side=tk.LEFT, padx=5)
+    def tick():
+        # Pick up what tools, class operations and server syncs changed in other images.
+        if not win.winfo_exists():
+            return
+        app.statistics.refresh(app.annotation_store)
+        if app.statistics.version != win.drawn_version:
+            _schedule_redraw(app)
+        win.after(REFRESH_MS, tick)
+
+    win.redraw = redraw
+    win.redraw_job = None
+    win.drawn_version = None
+    win.bind("<Configure>", lambda event: _schedule_redraw(app) if event.widget is win else None)
+    app.statistics_window = win
+    win.after(50, redraw)
+    win.after(REFRESH_MS, tick)
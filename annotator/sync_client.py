@@ -0,0 +1,342 @@
+# annotator/sync_client.py
+"""
+Client side of the annotation server (see server.py). File -> Connect to
+Server replaces the open project with the server's; from then on the edits of
+this annotator are sent every SYNC_INTERVAL_MS, and whenever another image is
+opened, as one batched request over a kept-alive connection, and the edits
+of the others come back in the same response. Opening an image checks it out
+on the server. An edit the server rejects (the image was changed or checked
+out by someone else) is replaced by the server's version; the rejected
+annotations are added to <project>.sync_conflicts.json next to the project
+file (see conflicts_path_for) so no work is lost.
+"""
+import getpass
+import http.client
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+SYNC_INTERVAL_MS = 3000
+CONFLICTS_FILE = "sync_conflicts.json"
+
+
+class SyncClient:
+    """JSON over one persistent HTTP/1.1 connection; reconnects once when the server closed it."""
+
+    def __init__(self, url=DEFAULT_URL, client_id=None, timeout=30):
+        parsed = urlparse(url if "://" in url else "http://" + url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.client_id = client_id or f"{getpass.getuser()}@{socket.gethostname()}:{os.getpid()}"
+        self.conn = None
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # An idle keep-alive connection the server has dropped; a
+                # repeated sync is harmless (see SyncSession.apply).
+                self.close()
+                if attempt:
+                    raise
+                continue
+            except (OSError, http.client.HTTPException):
+                self.close()
+                raise
+            if response.status != 200:
+                self.close()
+                try:
+                    message = json.loads(data).get("error", "")
+                except ValueError:
+                    message = data[:200].decode("utf-8", "replace")
+                raise RuntimeError(f"Server error {response.status}: {message}")
+            return json.loads(data)
+
+    def project(self):
+        return self._request("GET", "/project")
+
+    def sync(self, job):
+        return self._request("POST", "/sync", dict(job, client=self.client_id))
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class SyncSession:
+    """
+    What this client last agreed on with the server: the version and
+    annotation list of every image. prepare() turns the local differences into
+    a sync job; apply() merges the server's answer back into the local store.
+    Both run on the thread that owns the store; only the request itself runs
+    on the worker thread.
+    """
+
+    def __init__(self, client, snapshot):
+        self.client = client
+        self.epoch = snapshot["epoch"]
+        self.seq = snapshot["seq"]
+        self.versions = dict(snapshot["versions"])
+        # Annotation lists are replaced, never changed in place, so an
+        # unchanged image is recognised by identity before comparing.
+        self.base = dict(snapshot["annotation_store"])
+        self.known = set(snapshot["image_list"])  # the server refuses changes to other images
+        self.conflicts_path = None
+        self.checkout = None
+        self.release = []
+        self.rejected = {}
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.in_flight = False
+        self.worker = threading.Thread(target=self._work, daemon=True)
+        self.worker.start()
+
+    def request_checkout(self, path):
+        if path != self.checkout:
+            if self.checkout is not None:
+                self.release.append(self.checkout)
+            self.checkout = path
+
+    def changed_paths(self, annotation_store):
+        base, known = self.base, self.known
+        return [p for p, anns in annotation_store.items()
+                if anns is not base.get(p) and p in known and anns != base.get(p, [])]
+
+    def prepare(self, annotation_store, labels=()):
+        changes = [{"path": p, "version": self.versions.get(p, 0), "annotations": annotation_store[p]}
+                   for p in self.changed_paths(annotation_store)]
+        job = {"since": self.seq, "epoch": self.epoch, "changes": changes, "checkout": self.checkout,
+               "release": [p for p in self.release if p != self.checkout], "labels": list(labels)}
+        self.release = []
+        return job
+
+    def apply(self, job, response, annotation_store):
+        """
+        Merge a sync response. Returns (changed, rejected, lock holder or
+        None): the images whose local annotations were replaced, the images
+        whose local edits the server refused, and who else holds the
+        requested checkout.
+        """
+        sent = {change["path"]: change["annotations"] for change in job["changes"]}
+        changed, rejected = [], []
+        for result in response["results"]:
+            path, version = result["path"], result["version"]
+            self.versions[path] = version
+            if result["status"] == "ok" or result["annotations"] == sent[path]:
+                self.base[path] = sent[path]
+                continue
+            # The server's version wins; the latest local annotations are kept aside.
+            self.rejected[path] = {"annotations": annotation_store.get(path, sent[path]), "reason": result["status"],
+                                   "holder": result.get("holder"), "time": time.time()}
+            self.base[path] = annotation_store[path] = result["annotations"]
+            rejected.append(path)
+            changed.append(path)
+        for path, update in response["updates"].items():
+            if update["version"] <= self.versions.get(path, 0):
+                continue
+            local = annotation_store.get(path)
+            if local is not None and local is not self.base.get(path) and local != self.base.get(path, []):
+                continue  # edited here meanwhile; the next sync reports the conflict
+            self.versions[path] = update["version"]
+            self.base[path] = annotation_store[path] = update["annotations"]
+            changed.append(path)
+        self.seq, self.epoch = response["seq"], response["epoch"]
+        holder = response.get("checkout")
+        return changed, rejected, (holder if holder != self.client.client_id else None)
+
+    # Worker thread -----------------------------------------------------
+
+    def submit(self, job):
+        self.in_flight = True
+        self.jobs.put(job)
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            try:
+                self.results.put((job, self.client.sync(job), None))
+            except Exception as e:
+                self.results.put((job, None, e))
+
+    def close(self, timeout=10):
+        self.jobs.put(None)
+        self.worker.join(timeout)
+        self.client.close()
+
+
+def conflicts_path_for(project_path):
+    """<project>.sync_conflicts.json next to the project file, or in the user cache without one."""
+    if project_path:
+        return os.path.splitext(os.path.abspath(project_path))[0] + "." + CONFLICTS_FILE
+    return os.path.join(os.path.expanduser("~"), ".cache", "annotator", CONFLICTS_FILE)
+
+
+def save_conflicts(rejected, path):
+    """
+    Merge rejected edits ({image path: entry}) into the conflicts file at path,
+    which keeps every rejected version per image across sessions.
+    """
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        saved = {}
+    for image_path, entry in rejected.items():
+        entries = saved.setdefault(image_path, [])
+        if isinstance(entries, dict):  # written by an earlier version: one entry per image
+            entries = saved[image_path] = [entries]
+        if not any(e.get("time") == entry["time"] for e in entries):
+            entries.append(entry)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(saved, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def connect_to_server(app):
+    """Ask for the server address, load its project and start syncing."""
+    from tkinter import messagebox, simpledialog
+
+    url = simpledialog.askstring("Connect to Server", "Annotation server address:", initialvalue=DEFAULT_URL,
+                                 parent=app)
+    if not url:
+        return
+    if app.image_list and not messagebox.askyesno(
+            "Connect to Server", "Replace the open project with the server's project?"):
+        return
+    if app.sync_session is not None:
+        disconnect_from_server(app)
+    client = SyncClient(url, timeout=10)
+    try:
+        snapshot = client.project()
+    except (OSError, http.client.HTTPException, RuntimeError, ValueError) as e:
+        client.close()
+        messagebox.showerror("Error", f"Could not connect to {url}:\n{e}")
+        return
+    client.timeout = 30
+    app.image_path = None
+    app.annotations = []
+    app.image_list = snapshot["image_list"]
+    app.labels = snapshot["labels"]
+    app.class_ids = snapshot.get("class_ids", {})
+    app.update_class_buttons()
+    app.annotation_store = dict(snapshot["annotation_store"])
+    app.image_status = {img: False for img in app.image_list}
+    app.duplicate_of = {}
+    app.stop_active_queue()
+    app.sync_session = SyncSession(client, snapshot)
+    app.sync_session.conflicts_path = conflicts_path_for(app.project_path)
+    app.reset_image_list()
+    app.current_image_index = 0
+    if app.image_list:
+        app.tree.select(0)
+        app.load_image(app.image_list[0])
+    app.system_message_label.config(text=f"Connected to {client.host}:{client.port} as {client.client_id}")
+    app.after(SYNC_INTERVAL_MS, lambda: _sync_tick(app, app.sync_session))
+    _poll_results(app, app.sync_session)
+
+
+def sync_now(app):
+    """Send the local edits (and the current checkout) unless a request is already on its way."""
+    session = app.sync_session
+    if session is None or session.in_flight:
+        return
+    app.store_current_annotations()
+    session.submit(session.prepare(app.annotation_store, app.labels))
+
+
+def _sync_tick(app, session):
+    if app.sync_session is not session:
+        return
+    sync_now(app)
+    app.after(SYNC_INTERVAL_MS, lambda: _sync_tick(app, session))
+
+
+def _poll_results(app, session):
+    if app.sync_session is not session:
+        return
+    try:
+        while True:
+            job, response, error = session.results.get_nowait()
+            session.in_flight = False
+            if error is not None:
+                app.system_message_label.config(text=f"Server sync failed, retrying: {error}")
+                continue
+            _apply_response(app, session, job, response)
+            if job["checkout"] != session.checkout:
+                sync_now(app)  # another image was opened meanwhile; check it out now
+    except queue.Empty:
+        pass
+    app.after(100, lambda: _poll_results(app, session))
+
+
+def _apply_response(app, session, job, response):
+    app.store_current_annotations()
+    changed, rejected, holder = session.apply(job, response, app.annotation_store)
+    new_labels = [lab for lab in response["labels"] if lab not in app.labels]
+    if new_labels:
+        app.labels.extend(new_labels)
+        app.update_class_buttons()
+    # The server's ids win, so classes added by two clients at once do not end up with swapped ids.
+    app.class_ids.update(response.get("class_ids", {}))
+    if app.image_path in changed:
+        from .models import Annotation
+        app.annotations = [Annotation.from_dict(d) for d in app.annotation_store.get(app.image_path, [])]
+        app.selected_annotation = None
+        app.redraw_canvas()
+    messages = []
+    if holder is not None and job["checkout"] == app.image_path:
+        messages.append(f"{os.path.basename(app.image_path)} is checked out by {holder}; "
+                        "your changes to it will not be saved.")
+    if rejected:
+        save_conflicts(session.rejected, session.conflicts_path)
+        messages.append(f"{len(rejected)} edits were refused by the server (changed or checked out by "
+                        f"someone else); they are kept in {session.conflicts_path}.")
+    if messages:
+        app.system_message_label.config(text="\n".join(messages))
+
+
+def disconnect_from_server(app):
+    """Send the last edits, release the checkout and stop syncing."""
+    session = app.sync_session
+    if session is None:
+        return
+    app.sync_session = None
+    app.store_current_annotations()
+    session.request_checkout(None)
+    # Wait for a request still on its way, then sync once more.
+    while session.in_flight:
+        try:
+            job, response, error = session.results.get(timeout=session.client.timeout)
+        except queue.Empty:
+            break
+        session.in_flight = False
+        if error is None:
+            session.apply(job, response, app.annotation_store)
+    job = session.prepare(app.annotation_store, app.labels)
+    try:
+        session.apply(job, session.client.sync(job), app.annotation_store)
+    except (OSError, http.client.HTTPException, RuntimeError) as e:
+        from tkinter import messagebox
+        messagebox.showwarning("Server", f"The last changes could not be sent:\n{e}\n"
+                                         "Save the project locally to keep them.")
+    if session.rejected:
+        save_conflicts(session.rejected, session.conflicts_path)
+    session.close()
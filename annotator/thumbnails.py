@@ -0,0 +1,309 @@
+# annotator/thumbnails.py
+import hashlib
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+THUMB_SIZE = 128
+CELL_PAD = 8
+CAPTION_HEIGHT = 16
+CLASS_COLORS = ("#e6194b", "#3cb44b", "#4363d8", "#f58231", "#911eb4", "#42d4f4", "#f032e6",
+                "#bfef45", "#fabed4", "#469990", "#dcbeff", "#9a6324", "#800000", "#aaffc3")
+
+
+def _default_cache_dir():
+    return os.path.join(os.path.expanduser("~"), ".cache", "annotator", "thumbnails")
+
+
+class ThumbnailCache:
+    """
+    Persistent thumbnail cache. Entries are JPEG files keyed by the image's
+    absolute path, mtime and size, so an edited image gets a new thumbnail and
+    stale entries are simply never read again. New thumbnails are decoded in
+    draft mode: JPEGs are decoded directly at 1/2 to 1/8 scale, which is several
+    times faster than a full decode followed by a resize.
+    """
+
+    def __init__(self, cache_dir=None, size=THUMB_SIZE):
+        self.cache_dir = cache_dir or _default_cache_dir()
+        self.size = size
+
+    def _cache_path(self, image_path, st):
+        key = f"{os.path.abspath(image_path)}|{st.st_mtime_ns}|{st.st_size}|{self.size}"
+        digest = hashlib.md5(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + ".jpg")
+
+    def load(self, image_path):
+        """Return (thumbnail, original size). Reads the cache or creates and stores the thumbnail."""
+        st = os.stat(image_path)
+        cache_path = self._cache_path(image_path, st)
+        if os.path.exists(cache_path):
+            try:
+                with Image.open(image_path) as img:
+                    original_size = img.size  # header only
+                thumb = Image.open(cache_path)
+                thumb.load()
+                return thumb, original_size
+            except OSError:
+                pass
+        with Image.open(image_path) as img:
+            original_size = img.size
+            img.draft("RGB", (self.size, self.size))
+            thumb = img.convert("RGB")
+        thumb.thumbnail((self.size, self.size))
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        try:
+            thumb.save(tmp_path, "JPEG", quality=85)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # A read-only cache only costs speed.
+        return thumb, original_size
+
+
+class ThumbnailLoader:
+    """
+    Produces thumbnails on a background thread pool. request() is called from
+    the Tk thread; finished thumbnails are picked up with poll(), also on the Tk
+    thread. Requests that have not started yet can be dropped with
+    cancel_pending() when they scroll out of view.
+    """
+
+    def __init__(self, cache, workers=4):
+        self.cache = cache
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.results = queue.Queue()
+        self.pending = {}
+
+    def _work(self, path):
+        try:
+            thumb, original_size = self.cache.load(path)
+        except OSError:
+            thumb, original_size = None, None
+        self.results.put((path, thumb, original_size))
+
+    def request(self, path):
+        if path not in self.pending:
+            self.pending[path] = self.pool.submit(self._work, path)
+
+    def cancel_pending(self, keep=()):
+        keep = set(keep)
+        for path, future in list(self.pending.items()):
+            if path not in keep and future.cancel():
+                del self.pending[path]
+
+    def poll(self):
+        """Return the thumbnails finished since the last call as (path, thumb, original_size) tuples."""
+        done = []
+        try:
+            while True:
+                item = self.results.get_nowait()
+                self.pending.pop(item[0], None)
+                done.append(item)
+        except queue.Empty:
+            pass
+        return done
+
+    def shutdown(self):
+        self.cancel_pending()
+        self.pool.shutdown(wait=False)
+
+
+def class_color(label, labels):
+    index = labels.index(label) if label in labels else sum(map(ord, label))
+    return CLASS_COLORS[index % len(CLASS_COLORS)]
+
+
+def show_thumbnail_grid(app, max_cached=600):
+    """
+    Grid of thumbnails of the images currently shown in the image list (same
+    filter). Only visible cells are drawn; thumbnails stream in from the
+    background loader. Each cell shows the completion state as its border, the
+    annotation boxes in their class colors, and one chip per class present.
+    Click to open an image; arrow keys and Enter navigate.
+    """
+    import tkinter as tk
+    from tkinter import ttk
+    from PIL import ImageTk
+
+    app.store_current_annotations()
+    win = tk.Toplevel(app)
+    win.title("Thumbnails")
+    win.geometry("900x650")
+    top = ttk.Frame(win, padding=5)
+    top.pack(fill=tk.X)
+    info = ttk.Label(top, text="")
+    info.pack(side=tk.LEFT)
+    boxes_var = tk.BooleanVar(value=True)
+    canvas = tk.Canvas(win, bg="#202020", highlightthickness=0, takefocus=True)
+    scrollbar = ttk.Scrollbar(win, orient="vertical")
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    canvas.pack(fill=tk.BOTH, expand=True)
+
+    loader = ThumbnailLoader(ThumbnailCache(), workers=min(8, os.cpu_count() or 2))
+    thumbs = OrderedDict()   # path -> (PIL thumbnail, original size); LRU bounded by max_cached
+    photos = {}              # path -> PhotoImage of the visible cells only
+    state = {"paths": [], "columns": 1, "top_row": 0, "selected": None, "closed": False,
+             "reveal": app.image_path}
+    cell_w = THUMB_SIZE + 2 * CELL_PAD
+    cell_h = THUMB_SIZE + 2 * CELL_PAD + CAPTION_HEIGHT
+
+    def refresh_paths():
+        app.store_current_annotations()
+        state["paths"] = [app.image_list[i] for i in app.tree.view]
+        done = sum(1 for p in state["paths"] if app.image_status.get(p, False))
+        info.config(text=f"{len(state['paths'])} images, {done} completed")
+
+    def visible_rows():
+        return max(1, canvas.winfo_height() // cell_h + 1)
+
+    def total_rows():
+        return (len(state["paths"]) + state["columns"] - 1) // state["columns"]
+
+    def draw_cell(path, x, y):
+        completed = app.image_status.get(path, False)
+        selected = path == state["selected"] or path == app.image_path
+        border = "#00bfff" if selected else ("#3cb44b" if completed else "#e6194b")
+        canvas.create_rectangle(x + 2, y + 2, x + cell_w - 2, y + cell_h - 2, outline=border,
+                                width=3 if selected else 2)
+        entry = thumbs.get(path)
+        anns = app.annotation_store.get(path, [])
+        if entry is None or entry[0] is None:
+            canvas.create_text(x + cell_w / 2, y + CELL_PAD + THUMB_SIZE / 2,
+                               text="..." if entry is None else "unreadable", fill="#888888")
+        else:
+            thumb, original_size = entry
+            photo = photos.get(path)
+            if photo is None:
+                photo = photos[path] = ImageTk.PhotoImage(thumb)
+            ox = x + CELL_PAD + (THUMB_SIZE - thumb.width) // 2
+            oy = y + CELL_PAD + (THUMB_SIZE - thumb.height) // 2
+            canvas.create_image(ox, oy, anchor=tk.NW, image=photo)
+            if boxes_var.get() and original_size:
+                scale = thumb.width / original_size[0]
+                for ann in anns[:200]:
+                    xs, ys = ann["points"][0::2], ann["points"][1::2]
+                    canvas.create_rectangle(ox + min(xs) * scale, oy + min(ys) * scale,
+                                            ox + max(xs) * scale, oy + max(ys) * scale,
+                                            outline=class_color(ann["label"], app.labels))
+        classes = sorted({ann["label"] for ann in anns}, key=lambda lab: (lab not in app.labels, lab))
+        for k, label in enumerate(classes[:8]):
+            cx = x + CELL_PAD + k * 12
+            canvas.create_rectangle(cx, y + CELL_PAD, cx + 9, y + CELL_PAD + 9,
+                                    fill=class_color(label, app.labels), outline="black")
+        name = os.path.basename(path)
+        if len(name) > 20:
+            name = name[:9] + "..." + name[-8:]
+        canvas.create_text(x + cell_w / 2, y + cell_h - CELL_PAD - CAPTION_HEIGHT / 2, text=name,
+                           fill="white", font=("Helvetica", 8))
+
+    def render(*_):
+        if state["closed"]:
+            return
+        canvas.delete("all")
+        columns = max(1, canvas.winfo_width() // cell_w)
+        state["columns"] = columns
+        rows = visible_rows()
+        if state["reveal"] in state["paths"] and canvas.winfo_width() > 1:
+            # First real layout: scroll to the image open in the main window.
+            state["top_row"] = state["paths"].index(state["reveal"]) // columns
+            state["reveal"] = None
+        state["top_row"] = max(0, min(state["top_row"], total_rows() - rows + 1))
+        first = state["top_row"] * columns
+        visible = state["paths"][first:first + rows * columns]
+        for n, path in enumerate(visible):
+            draw_cell(path, (n % columns) * cell_w, (n // columns) * cell_h)
+            if path not in thumbs:
+                loader.request(path)
+        loader.cancel_pending(keep=visible)
+        for path in [p for p in photos if p not in visible]:
+            del photos[path]
+        total = max(total_rows(), 1)
+        scrollbar.set(state["top_row"] / total, min(1.0, (state["top_row"] + rows) / total))
+
+    def poll():
+        if state["closed"]:
+            return
+        finished = loader.poll()
+        for path, thumb, original_size in finished:
+            thumbs[path] = (thumb, original_size)
+            thumbs.move_to_end(path)
+            if original_size:
+                app.image_sizes.setdefault(path, original_size)
+        while len(thumbs) > max_cached:
+            thumbs.popitem(last=False)
+        if finished:
+            render()
+        win.after(50, poll)
+
+    def scroll_rows(delta):
+        state["top_row"] = max(0, min(state["top_row"] + delta, total_rows() - 1))
+        render()
+        return "break"
+
+    def on_scrollbar(*args):
+        if args[0] == "moveto":
+            state["top_row"] = int(float(args[1]) * total_rows())
+            render()
+        elif args[0] == "scroll":
+            scroll_rows(int(args[1]) * (visible_rows() if args[2] == "pages" else 1))
+
+    def path_at(x, y):
+        col, row = int(x // cell_w), int(y // cell_h) + state["top_row"]
+        if col >= state["columns"]:
+            return None
+        index = row * state["columns"] + col
+        return state["paths"][index] if index < len(state["paths"]) else None
+
+    def open_image(path):
+        if path is not None:
+            state["selected"] = path
+            app.goto_image(path)
+            render()
+
+    def step(delta):
+        paths = state["paths"]
+        if not paths:
+            return "break"
+        current = state["selected"] if state["selected"] in paths else app.image_path
+        index = paths.index(current) if current in paths else 0
+        index = max(0, min(index + delta, len(paths) - 1))
+        state["selected"] = paths[index]
+        row = index // state["columns"]
+        if row < state["top_row"]:
+            state["top_row"] = row
+        elif row >= state["top_row"] + visible_rows() - 1:
+            state["top_row"] = row - visible_rows() + 2
+        render()
+        return "break"
+
+    def on_close():
+        state["closed"] = True
+        loader.shutdown()
+        win.destroy()
+
+    ttk.Checkbutton(top, text="Show boxes", variable=boxes_var, command=render).pack(side=tk.RIGHT)
+    ttk.Button(top, text="Refresh", command=lambda: (refresh_paths(), render())).pack(side=tk.RIGHT, padx=5)
+    scrollbar.config(command=on_scrollbar)
+    canvas.bind("<Configure>", render)
+    canvas.bind("<Button-1>", lambda e: (canvas.focus_set(), open_image(path_at(e.x, e.y))))
+    canvas.bind("<MouseWheel>", lambda e: scroll_rows(-1 if e.delta > 0 else 1))
+    canvas.bind("<Button-4>", lambda e: scroll_rows(-1))
+    canvas.bind("<Button-5>", lambda e: scroll_rows(1))
+    canvas.bind("<Left>", lambda e: step(-1))
+    canvas.bind("<Right>", lambda e: step(1))
+    canvas.bind("<Up>", lambda e: step(-state["columns"]))
+    canvas.bind("<Down>", lambda e: step(state["columns"]))
+    canvas.bind("<Return>", lambda e: open_image(state["selected"]))
+    # Annotations may have changed in the main window; redraw overlays when coming back.
+    win.bind("<FocusIn>", lambda e: (refresh_paths(), render()) if e.widget is win else None)
+    win.protocol("WM_DELETE_WINDOW", on_close)
+
+    refresh_paths()
+    canvas.focus_set()
+    poll()
+    return win
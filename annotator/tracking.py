@@ -0,0 +1,239 @@
+# annotator/tracking.py
+import os
+import queue
+import threading
+from tkinter import messagebox, simpledialog
+
+import numpy as np
+
+from .models import Annotation
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+LK_PARAMS = dict(winSize=(21, 21), maxLevel=3,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01) if cv2 else None)
+MIN_TRACKED_POINTS = 4
+
+
+def _ann_bounds(ann):
+    xs, ys = ann["points"][0::2], ann["points"][1::2]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _seed_points(gray, bounds, max_points=50):
+    """Corner features inside a box, falling back to a regular grid on flat regions."""
+    height, width = gray.shape
+    x1, y1, x2, y2 = [int(round(v)) for v in bounds]
+    x1, y1 = max(x1, 0), max(y1, 0)
+    x2, y2 = min(x2, width - 1), min(y2, height - 1)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return np.zeros((0, 2), np.float32)
+    mask = np.zeros_like(gray)
+    mask[y1:y2, x1:x2] = 255
+    corners = cv2.goodFeaturesToTrack(gray, maxCorners=max_points, qualityLevel=0.01,
+                                      minDistance=3, mask=mask)
+    if corners is not None and len(corners) >= MIN_TRACKED_POINTS:
+        return corners.reshape(-1, 2)
+    gx, gy = np.meshgrid(np.linspace(x1, x2, 6), np.linspace(y1, y2, 6))
+    return np.stack([gx.ravel(), gy.ravel()], axis=1).astype(np.float32)
+
+
+def track_annotations(prev_gray, next_gray, annotations):
+    """
+    Move annotation dicts from prev_gray to next_gray with pyramidal Lucas-Kanade
+    optical flow. Points of every annotation are tracked in one batched call,
+    filtered by forward-backward error, and each annotation is moved by the
+    median displacement and scaled by the median change in point spread.
+    Annotations whose points are lost keep their previous position.
+    """
+    seeds, owners = [], []
+    for idx, ann in enumerate(annotations):
+        pts = _seed_points(prev_gray, _ann_bounds(ann))
+        seeds.append(pts)
+        owners.append(np.full(len(pts), idx))
+    if not seeds or sum(len(p) for p in seeds) == 0:
+        return [dict(ann) for ann in annotations]
+    p0 = np.concatenate(seeds).reshape(-1, 1, 2).astype(np.float32)
+    owners = np.concatenate(owners)
+    p1, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, next_gray, p0, None, **LK_PARAMS)
+    p0r, status_back, _ = cv2.calcOpticalFlowPyrLK(next_gray, prev_gray, p1, None, **LK_PARAMS)
+    fb_error = np.linalg.norm(p0.reshape(-1, 2) - p0r.reshape(-1, 2), axis=1)
+    good = (status.ravel() == 1) & (status_back.ravel() == 1) & (fb_error < 1.0)
+    p0, p1 = p0.reshape(-1, 2), p1.reshape(-1, 2)
+
+    height, width = next_gray.shape
+    tracked = []
+    for idx, ann in enumerate(annotations):
+        sel = good & (owners == idx)
+        new_ann = dict(ann, attributes=dict(ann.get("attributes", {})))
+        if sel.sum() < MIN_TRACKED_POINTS:
+            tracked.append(new_ann)
+            continue
+        a, b = p0[sel], p1[sel]
+        shift = np.median(b - a, axis=0)
+        spread_a = np.linalg.norm(a - a.mean(axis=0), axis=1)
+        spread_b = np.linalg.norm(b - b.mean(axis=0), axis=1)
+        valid = spread_a > 1e-3
+        scale = float(np.median(spread_b[valid] / spread_a[valid])) if valid.any() else 1.0
+        scale = float(np.clip(scale, 0.8, 1.25))
+        x1, y1, x2, y2 = _ann_bounds(ann)
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        pts = np.asarray(ann["points"], dtype=np.float64).reshape(-1, 2)
+        pts = (pts - [cx, cy]) * scale + [cx, cy] + shift
+        pts[:, 0] = np.clip(pts[:, 0], 0, width - 1)
+        pts[:, 1] = np.clip(pts[:, 1], 0, height - 1)
+        new_ann["points"] = [float(v) for v in pts.ravel()]
+        tracked.append(new_ann)
+    return tracked
+
+
+def reanchor_annotations(annotations, boxes, labels, iou_threshold=0.3):
+    """Snap tracked boxes onto detector boxes of the same label to remove accumulated drift."""
+    from .geometry import box_iou
+
+    if len(boxes) == 0:
+        return annotations
+    bbox_idx = [i for i, ann in enumerate(annotations) if ann["type"] == "bbox"]
+    if not bbox_idx:
+        return annotations
+    tracked = np.array([_ann_bounds(annotations[i]) for i in bbox_idx], dtype=np.float64)
+    iou = box_iou(tracked, boxes)
+    iou[np.array([annotations[i]["label"] for i in bbox_idx])[:, None] != np.asarray(labels)[None, :]] = 0
+    taken = set()
+    for row in np.argsort(-iou.max(axis=1)):
+        col = int(np.argmax(iou[row]))
+        if iou[row, col] >= iou_threshold and col not in taken:
+            taken.add(col)
+            annotations[bbox_idx[row]]["points"] = [float(v) for v in boxes[col]]
+    return annotations
+
+
+def propagate(frame_paths, annotations, reanchor_every=0, detector=None,
+              progress_callback=None, cancel_event=None):
+    """
+    Carry annotations from frame_paths[0] forward through the remaining frames.
+    detector, if given, is a callable(bgr_image) -> (boxes, labels) used to
+    re-anchor boxes every reanchor_every frames. Yields (frame_path, annotations).
+    """
+    prev_gray = cv2.imread(frame_paths[0], cv2.IMREAD_GRAYSCALE)
+    if prev_gray is None:
+        return
+    current = [dict(ann) for ann in annotations]
+    for step, path in enumerate(frame_paths[1:], start=1):
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        frame = cv2.imread(path)
+        if frame is None:
+            return
+        next_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        current = track_annotations(prev_gray, next_gray, current)
+        if detector is not None and reanchor_every and step % reanchor_every == 0:
+            boxes, labels = detector(frame)
+            current = reanchor_annotations(current, boxes, labels)
+        yield path, current
+        prev_gray = next_gray
+        if progress_callback is not None:
+            progress_callback(step, len(frame_paths) - 1)
+
+
+def propagate_to_next_frames(app):
+    """Propagate the current frame's annotations to the following frames of the sequence."""
+    if cv2 is None:
+        messagebox.showerror("Error", "OpenCV is not installed. Tracking is unavailable.")
+        return
+    if not app.image_path or not app.annotations:
+        messagebox.showerror("Error", "Annotate the current frame before propagating.")
+        return
+    remaining = len(app.image_list) - 1 - app.current_image_index
+    if remaining <= 0:
+        messagebox.showinfo("Info", "Last image reached.")
+        return
+    num_frames = simpledialog.askinteger("Propagate", "Number of following frames to propagate to",
+                                         initialvalue=min(10, remaining), minvalue=1, maxvalue=remaining)
+    if num_frames is None:
+        return
+    reanchor_every = simpledialog.askinteger(
+        "Propagate", "Re-anchor with the pre-label model every K frames (0 = never)",
+        initialvalue=0, minvalue=0, maxvalue=num_frames)
+    if reanchor_every is None:
+        return
+
+    start = app.current_image_index
+    frame_paths = app.image_list[start:start + num_frames + 1]
+    targets = frame_paths[1:]
+    if any(app.annotation_store.get(p) for p in targets):
+        if not messagebox.askyesno("Propagate", "Some of the following frames already have annotations.\n"
+                                                "Replace them with the propagated ones?"):
+            return
+
+    detector = None
+    if reanchor_every:
+        from .ai_tools import _load_prelabel_model
+        from .inference import get_yolo, model_registry, _label_for
+        if get_yolo() is None:
+            messagebox.showerror("Error", "Ultralytics package not installed!\nPlease run: pip install ultralytics")
+            return
+        model = _load_prelabel_model(app)
+
+        def _detect(frame):
+            with model_registry.call_lock(model):
+                result = model(frame, verbose=False)[0]
+            boxes = result.boxes.xyxy.cpu().numpy()
+            labels = [_label_for(model, int(c)) for c in result.boxes.cls.cpu().numpy()]
+            return boxes, labels
+
+        detector = _detect
+
+    app.store_current_annotations()
+    start_annotations = app.annotation_store[app.image_path]
+    events = queue.Queue()
+    cancel_event = threading.Event()
+
+    def worker():
+        try:
+            for path, anns in propagate(frame_paths, start_annotations, reanchor_every, detector,
+                                        cancel_event=cancel_event):
+                events.put(("frame", (path, anns)))
+            events.put(("done", None))
+        except Exception as e:
+            events.put(("error", e))
+
+    threading.Thread(target=worker, daemon=True).start()
+    # Esc stops the propagation; the application's own Esc binding (if any) comes back afterwards.
+    previous_escape = app.bind("<Escape>")
+    app.bind("<Escape>", lambda event: cancel_event.set())
+
+    def poll():
+        try:
+            while True:
+                kind, payload = events.get_nowait()
+                if kind == "frame":
+                    path, anns = payload
+                    app.annotation_store[path] = anns
+                    if path == app.image_path:
+                        # The frame on screen: store_current_annotations would overwrite the store with
+                        # the canvas, so the canvas is updated from the store instead.
+                        app.annotations = [Annotation.from_dict(d) for d in anns]
+                        app.selected_annotation = None
+                        app.redraw_canvas()
+                    app.system_message_label.config(
+                        text=f"Propagating... {os.path.basename(path)}\n(Esc to stop)")
+                else:
+                    if previous_escape:
+                        app.bind("<Escape>", previous_escape)
+                    else:
+                        app.unbind("<Escape>")
+                    if kind == "error":
+                        messagebox.showerror("Error", f"Propagation failed:\n{payload}")
+                    else:
+                        app.system_message_label.config(text="Propagation complete.")
+                        app.after(3000, lambda: app.system_message_label.config(text=""))
+                    return
+        except queue.Empty:
+            pass
+        app.after(100, poll)
+
+    poll()
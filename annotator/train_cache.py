@@ -0,0 +1,288 @@
+# annotator/train_cache.py
+"""
+Pre-resized copy of a YOLO dataset for training.
+
+Ultralytics decodes every training image in every epoch and then shrinks it
+to imgsz; for large photos the decode dominates the epoch time on CPU. This
+writes each image once, already at the size training uses (long side imgsz,
+rounded the way ultralytics' load_image rounds, so it does no further
+resize), as JPEG or WebP, and a dataset.yaml that points at the copy:
+
+    <cache_dir>/images/<split>/<name>.jpg
+    <cache_dir>/labels/<split>/<name>.txt
+    <cache_dir>/dataset.yaml
+
+JPEGs are decoded in draft mode (directly at 1/2 to 1/8 scale). Images that
+are already small enough are linked, not re-encoded. The EXIF orientation is
+applied before saving, as ultralytics does when it reads the original.
+YOLO labels are normalized to the image size, so they stay valid when the
+image is scaled and are linked unchanged; with letterbox=True the images are
+padded to imgsz x imgsz and the labels are rewritten for the padding.
+
+A manifest keyed by the source files' modification time and size makes a
+second run (e.g. the next training with the same dataset and imgsz) reuse
+everything that did not change, and removes files of images that are gone.
+"""
+import hashlib
+import json
+import math
+import os
+
+from .dataset_tools import SPLITS, _place_file
+from .file_index import IMAGE_EXTENSIONS
+
+MANIFEST_NAME = ".train_cache.json"
+MANIFEST_VERSION = 1
+FORMATS = {"jpeg": (".jpg", "JPEG", {"quality": 95}), "webp": (".webp", "WEBP", {"quality": 90, "method": 4})}
+LETTERBOX_COLOR = (114, 114, 114)  # the padding ultralytics uses
+
+
+def _default_cache_dir():
+    return os.path.join(os.path.expanduser("~"), ".cache", "annotator", "training")
+
+
+def read_dataset_yaml(yaml_path):
+    """The dataset.yaml as a dict, with 'path' made absolute (relative to the yaml's folder)."""
+    import yaml  # PyYAML comes with ultralytics
+
+    with open(yaml_path) as f:
+        data = yaml.safe_load(f) or {}
+    root = data.get("path") or os.path.dirname(os.path.abspath(yaml_path))
+    if not os.path.isabs(root):
+        root = os.path.join(os.path.dirname(os.path.abspath(yaml_path)), root)
+    data["path"] = os.path.normpath(root)
+    return data
+
+
+def split_images(root, entry):
+    """Image paths of one split entry: a folder, a .txt list of images, or a list of those."""
+    from .file_index import scan_images
+
+    paths = []
+    for item in entry if isinstance(entry, (list, tuple)) else [entry]:
+        item = os.path.join(root, str(item))
+        if os.path.isdir(item):
+            paths.extend(scan_images(item))
+        elif item.endswith(".txt") and os.path.isfile(item):
+            with open(item) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        # Ultralytics resolves ./ entries against the dataset root.
+                        paths.append(os.path.join(root, line[2:]) if line.startswith("./") else line)
+        elif os.path.splitext(item)[1].lower() in IMAGE_EXTENSIONS and os.path.isfile(item):
+            paths.append(item)
+    return paths
+
+
+def label_path_for(image_path):
+    """The label file ultralytics reads for an image: the last /images/ of the path replaced by /labels/."""
+    sep_images, sep_labels = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+    head, found, tail = image_path.rpartition(sep_images)
+    path = head + sep_labels + tail if found else image_path
+    return os.path.splitext(path)[0] + ".txt"
+
+
+def target_size(width, height, imgsz):
+    """The size ultralytics resizes an image to for training: long side imgsz, aspect ratio kept."""
+    r = imgsz / max(width, height)
+    return min(math.ceil(width * r), imgsz), min(math.ceil(height * r), imgsz)
+
+
+def letterbox_label_lines(lines, size, imgsz):
+    """Rewrite normalized box (class x y w h) and segment (class x1 y1 x2 y2 ...) lines for an image
+    of the given size centred on an imgsz x imgsz canvas."""
+    width, height = size
+    pad_x, pad_y = (imgsz - width) // 2, (imgsz - height) // 2
+    sx, sy = width / imgsz, height / imgsz
+    out = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 5:
+            continue
+        values = [float(v) for v in parts[1:]]
+        if len(values) == 4:
+            x, y, w, h = values
+            values = [x * sx + pad_x / imgsz, y * sy + pad_y / imgsz, w * sx, h * sy]
+        else:
+            values = [v * sx + pad_x / imgsz if i % 2 == 0 else v * sy + pad_y / imgsz
+                      for i, v in enumerate(values[:len(values) // 2 * 2])]
+        out.append(parts[0] + "".join(f" {v:.6f}" for v in values))
+    return out
+
+
+def _file_key(path):
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}|{st.st_size}"
+
+
+def _prepare_job(job):
+    """Worker: write the resized (or linked) image and its label file. Returns (job, image name, label name);
+    the image name is None when the source could not be read."""
+    from PIL import Image, ImageOps
+
+    src, label_src, dst_stem, imgsz, fmt, letterbox = job[:6]
+    ext, pil_format, save_args = FORMATS[fmt]
+    try:
+        with Image.open(src) as img:
+            orientation = img.getexif().get(0x0112, 1)
+            width, height = img.size
+            new_size = target_size(width, height, imgsz)
+            if new_size[0] >= width and not letterbox and orientation == 1:
+                # Already small enough: ultralytics would not shrink it either.
+                dst = dst_stem + os.path.splitext(src)[1].lower()
+                _place_file(src, dst, "hardlink")
+                size = (width, height)
+            else:
+                if new_size[0] < width:
+                    img.draft("RGB", new_size)
+                image = ImageOps.exif_transpose(img.convert("RGB") if img.mode != "RGB" else img)
+                size = target_size(image.width, image.height, imgsz) if new_size[0] < width else image.size
+                if size != image.size:
+                    image = image.resize(size, Image.BICUBIC, reducing_gap=2.0)
+                if letterbox:
+                    canvas = Image.new("RGB", (imgsz, imgsz), LETTERBOX_COLOR)
+                    canvas.paste(image, ((imgsz - size[0]) // 2, (imgsz - size[1]) // 2))
+                    image = canvas
+                dst = dst_stem + ext
+                tmp_path = f"{dst}.{os.getpid()}.tmp"
+                image.save(tmp_path, pil_format, **save_args)
+                os.replace(tmp_path, dst)
+    except OSError:
+        return job, None, None
+    label_dst = None
+    if label_src is not None:
+        label_dst = job[6]
+        if letterbox:
+            with open(label_src) as f:
+                lines = letterbox_label_lines(f.read().splitlines(), size, imgsz)
+            with open(label_dst, "w") as f:
+                f.write("\n".join(lines) + ("\n" if lines else ""))
+        else:
+            _place_file(label_src, label_dst, "hardlink")
+    return job, os.path.basename(dst), label_dst and os.path.basename(label_dst)
+
+
+def _output_stems(paths):
+    """Output file stem of every image of a split; same-named images from different folders get a folder hash."""
+    stems, used = {}, set()
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if stem in used:
+            folder = os.path.dirname(os.path.abspath(path))
+            stem = f"{stem}_{hashlib.md5(folder.encode('utf-8')).hexdigest()[:8]}"
+        used.add(stem)
+        stems[path] = stem
+    return stems
+
+
+def cache_dir_for(yaml_path, imgsz, fmt="jpeg", letterbox=False):
+    """The default cache folder of a dataset and settings: one per dataset.yaml, imgsz and format."""
+    digest = hashlib.md5(os.path.abspath(yaml_path).encode("utf-8")).hexdigest()[:12]
+    name = f"{os.path.splitext(os.path.basename(yaml_path))[0]}_{digest}_{imgsz}_{fmt}"
+    return os.path.join(_default_cache_dir(), name + ("_letterbox" if letterbox else ""))
+
+
+def prepare_training_cache(yaml_path, imgsz, fmt="jpeg", letterbox=False, cache_dir=None, workers=1, force=False,
+                           progress_callback=None):
+    """
+    Write the pre-resized copy of the dataset of yaml_path (see the module
+    docstring) with `workers` threads. Unless force, images and labels whose
+    source did not change since the last run are reused. Returns a summary
+    dict; its "yaml" is the dataset.yaml to train with.
+    """
+    import yaml
+
+    from .batch import parallel_map
+
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown image format {fmt!r}; use one of {', '.join(FORMATS)}")
+    data = read_dataset_yaml(yaml_path)
+    cache_dir = cache_dir or cache_dir_for(yaml_path, imgsz, fmt, letterbox)
+    settings = {"imgsz": imgsz, "format": fmt, "letterbox": letterbox}
+
+    manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+    manifest = {}
+    if os.path.isfile(manifest_path):
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+    # Files of the last run are cleaned up below even when they cannot be reused.
+    written_before = manifest.get("images", {}) if manifest.get("version") == MANIFEST_VERSION else {}
+    previous = written_before if manifest.get("settings") == settings and not force else {}
+
+    entries, jobs, missing, reused = {}, [], [], 0
+    splits = [split for split in SPLITS if data.get(split)]
+    for split in splits:
+        image_dir = os.path.join(cache_dir, "images", split)
+        label_dir = os.path.join(cache_dir, "labels", split)
+        os.makedirs(image_dir, exist_ok=True)
+        os.makedirs(label_dir, exist_ok=True)
+        paths = split_images(data["path"], data[split])
+        stems = _output_stems(paths)
+        for path in paths:
+            label_src = label_path_for(path)
+            try:
+                key = _file_key(path)
+                label_key = _file_key(label_src) if os.path.isfile(label_src) else None
+            except OSError:
+                missing.append(path)
+                continue
+            entry_id = f"{split}|{os.path.abspath(path)}"
+            old = previous.get(entry_id)
+            if (old is not None and old["key"] == key and old["label_key"] == label_key
+                    and os.path.exists(os.path.join(image_dir, old["image"]))
+                    and (old["label"] is None or os.path.exists(os.path.join(label_dir, old["label"])))):
+                entries[entry_id] = old
+                reused += 1
+                continue
+            entries[entry_id] = {"key": key, "label_key": label_key, "split": split}
+            jobs.append((path, label_src if label_key else None, os.path.join(image_dir, stems[path]), imgsz, fmt,
+                         letterbox, os.path.join(label_dir, stems[path] + ".txt"), entry_id))
+
+    written = 0
+    for job, image_name, label_name in parallel_map(_prepare_job, jobs, workers, progress_callback):
+        if image_name is None:
+            missing.append(job[0])
+            del entries[job[7]]
+        else:
+            entries[job[7]].update(image=image_name, label=label_name)
+            written += 1
+
+    # Files of images that were removed from the dataset, renamed, or written with other settings.
+    kept = {(e["split"], "images", e["image"]) for e in entries.values()}
+    kept |= {(e["split"], "labels", e["label"]) for e in entries.values() if e["label"]}
+    removed = 0
+    for entry in written_before.values():
+        for kind, name in (("images", entry.get("image")), ("labels", entry.get("label"))):
+            if name and (entry["split"], kind, name) not in kept:
+                try:
+                    os.remove(os.path.join(cache_dir, kind, entry["split"], name))
+                    removed += 1
+                except OSError:
+                    pass
+
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "source": os.path.abspath(yaml_path), "settings": settings,
+                   "images": entries}, f)
+    os.replace(tmp_path, manifest_path)
+
+    cached = {key: value for key, value in data.items() if key not in SPLITS}
+    cached["path"] = os.path.abspath(cache_dir)
+    cached.update({split: f"images/{split}" for split in splits})
+    cached_yaml = os.path.join(cache_dir, "dataset.yaml")
+    with open(cached_yaml, "w") as f:
+        yaml.safe_dump(cached, f, sort_keys=False, allow_unicode=True)
+    return {"yaml": cached_yaml, "cache_dir": cache_dir, "written": written, "reused": reused, "removed": removed,
+            "missing": missing}
+
+
+def format_summary(summary):
+    lines = [f"Training images cached in {summary['cache_dir']}",
+             f"Written: {summary['written']}, unchanged (reused): {summary['reused']}"]
+    if summary["missing"]:
+        lines.append(f"Unreadable or missing images: {len(summary['missing'])}")
+    return "\n".join(lines)
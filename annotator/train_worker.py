@@ -0,0 +1,120 @@
+# annotator/train_worker.py
+"""
+Training entry point run in a child process by annotator.training.TrainingRunner.
+
+Usage: python -m annotator.train_worker <config.json>
+
+Ordinary ultralytics output is passed through unchanged. Structured events are
+written to stdout as single lines prefixed with METRICS_PREFIX followed by JSON.
+
+With "image_cache" in the config ({"format": "jpeg" or "webp", "letterbox":
+bool}) the dataset is first copied at the training size (see train_cache.py)
+and training reads the copy.
+"""
+import json
+import os
+import sys
+import time
+
+METRICS_PREFIX = "@@annotator-train "
+
+
+def emit(event, **payload):
+    payload["event"] = event
+    sys.stdout.write(METRICS_PREFIX + json.dumps(payload) + "\n")
+    sys.stdout.flush()
+
+
+def _float_dict(d):
+    out = {}
+    for key, value in (d or {}).items():
+        try:
+            out[key] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return out
+
+
+def prepare_images(train_args, options):
+    """Write (or reuse) the pre-resized copy of the dataset; returns the dataset.yaml to train with."""
+    from .train_cache import format_summary, prepare_training_cache
+
+    last = {"t": 0.0}
+
+    def progress(done, total):
+        now = time.perf_counter()
+        if done == total or now - last["t"] >= 1.0:
+            last["t"] = now
+            print(f"Preparing training images: {done}/{total}", flush=True)
+
+    summary = prepare_training_cache(train_args["data"], train_args.get("imgsz", 640),
+                                     options.get("format", "jpeg"), options.get("letterbox", False),
+                                     workers=os.cpu_count() or 1, progress_callback=progress)
+    print(format_summary(summary), flush=True)
+    emit("prepared", yaml=summary["yaml"], written=summary["written"], reused=summary["reused"])
+    return summary["yaml"]
+
+
+def run(config):
+    from ultralytics import YOLO
+
+    epoch_start = {"t": time.perf_counter()}
+
+    def on_train_epoch_start(trainer):
+        epoch_start["t"] = time.perf_counter()
+
+    def on_fit_epoch_end(trainer):
+        epoch_time = time.perf_counter() - epoch_start["t"]
+        try:
+            num_images = len(trainer.train_loader.dataset)
+        except Exception:
+            num_images = 0
+        losses = _float_dict(trainer.label_loss_items(trainer.tloss, prefix="train"))
+        metrics = _float_dict(trainer.metrics)
+        emit("epoch",
+             epoch=trainer.epoch + 1,
+             epochs=trainer.epochs,
+             losses=losses,
+             loss=sum(losses.values()),
+             map50=metrics.get("metrics/mAP50(B)"),
+             map50_95=metrics.get("metrics/mAP50-95(B)"),
+             metrics=metrics,
+             epoch_time=epoch_time,
+             images_per_sec=num_images / epoch_time if epoch_time > 0 else 0.0,
+             last=str(trainer.last))
+
+    def on_train_end(trainer):
+        emit("end", best=str(trainer.best), last=str(trainer.last), save_dir=str(trainer.save_dir))
+
+    resume = config.get("resume")
+    model = YOLO(resume or config.get("model", "yolo11s.yaml"))
+    model.add_callback("on_train_epoch_start", on_train_epoch_start)
+    model.add_callback("on_fit_epoch_end", on_fit_epoch_end)
+    model.add_callback("on_train_end", on_train_end)
+    emit("start", resume=resume)
+    if resume:
+        model.train(resume=True)
+    else:
+        train_args = dict(config["train_args"])
+        if config.get("image_cache"):
+            train_args["data"] = prepare_images(train_args, config["image_cache"])
+        model.train(**train_args)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    with open(argv[0]) as f:
+        config = json.load(f)
+    try:
+        run(config)
+    except KeyboardInterrupt:
+        emit("cancelled")
+        return 1
+    except Exception as e:
+        emit("error", message=str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+# annotator/training.py
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import deque
+
+from .train_worker import METRICS_PREFIX
+
+
+class TrainingRunner:
+    """
+    Runs YOLO training in a child process (annotator.train_worker) so that its
+    output never touches this process' stdout/stderr. Per-epoch metrics arrive as
+    structured events; plain log output is kept in a bounded buffer.
+
+    config is a dict with either "train_args" (keyword arguments for model.train,
+    plus an optional "model" to build from) or "resume" (path to a last.pt).
+    """
+
+    def __init__(self, config, max_log_lines=2000):
+        self.config = config
+        self.log = deque(maxlen=max_log_lines)
+        self.epochs = []  # one metrics dict per finished epoch
+        self.last_weights = config.get("resume")
+        self.best_weights = None
+        self.cancelled = False
+        self.error = None
+        self._events = queue.Queue()
+        self._process = None
+        self._config_file = None
+
+    def start(self):
+        fd, self._config_file = tempfile.mkstemp(prefix="annotator_train_", suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.config, f)
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (package_root, env.get("PYTHONPATH")) if p)
+        kwargs = {}
+        if os.name == "posix":
+            kwargs["start_new_session"] = True
+        else:
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "annotator.train_worker", self._config_file],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+            text=True, bufsize=1, env=env, **kwargs)
+        threading.Thread(target=self._read_output, daemon=True).start()
+
+    def _read_output(self):
+        # Text mode uses universal newlines, so tqdm's carriage-return updates
+        # arrive as separate lines.
+        for line in self._process.stdout:
+            line = line.rstrip("\n")
+            if line.startswith(METRICS_PREFIX):
+                try:
+                    self._events.put(("event", json.loads(line[len(METRICS_PREFIX):])))
+                    continue
+                except ValueError:
+                    pass
+            if line.strip():
+                self._events.put(("log", line))
+        self._process.wait()
+        self._events.put(("exit", self._process.returncode))
+
+    def poll(self):
+        """
+        Drain pending output. Returns (new_log_lines, new_epoch_metrics, finished)
+        and updates the runner state; call this periodically from the GUI thread.
+        """
+        new_lines, new_epochs, finished = [], [], False
+        try:
+            while True:
+                kind, payload = self._events.get_nowait()
+                if kind == "log":
+                    self.log.append(payload)
+                    new_lines.append(payload)
+                elif kind == "exit":
+                    finished = True
+                    self._cleanup()
+                    # A crash, out-of-memory kill or signal ends the worker without an error event.
+                    if payload != 0 and self.error is None and not self.cancelled:
+                        self.error = f"worker exited with code {payload}"
+                else:
+                    event = payload.get("event")
+                    if event == "epoch":
+                        self.epochs.append(payload)
+                        new_epochs.append(payload)
+                        self.last_weights = payload.get("last") or self.last_weights
+                    elif event == "end":
+                        self.best_weights = payload.get("best")
+                        self.last_weights = payload.get("last") or self.last_weights
+                    elif event == "error":
+                        self.error = payload.get("message")
+        except queue.Empty:
+            pass
+        if len(new_lines) > self.log.maxlen:
+            new_lines = new_lines[-self.log.maxlen:]
+        return new_lines, new_epochs, finished
+
+    def is_running(self):
+        return self._process is not None and self._process.poll() is None
+
+    def cancel(self):
+        """Stop training. Ultralytics saves last.pt every epoch, so the run can be resumed."""
+        if not self.is_running():
+            return
+        self.cancelled = True
+        try:
+            if os.name == "posix":
+                os.killpg(self._process.pid, signal.SIGINT)
+            else:
+                self._process.send_signal(signal.CTRL_BREAK_EVENT)
+        except (OSError, ValueError):
+            self._process.terminate()
+        timer = threading.Timer(10.0, self._kill_if_running)
+        timer.daemon = True  # closing the app must not wait for it
+        timer.start()
+
+    def _kill_if_running(self):
+        if self.is_running():
+            self._process.kill()
+
+    def can_resume(self):
+        return bool(self.last_weights) and os.path.isfile(self.last_weights)
+
+    def resume_runner(self):
+        """Return a new runner that resumes this run from its last checkpoint."""
+        return TrainingRunner({"resume": self.last_weights}, max_log_lines=self.log.maxlen)
+
+    def _cleanup(self):
+        if self._config_file and os.path.exists(self._config_file):
+            os.remove(self._config_file)
+        self._config_file = None
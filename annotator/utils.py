@@ -1,17 +1,49 @@
 # annotator/utils.py
+import os
+
+from PIL import Image
+
+
 def point_in_polygon(x, y, poly_points):
     """
     Determine if point (x, y) is inside the polygon defined by poly_points.
     poly_points: list of (x, y) tuples.
-    Returns True if inside, False otherwise.
+    Returns True if inside, False otherwise. For many points or polygons use
+    geometry.points_in_polygons.
     """
-    inside = False
-    n = len(poly_points)
-    j = n - 1
-    for i in range(n):
-        xi, yi = poly_points[i]
-        xj, yj = poly_points[j]
-        if ((yi > y) != (yj > y)) and (x < (xj - xi) * (y - yi) / (yj - yi + 1e-10) + xi):
-            inside = not inside
-        j = i
-    return inside
+    from .geometry import point_in_polygon as _point_in_polygon
+    return _point_in_polygon(x, y, poly_points)
+
+
+def get_image_size(image_path):
+    """
+    Return (width, height) of an image file. Only the header is read, so this is
+    cheap even for very large images.
+    """
+    with Image.open(image_path) as img:
+        return img.size
+
+
+def extract_video_frames(video_path, out_dir, progress_callback=None):
+    """
+    Decode a video and write every frame to out_dir as frame_<n>.png.
+    Frames are written as they are decoded instead of being collected first,
+    so memory stays flat for long videos. Returns the list of frame paths.
+    """
+    import cv2
+    os.makedirs(out_dir, exist_ok=True)
+    cap = cv2.VideoCapture(video_path)
+    frame_paths = []
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_path = os.path.join(out_dir, f"frame_{len(frame_paths)}.png")
+            Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).save(frame_path)
+            frame_paths.append(frame_path)
+            if progress_callback is not None:
+                progress_callback(len(frame_paths))
+    finally:
+        cap.release()
+    return frame_paths
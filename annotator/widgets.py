@@ -0,0 +1,158 @@
+# annotator/widgets.py
+import os
+import tkinter as tk
+from tkinter import ttk
+
+ROW_HEIGHT = 20
+HEADER_HEIGHT = 24
+
+
+class VirtualImageList(ttk.Frame):
+    """
+    Image list that only creates Treeview rows for the visible window.
+
+    The full list lives in memory as a list of paths; a filtered view is a list
+    of indices into it. Scrolling, filtering and status changes re-render the
+    handful of visible rows instead of touching one row per image, so lists of
+    hundreds of thousands of images populate and select instantly.
+
+    tag_for(index) returns the row tag ("completed" / "incomplete") of an image;
+    on_select(index) is called when the user picks an image.
+    """
+
+    def __init__(self, master, tag_for, on_select, heading="Image Files", width=280, **kwargs):
+        super().__init__(master, **kwargs)
+        self.tag_for = tag_for
+        self.on_select = on_select
+        self.paths = []
+        self.view = []          # indices into self.paths that pass the filter
+        self.view_pos = {}      # image index -> position in self.view
+        self.top = 0            # position in self.view of the first visible row
+        self.visible_rows = 25
+        self.selected = None
+
+        style = ttk.Style(self)
+        style.configure("ImageList.Treeview", rowheight=ROW_HEIGHT)
+        self.tree = ttk.Treeview(self, columns=("Filename",), show="headings", selectmode="browse",
+                                 style="ImageList.Treeview", height=self.visible_rows)
+        self.tree.heading("Filename", text=heading)
+        self.tree.column("Filename", width=width)
+        self.tree.tag_configure("incomplete", background="light coral")
+        self.tree.tag_configure("completed", background="light green")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Up>", lambda e: self._step(-1))
+        self.tree.bind("<Down>", lambda e: self._step(1))
+        self.tree.bind("<Prior>", lambda e: self._step(-self.visible_rows))
+        self.tree.bind("<Next>", lambda e: self._step(self.visible_rows))
+
+    def set_items(self, paths, predicate=None):
+        """Replace the list contents; rows are not created until they are visible."""
+        self.paths = list(paths)
+        self.selected = None
+        self.top = 0
+        self.set_filter(predicate)
+
+    def set_filter(self, predicate=None):
+        """Show only images whose index passes predicate(index); None shows everything."""
+        if predicate is None:
+            self.view = list(range(len(self.paths)))
+        else:
+            self.view = [i for i in range(len(self.paths)) if predicate(i)]
+        self.view_pos = {idx: pos for pos, idx in enumerate(self.view)} if predicate is not None else {}
+        self.top = 0
+        if self.selected is not None:
+            self.see(self.selected)
+        self.render()
+
+    def _position(self, index):
+        if not self.view_pos and len(self.view) == len(self.paths):
+            return index if 0 <= index < len(self.paths) else None
+        return self.view_pos.get(index)
+
+    def render(self):
+        """Recreate the rows of the visible window only."""
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        end = min(self.top + self.visible_rows, len(self.view))
+        for pos in range(self.top, end):
+            idx = self.view[pos]
+            self.tree.insert("", "end", iid=str(idx), values=(os.path.basename(self.paths[idx]),),
+                             tags=(self.tag_for(idx),))
+        if self.selected is not None and self.tree.exists(str(self.selected)):
+            self.tree.selection_set(str(self.selected))
+            self.tree.focus(str(self.selected))
+        total = max(len(self.view), 1)
+        self.scrollbar.set(self.top / total, end / total if self.view else 1.0)
+
+    def refresh_row(self, index):
+        """Update the tag of one image if its row is currently visible."""
+        if self.tree.exists(str(index)):
+            self.tree.item(str(index), tags=(self.tag_for(index),))
+
+    def select(self, index):
+        """Select and reveal an image without calling on_select."""
+        self.selected = index
+        self.see(index)
+
+    def see(self, index):
+        pos = self._position(index)
+        if pos is None:
+            self.render()
+            return
+        if pos < self.top:
+            self.top = pos
+        elif pos >= self.top + self.visible_rows:
+            self.top = pos - self.visible_rows + 1
+        self.render()
+
+    def scroll(self, rows):
+        self._scroll_to(self.top + rows)
+        return "break"
+
+    def _scroll_to(self, top):
+        top = max(0, min(int(top), len(self.view) - self.visible_rows))
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self._scroll_to(float(args[1]) * len(self.view))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            self.scroll(amount * (self.visible_rows if args[2] == "pages" else 1))
+
+    def _on_configure(self, event):
+        rows = max(1, (event.height - HEADER_HEIGHT) // ROW_HEIGHT)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.render()
+
+    def _on_tree_select(self, event):
+        sel = self.tree.selection()
+        if not sel:
+            return
+        idx = int(sel[0])
+        if idx != self.selected:
+            self.selected = idx
+            self.on_select(idx)
+
+    def _step(self, delta):
+        if not self.view:
+            return "break"
+        pos = self._position(self.selected) if self.selected is not None else None
+        pos = 0 if pos is None else max(0, min(pos + delta, len(self.view) - 1))
+        idx = self.view[pos]
+        if idx != self.selected:
+            self.select(idx)
+            self.on_select(idx)
+        return "break"
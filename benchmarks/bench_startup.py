@@ -0,0 +1,113 @@
+"""
+Startup-time benchmark for the annotator.
+
+Measures, in fresh interpreters, how long importing the GUI module takes and
+which heavy dependencies it pulls in. It then measures the cost of those
+dependencies on their own, which is what startup would pay if they were
+imported eagerly.
+
+    python benchmarks/bench_startup.py                 # report
+    python benchmarks/bench_startup.py --max-seconds 1 # fail on regression
+    python benchmarks/bench_startup.py --window        # also build the Tk window (needs a display)
+
+Exits with status 1 when a heavy module is imported at startup or when the
+median import time exceeds --max-seconds.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("torch", "ultralytics", "cv2", "numpy")
+
+IMPORT_SNIPPET = """
+import json, sys, time
+t = time.perf_counter()
+from annotator import ImageVideoAnnotator
+elapsed = time.perf_counter() - t
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+WINDOW_SNIPPET = """
+import json, time
+t = time.perf_counter()
+from annotator import ImageVideoAnnotator
+app = ImageVideoAnnotator()
+app.update()
+elapsed = time.perf_counter() - t
+app.destroy()
+print(json.dumps({"seconds": elapsed}))
+"""
+
+MODULE_SNIPPET = """
+import importlib, json, time
+t = time.perf_counter()
+try:
+    importlib.import_module(%r)
+    ok = True
+except ImportError:
+    ok = False
+print(json.dumps({"seconds": time.perf_counter() - t, "available": ok}))
+"""
+
+
+def run_snippet(code):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in (REPO_ROOT, os.environ.get("PYTHONPATH")) if p))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=REPO_ROOT)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip())
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--max-seconds", type=float, default=None, help="fail if median import time is above this")
+    parser.add_argument("--window", action="store_true", help="also time building the main window")
+    parser.add_argument("--json", dest="json_path", help="write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    runs = [run_snippet(IMPORT_SNIPPET) for _ in range(args.repeat)]
+    report = {
+        "python": sys.version.split()[0],
+        "import_seconds": {
+            "median": statistics.median(r["seconds"] for r in runs),
+            "min": min(r["seconds"] for r in runs),
+            "max": max(r["seconds"] for r in runs),
+        },
+        "heavy_modules_loaded": sorted(set(m for r in runs for m in r["loaded"])),
+        "deferred_module_seconds": {},
+    }
+    for module in HEAVY_MODULES:
+        result = run_snippet(MODULE_SNIPPET % module)
+        if result["available"]:
+            report["deferred_module_seconds"][module] = result["seconds"]
+    if args.window:
+        window_runs = [run_snippet(WINDOW_SNIPPET) for _ in range(args.repeat)]
+        report["window_seconds"] = {"median": statistics.median(r["seconds"] for r in window_runs)}
+
+    print(f"import annotator GUI: median {report['import_seconds']['median'] * 1000:.1f} ms "
+          f"(min {report['import_seconds']['min'] * 1000:.1f}, max {report['import_seconds']['max'] * 1000:.1f})")
+    if "window_seconds" in report:
+        print(f"main window ready:    median {report['window_seconds']['median'] * 1000:.1f} ms")
+    for module, seconds in report["deferred_module_seconds"].items():
+        print(f"deferred until first use: {module:<12} {seconds * 1000:8.1f} ms")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    if report["heavy_modules_loaded"]:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(report['heavy_modules_loaded'])}")
+        failed = True
+    if args.max_seconds is not None and report["import_seconds"]["median"] > args.max_seconds:
+        print(f"FAIL: median import time above {args.max_seconds:.3f} s")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,401 @@
+"""
+Benchmark suite for the annotator's hot paths.
+
+Uses synthetic images, annotation sets and a synthetic video written to a
+temporary folder, and writes a machine-readable JSON report:
+
+    python benchmarks/run_benchmarks.py --json report.json
+    python benchmarks/run_benchmarks.py --quick --only redraw,undo
+
+Cases that drive the Tk window (redraw, hit-test, undo, export) need a
+display; on a headless machine run the suite under a virtual one:
+
+    xvfb-run -a python benchmarks/run_benchmarks.py --json report.json
+
+Without a display those cases are listed under "skipped" in the report and
+the remaining cases still run. Compare reports across releases with the
+"median_ms" of each case (cases are identified by name + params).
+"""
+import argparse
+import importlib.util
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from PIL import Image  # noqa: E402
+
+IMAGE_SIZE = (1920, 1080)
+ZOOM_LEVELS = (0.5, 1.0, 2.0, 4.0)
+REDRAW_COUNTS = (10, 100, 1000)
+QA_COUNTS = (10, 1000, 10000)
+LOD_VERTICES = (1000, 10000)
+VIDEO_FRAMES = 60
+SERVER_CLIENTS = (1, 10)
+STATS_IMAGES = (1000, 10000)
+
+
+def measure(fn, repeat, setup=None):
+    """Run fn repeat times (after one warm-up run) and return timing statistics in ms."""
+    samples = []
+    for n in range(repeat + 1):
+        if setup is not None:
+            setup()
+        t = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - t) * 1000
+        if n:
+            samples.append(elapsed)
+    return {
+        "repeat": repeat,
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "mean_ms": statistics.fmean(samples),
+        "max_ms": max(samples),
+    }
+
+
+def synthetic_image(path, size=IMAGE_SIZE, seed=0):
+    """A noisy RGB image, so resampling and encoding costs are realistic."""
+    noise = Image.effect_noise(size, 64)
+    gradient = Image.linear_gradient("L").resize(size)
+    Image.merge("RGB", (noise, gradient, Image.effect_noise(size, 32 + seed % 32))).save(path)
+    return path
+
+
+def synthetic_annotations(count, labels, size=IMAGE_SIZE, polygon_ratio=0.3, seed=0):
+    """Random boxes and polygons as annotation dicts (the project file format)."""
+    rng = random.Random(seed)
+    width, height = size
+    anns = []
+    for _ in range(count):
+        w, h = rng.randint(8, width // 6), rng.randint(8, height // 6)
+        x, y = rng.randint(0, width - w), rng.randint(0, height - h)
+        if rng.random() < polygon_ratio:
+            n = rng.randint(4, 12)
+            points = []
+            for k in range(n):
+                # Star-shaped around the box centre, so the polygon is simple.
+                angle = 2 * math.pi * k / n
+                r = 0.5 + 0.5 * rng.random()
+                points += [int(x + w / 2 + r * w / 2 * math.cos(angle)),
+                           int(y + h / 2 + r * h / 2 * math.sin(angle))]
+            anns.append({"type": "polygon", "points": points, "label": rng.choice(labels), "attributes": {}})
+        else:
+            anns.append({"type": "bbox", "points": [x, y, x + w, y + h], "label": rng.choice(labels),
+                         "attributes": {}})
+    return anns
+
+
+def synthetic_video(path, frames=VIDEO_FRAMES, size=(640, 360)):
+    import cv2
+    import numpy as np
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 25, size)
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    for n in range(frames):
+        writer.write(np.roll(base, n * 4, axis=1))
+    writer.release()
+    return path
+
+
+class Suite:
+    def __init__(self, workdir, repeat, only=None):
+        self.workdir = workdir
+        self.repeat = repeat
+        self.only = only
+        self.results = []
+        self.skipped = []
+
+    def wanted(self, group):
+        return self.only is None or group in self.only
+
+    def record(self, group, name, params, stats):
+        self.results.append(dict(group=group, name=name, params=params, **stats))
+        desc = ", ".join(f"{k}={v}" for k, v in params.items())
+        print(f"{name:<28} {desc:<36} median {stats['median_ms']:10.3f} ms")
+
+    def skip(self, group, reason):
+        self.skipped.append({"group": group, "reason": reason})
+        print(f"{group:<28} skipped: {reason}")
+
+
+def run_tk_cases(suite, labels):
+    groups = [g for g in ("redraw", "hit_test", "undo", "export") if suite.wanted(g)]
+    if not groups:
+        return
+    try:
+        from annotator import ImageVideoAnnotator
+        from annotator.models import Annotation
+        app = ImageVideoAnnotator()
+    except Exception as e:  # TclError without a display
+        for group in groups:
+            suite.skip(group, f"Tk unavailable ({e}); run under xvfb-run")
+        return
+    try:
+        app.geometry("1400x900")
+        app.update()
+        image_path = synthetic_image(os.path.join(suite.workdir, "tk_image.png"))
+        app.labels = list(labels)
+        app.image_list = [image_path]
+        app.image_status = {image_path: False}
+        app.reset_image_list()
+        app.current_image_index = 0
+
+        def load(count):
+            app.annotation_store = {image_path: synthetic_annotations(count, labels)}
+            app.image_path = None
+            app.load_image(image_path)
+            app.update()
+
+        if "redraw" in groups:
+            for count in REDRAW_COUNTS:
+                load(count)
+                for zoom in ZOOM_LEVELS:
+                    app.zoom_factor = zoom
+
+                    def redraw():
+                        app.redraw_canvas()
+                        app.update_idletasks()
+
+                    suite.record("redraw", "redraw_canvas", {"annotations": count, "zoom": zoom},
+                                 measure(redraw, suite.repeat))
+            app.zoom_factor = 1.0
+
+        if "hit_test" in groups:
+            app.edit_mode = True
+            for count in REDRAW_COUNTS:
+                load(count)
+                # A click on an empty corner visits every annotation (worst case);
+                # a click on the last annotation measures a typical hit.
+                miss = SimpleNamespace(x=1, y=1)
+                app.annotations.append(Annotation("bbox", [1500, 900, 1600, 1000], labels[0]))
+                hit_x, hit_y = app.image_to_canvas(1550, 950)
+                hit = SimpleNamespace(x=int(hit_x), y=int(hit_y))
+                suite.record("hit_test", "on_left_button_press", {"annotations": count, "case": "miss"},
+                             measure(lambda: app.on_left_button_press(miss), suite.repeat * 10))
+                suite.record("hit_test", "on_left_button_press", {"annotations": count, "case": "hit"},
+                             measure(lambda: app.on_left_button_press(hit), suite.repeat * 10))
+            app.edit_mode = False
+            app.selected_annotation = None
+
+        if "undo" in groups:
+            for count in REDRAW_COUNTS:
+                load(count)
+                suite.record("undo", "push_undo_state", {"annotations": count},
+                             measure(app.push_undo_state, suite.repeat * 5))
+                suite.record("undo", "undo", {"annotations": count},
+                             measure(app.undo, suite.repeat, setup=app.push_undo_state))
+
+        if "export" in groups:
+            from annotator.export_tools import export_yolo_format
+            for count in REDRAW_COUNTS:
+                app.annotation_store = {image_path: synthetic_annotations(count, labels, polygon_ratio=0.0)}
+                app.image_path = None
+                app.load_image(image_path)
+                suite.record("export", "export_yolo_format", {"annotations": count, "format": "yolo"},
+                             measure(lambda: export_yolo_format(app), suite.repeat))
+                app.annotation_store = {image_path: synthetic_annotations(count, labels, polygon_ratio=0.5)}
+                app.image_path = None
+                app.load_image(image_path)
+                suite.record("export", "export_yolo_format", {"annotations": count, "format": "mask_json"},
+                             measure(lambda: export_yolo_format(app), suite.repeat))
+    finally:
+        app.destroy()
+
+
+def run_quality_cases(suite, labels):
+    if not suite.wanted("quality"):
+        return
+    from annotator.quality import run_quality_checks
+    for total in QA_COUNTS:
+        # Spread the annotations over images of at most 100 annotations each,
+        # which is what quality_check sees for a real project.
+        per_image = min(total, 100)
+        store, sizes = {}, {}
+        for n in range(total // per_image):
+            path = os.path.join(suite.workdir, f"qa_{n}.png")
+            store[path] = synthetic_annotations(per_image, labels, seed=n)
+            sizes[path] = IMAGE_SIZE
+        suite.record("quality", "run_quality_checks", {"annotations": total},
+                     measure(lambda: run_quality_checks(store, labels, sizes, 0.9), suite.repeat))
+
+
+def run_statistics_cases(suite, labels):
+    if not suite.wanted("statistics"):
+        return
+    from annotator.statistics import DatasetStatistics
+    for images in STATS_IMAGES:
+        store = {f"img_{n}.png": synthetic_annotations(20, labels, seed=n) for n in range(images)}
+        params = {"images": images, "annotations": images * 20}
+        suite.record("statistics", "recompute", params,
+                     measure(lambda: DatasetStatistics().recompute(store), suite.repeat))
+        stats = DatasetStatistics().recompute(store)
+        edits = [synthetic_annotations(20, labels, seed=images + k) for k in range(2)]
+        # One edit of one image, the per-edit cost of the statistics window.
+        suite.record("statistics", "update_image", params,
+                     measure(lambda: [stats.update_image("img_0.png", anns) for anns in edits], suite.repeat))
+
+
+def dense_polygon(vertices, center=(960, 540), radius=400, seed=0):
+    """A wiggly closed outline with many vertices, like a traced segmentation mask."""
+    rng = random.Random(seed)
+    points = []
+    for k in range(vertices):
+        angle = 2 * math.pi * k / vertices
+        r = radius * (1 + 0.05 * math.sin(40 * angle)) + rng.random() * 2
+        points += [center[0] + r * math.cos(angle), center[1] + r * math.sin(angle)]
+    return points
+
+
+def run_lod_cases(suite):
+    """Canvas coordinates of one dense polygon: all vertices vs. the cached level of detail."""
+    if not suite.wanted("lod"):
+        return
+    from annotator.lod import polygon_canvas_coords
+    from annotator.models import Annotation
+    for vertices in LOD_VERTICES:
+        ann = Annotation("polygon", dense_polygon(vertices), "car")
+        for zoom in ZOOM_LEVELS:
+            scale = 0.5 * zoom  # initial_scale of a large image fitted to the window
+
+            def full():
+                return [p * scale + 10 for p in ann.points]
+
+            params = {"vertices": vertices, "zoom": zoom}
+            suite.record("lod", "all vertices", params, measure(full, suite.repeat))
+            stats = measure(lambda: polygon_canvas_coords(ann, scale, (10, 10)), suite.repeat,
+                            setup=ann.lod_cache.clear)
+            suite.record("lod", "polygon_canvas_coords cold", params, stats)
+            stats = measure(lambda: polygon_canvas_coords(ann, scale, (10, 10)), suite.repeat)
+            stats["drawn_vertices"] = len(polygon_canvas_coords(ann, scale, (10, 10))) // 2
+            suite.record("lod", "polygon_canvas_coords cached", params, stats)
+
+
+def run_video_cases(suite):
+    if not suite.wanted("video"):
+        return
+    if importlib.util.find_spec("cv2") is None:
+        suite.skip("video", "OpenCV is not installed")
+        return
+    from annotator.utils import extract_video_frames
+    video_path = synthetic_video(os.path.join(suite.workdir, "video.mp4"))
+    out_dir = os.path.join(suite.workdir, "frames")
+    stats = measure(lambda: extract_video_frames(video_path, out_dir), max(1, suite.repeat // 2),
+                    setup=lambda: shutil.rmtree(out_dir, ignore_errors=True))
+    stats["frames_per_second"] = VIDEO_FRAMES / (stats["median_ms"] / 1000)
+    suite.record("video", "load_video ingestion", {"frames": VIDEO_FRAMES, "size": "640x360"}, stats)
+
+
+def run_server_cases(suite, labels):
+    """Annotators syncing one edited image at a time with a local annotation server, all at once."""
+    if not suite.wanted("server"):
+        return
+    import threading
+    from annotator.project import new_project, write_project
+    from annotator.server import make_server
+    from annotator.sync_client import SyncClient, SyncSession
+
+    for clients in SERVER_CLIENTS:
+        project_path = os.path.join(suite.workdir, f"server_{clients}.json")
+        write_project(project_path, new_project([f"/images/{n}.jpg" for n in range(1000)], labels))
+        server = make_server(project_path, port=0, quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        samples, lock = [], threading.Lock()
+
+        def annotator(k):
+            client = SyncClient(url, client_id=f"bench{k}")
+            session = SyncSession(client, client.project())
+            store = {}
+            for n in range(suite.repeat * 10):
+                path = f"/images/{(k * 97 + n) % 1000}.jpg"
+                session.request_checkout(path)
+                store[path] = synthetic_annotations(10, labels, seed=n)
+                job = session.prepare(store)
+                t = time.perf_counter()
+                response = client.sync(job)
+                elapsed = (time.perf_counter() - t) * 1000
+                session.apply(job, response, store)
+                with lock:
+                    samples.append(elapsed)
+            session.close()
+
+        threads = [threading.Thread(target=annotator, args=(k,)) for k in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+        server.shutdown()
+        server.server_close()
+        server.store.close()
+        suite.record("server", "sync (1 image, 10 annotations)", {"clients": clients},
+                     {"repeat": len(samples), "median_ms": statistics.median(samples), "min_ms": min(samples),
+                      "mean_ms": statistics.fmean(samples), "max_ms": max(samples),
+                      "syncs_per_second": len(samples) / wall})
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", dest="json_path", help="write the report to this JSON file")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--quick", action="store_true", help="fewer repetitions, for smoke runs")
+    parser.add_argument("--only", help="comma-separated groups: redraw,hit_test,undo,export,quality,statistics,lod,video,server")
+    args = parser.parse_args(argv)
+    repeat = 2 if args.quick else args.repeat
+    only = set(args.only.split(",")) if args.only else None
+    labels = ["car", "person", "bicycle", "dog", "sign"]
+
+    workdir = tempfile.mkdtemp(prefix="annotator-bench-")
+    suite = Suite(workdir, repeat, only)
+    try:
+        run_tk_cases(suite, labels)
+        run_quality_cases(suite, labels)
+        run_statistics_cases(suite, labels)
+        run_lod_cases(suite)
+        run_video_cases(suite)
+        run_server_cases(suite, labels)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": suite.results,
+        "skipped": suite.skipped,
+    }
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
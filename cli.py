@@ -0,0 +1,439 @@
+"""
+Headless command line for batch jobs on annotator projects (no display needed).
+
+    python cli.py info project.json
+    python cli.py import project.json /data/images --workers 8
+    python cli.py prelabel project.json --model yolo11s.pt --workers 4
+    python cli.py rank project.json --model runs/detect/train/weights/best.pt --method entropy
+    python cli.py qa project.json --json qa.json
+    python cli.py audit project.json --model best.pt --json audit.json
+    python cli.py export project.json --workers 8
+    python cli.py masks project.json /data/masks --workers 8
+    python cli.py dedup project.json --copy-annotations
+    python cli.py classes project.json --rename car vehicle --delete junk
+    python cli.py split project.json /data/dataset --ratios 0.8 0.1 0.1 --group video --exclude-duplicates
+    python cli.py train-cache /data/dataset/dataset.yaml --imgsz 640
+    python cli.py serve project.json --port 8765
+
+Commands that change the project (import, prelabel, dedup, rank, classes) write it back in place,
+or to --output. Exit status is 1 on errors and, for qa, when issues at or above
+--fail-on are found.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from annotator.project import new_project, read_project, write_project
+
+
+class Progress:
+    """progress_callback(done, total) that prints a status line to stderr at most every 0.2 s."""
+
+    def __init__(self, label, quiet=False):
+        self.label = label
+        self.quiet = quiet
+        self.tty = sys.stderr.isatty()
+        self.last = 0.0
+        self.start = time.perf_counter()
+
+    def __call__(self, done, total):
+        if self.quiet:
+            return
+        now = time.perf_counter()
+        if done < total and now - self.last < (0.2 if self.tty else 5.0):
+            return
+        self.last = now
+        elapsed = now - self.start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        line = f"{self.label}: {done}/{total} ({rate:.1f}/s)"
+        if self.tty:
+            sys.stderr.write("\r" + line + ("\n" if done >= total else ""))
+        else:
+            sys.stderr.write(line + "\n")
+        sys.stderr.flush()
+
+
+def load(path, create=False):
+    if create and not os.path.exists(path):
+        return new_project()
+    return read_project(path)
+
+
+def save(args, project):
+    path = args.output or args.project
+    write_project(path, project)
+    if not args.quiet:
+        print(f"Project written to {path}")
+
+
+def cmd_info(args):
+    from annotator.batch import project_summary
+    summary = project_summary(load(args.project))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 0
+    print(f"Images: {summary['images']} ({summary['annotated_images']} annotated)")
+    print(f"Annotations: {summary['annotations']} "
+          + ", ".join(f"{t}: {n}" for t, n in summary["per_type"].items()))
+    for label in summary["labels"]:
+        print(f"  {label}: {summary['per_class'].get(label, 0)}")
+    return 0
+
+
+def cmd_import(args):
+    from annotator.batch import import_images
+    project = load(args.project, create=True)
+    names = None
+    if args.names:
+        with open(args.names) as f:
+            names = [line.strip() for line in f if line.strip()]
+    stats = import_images(project, args.folder, recursive=not args.no_recursive, import_labels=not args.no_labels,
+                          class_names=names, overwrite=args.overwrite, workers=args.workers,
+                          progress_callback=Progress("Reading labels", args.quiet))
+    print(f"Found {stats['images_found']} images, added {stats['images_added']}; "
+          f"imported {stats['annotations']} annotations from {stats['label_files']} label files")
+    save(args, project)
+    return 0
+
+
+def cmd_export(args):
+    from annotator.batch import export_project
+    counts = export_project(load(args.project), workers=args.workers,
+                            progress_callback=Progress("Exporting", args.quiet))
+    print(", ".join(f"{fmt}: {n}" for fmt, n in sorted(counts.items())) or "Nothing to export")
+    return 1 if counts.get("missing_image") else 0
+
+
+def cmd_masks(args):
+    from annotator.batch import export_mask_pngs
+    from annotator.mask_export import format_summary
+    summary = export_mask_pngs(load(args.project), args.out_dir, workers=args.workers, force=args.force,
+                               progress_callback=Progress("Rasterizing", args.quiet))
+    print(format_summary(summary))
+    return 1 if summary["missing"] else 0
+
+
+def cmd_prelabel(args):
+    from annotator.batch import prelabel_project
+    from annotator.inference import ultralytics_installed
+    if not ultralytics_installed():
+        print("Ultralytics package not installed! Please run: pip install ultralytics", file=sys.stderr)
+        return 1
+    project = load(args.project)
+    added = prelabel_project(project, args.model, conf=args.conf, tiled=args.tiled, tile_size=args.tile_size,
+                             overlap=args.overlap, batch_size=args.batch_size, only_empty=not args.all,
+                             replace=args.replace, workers=args.workers,
+                             progress_callback=Progress("Pre-labeling", args.quiet))
+    print(f"Added {added} boxes")
+    save(args, project)
+    return 0
+
+
+def cmd_rank(args):
+    from annotator.batch import rank_project
+    from annotator.inference import ultralytics_installed
+    if not ultralytics_installed():
+        print("Ultralytics package not installed! Please run: pip install ultralytics", file=sys.stderr)
+        return 1
+    project = load(args.project)
+    ranking = rank_project(project, args.model, method=args.method, batch_size=args.batch_size, imgsz=args.imgsz,
+                           progress_callback=Progress("Scoring", args.quiet))
+    print(f"Ranked {len(ranking)} images by {args.method}")
+    for path, score, detections in ranking[:args.show]:
+        print(f"  {score:8.3f}  {detections:4d} detections  {path}")
+    save(args, project)
+    return 0
+
+
+def cmd_qa(args):
+    from annotator.batch import check_project
+    from annotator.quality import SEVERITY_ORDER
+    issues = check_project(load(args.project), iou_threshold=args.iou, workers=args.workers,
+                           progress_callback=Progress("Reading image sizes", args.quiet))
+    counts = {}
+    for issue in issues:
+        counts[issue.kind] = counts.get(issue.kind, 0) + 1
+    print(f"{len(issues)} issues" + (": " + ", ".join(f"{k}: {n}" for k, n in sorted(counts.items()))
+                                     if issues else ""))
+    for issue in issues[:args.show]:
+        print(f"  [{issue.severity}] {issue.kind} {issue.image_path} #{issue.index}: {issue.message}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([issue._asdict() for issue in issues], f, indent=2)
+    if args.fail_on == "never":
+        return 0
+    limit = SEVERITY_ORDER[args.fail_on]
+    return 1 if any(SEVERITY_ORDER[issue.severity] <= limit for issue in issues) else 0
+
+
+def cmd_dedup(args):
+    from annotator.batch import find_project_duplicates
+    from annotator.dedup import copy_annotations_to_duplicates
+    project = load(args.project)
+    groups = find_project_duplicates(project, workers=args.workers, progress_callback=Progress("Hashing", args.quiet),
+                                     dhash_distance=args.dhash_distance, phash_distance=args.phash_distance)
+    print(f"{len(groups)} near-duplicate groups, {len(project['duplicate_of'])} of "
+          f"{len(project['image_list'])} images are near-duplicates")
+    for n, group in enumerate(groups[:args.show]):
+        print(f"  #{n + 1}: {len(group)} images, e.g. {group[0]}")
+    if args.copy_annotations:
+        filled = copy_annotations_to_duplicates(project["duplicate_of"], project["annotation_store"])
+        print(f"Copied annotations to {filled} images")
+    save(args, project)
+    return 0
+
+
+def cmd_audit(args):
+    from annotator.batch import audit_project
+    from annotator.inference import ultralytics_installed
+    if not ultralytics_installed():
+        print("Ultralytics package not installed! Please run: pip install ultralytics", file=sys.stderr)
+        return 1
+    findings = audit_project(load(args.project), args.model, batch_size=args.batch_size, imgsz=args.imgsz,
+                             progress_callback=Progress("Auditing", args.quiet),
+                             missing_conf=args.missing_conf, match_iou=args.iou)
+    counts = {}
+    for issue, _, _ in findings:
+        counts[issue.kind] = counts.get(issue.kind, 0) + 1
+    print(f"{len(findings)} findings" + (": " + ", ".join(f"{k}: {n}" for k, n in sorted(counts.items()))
+                                         if findings else ""))
+    for issue, score, _ in findings[:args.show]:
+        index = "" if issue.index is None else f" #{issue.index}"
+        print(f"  [{issue.severity}] {issue.kind} {issue.image_path}{index}: {issue.message}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([dict(issue._asdict(), score=score, detection=detection)
+                       for issue, score, detection in findings], f, indent=2)
+    return 0
+
+
+def cmd_train_cache(args):
+    from annotator.train_cache import format_summary, prepare_training_cache
+    summary = prepare_training_cache(args.dataset, args.imgsz, args.format, args.letterbox, args.cache_dir,
+                                     args.workers, args.force, Progress("Resizing", args.quiet))
+    print(format_summary(summary))
+    print(f"Train with: {summary['yaml']}")
+    return 1 if summary["missing"] else 0
+
+
+def cmd_serve(args):
+    from annotator.server import make_server
+    server = make_server(args.project, args.host, args.port, quiet=args.quiet,
+                         allow_new_images=args.allow_new_images)
+    host, port = server.server_address[:2]
+    print(f"Serving {args.project} at http://{host}:{port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.store.close()
+        print(f"Saved {args.project}")
+    return 0
+
+
+def cmd_classes(args):
+    from annotator.class_index import ClassIndex, assign_class_ids, delete_class, rename_class
+    project = load(args.project)
+    store, labels, class_ids = project["annotation_store"], project["labels"], project["class_ids"]
+    index = ClassIndex().refresh(store)
+    for old, new in args.rename or ():
+        images, annotations = rename_class(store, labels, class_ids, index, old, new)
+        print(f"{old} -> {new}: {annotations} annotations in {images} images")
+    for label in args.delete or ():
+        images, annotations = delete_class(store, labels, index, label)
+        print(f"removed {label}: {annotations} annotations in {images} images")
+    assign_class_ids(labels, class_ids)
+    counts = index.annotation_counts()
+    for label in labels + sorted(set(counts) - set(labels)):
+        images, annotations = counts.get(label, (0, 0))
+        class_id = class_ids[label] if label in labels else "-"
+        print(f"  {class_id:>4}  {label:<24} {annotations:>8} annotations {images:>7} images")
+    if args.rename or args.delete:
+        save(args, project)
+    return 0
+
+
+def cmd_stats(args):
+    from annotator.statistics import DatasetStatistics, write_json
+    project = load(args.project)
+    stats = DatasetStatistics().recompute(project["annotation_store"]).to_dict(project["labels"],
+                                                                               project["image_list"])
+    if args.out:
+        write_json(stats, args.out)
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return 0
+    print(f"Images: {stats['images']} ({stats['annotated_images']} annotated, {stats['annotated_rate']:.0%})")
+    print(f"Annotations: {stats['annotations']} " + ", ".join(f"{t}: {n}" for t, n in stats["types"].items()))
+    for label, counts in stats["classes"].items():
+        print(f"  {label:<24} {counts['annotations']:>8} annotations {counts['images']:>7} images")
+    for key, title in (("box_size", "Box size"), ("aspect_ratio", "Aspect ratio"),
+                       ("annotations_per_image", "Annotations per image")):
+        print(f"{title}:")
+        for name, count in zip(stats[key]["bins"], stats[key]["counts"]):
+            print(f"  {name:>12} {count:>8}")
+    return 0
+
+
+def cmd_split(args):
+    from annotator.batch import split_dataset_files
+    from annotator.dataset_tools import format_summary
+    if len(args.ratios) != 3 or min(args.ratios) < 0 or args.ratios[0] <= 0:
+        print("Ratios must be three non-negative numbers and train must be > 0.", file=sys.stderr)
+        return 1
+    summary = split_dataset_files(load(args.project), args.out_dir, ratios=args.ratios, group_mode=args.group,
+                                  link_mode=args.link, seed=args.seed, exclude_duplicates=args.exclude_duplicates,
+                                  workers=args.workers,
+                                  progress_callback=Progress("Writing", args.quiet))
+    print(format_summary(summary))
+    return 0
+
+
+def build_parser():
+    from annotator.dataset_tools import GROUP_MODES, LINK_MODES
+    from annotator.active_learning import METHODS
+    from annotator.dedup import DHASH_DISTANCE, PHASH_DISTANCE
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("project", help="project JSON file (File -> Save Project)")
+    common.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 1),
+                        help="parallel worker threads (default: CPU count, at most 8)")
+    common.add_argument("--quiet", action="store_true", help="no progress output")
+    writes = argparse.ArgumentParser(add_help=False)
+    writes.add_argument("-o", "--output", help="write the updated project here instead of in place")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("info", parents=[common], help="summarize a project")
+    p.add_argument("--json", action="store_true", help="print the summary as JSON")
+    p.set_defaults(func=cmd_info)
+
+    p = sub.add_parser("import", parents=[common, writes],
+                       help="add a folder of images and their existing label files (creates the project if needed)")
+    p.add_argument("folder")
+    p.add_argument("--no-recursive", action="store_true", help="do not scan subfolders")
+    p.add_argument("--no-labels", action="store_true", help="only add images, ignore label files")
+    p.add_argument("--names", help="text file with one class name per line, in YOLO class id order")
+    p.add_argument("--overwrite", action="store_true", help="replace annotations already in the project")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("export", parents=[common], help="write YOLO / Mask R-CNN label files next to the images")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("masks", parents=[common],
+                       help="write class-index and instance-id mask PNGs for segmentation training")
+    p.add_argument("out_dir")
+    p.add_argument("--force", action="store_true", help="re-render images that did not change")
+    p.set_defaults(func=cmd_masks)
+
+    p = sub.add_parser("prelabel", parents=[common, writes], help="pre-label images with a YOLO model")
+    p.add_argument("--model", default="yolo11s.pt", help="weights file or hub name")
+    p.add_argument("--conf", type=float, default=0.25)
+    p.add_argument("--batch-size", type=int, default=8, help="images (or tiles with --tiled) per model call")
+    p.add_argument("--tiled", action="store_true", help="sliced inference for very large images")
+    p.add_argument("--tile-size", type=int, default=640)
+    p.add_argument("--overlap", type=float, default=0.2)
+    p.add_argument("--all", action="store_true", help="also process images that already have annotations")
+    p.add_argument("--replace", action="store_true", help="with --all, replace existing annotations")
+    p.set_defaults(func=cmd_prelabel)
+
+    p = sub.add_parser("rank", parents=[common, writes],
+                       help="rank open images by model uncertainty for active learning (Next Image follows it)")
+    p.add_argument("--model", default="yolo11s.pt", help="weights of the current model")
+    p.add_argument("--method", choices=METHODS, default="least_confidence")
+    p.add_argument("--batch-size", type=int, default=16)
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--show", type=int, default=10, help="number of top images to print")
+    p.set_defaults(func=cmd_rank)
+
+    p = sub.add_parser("qa", parents=[common], help="run the dataset quality checks")
+    p.add_argument("--iou", type=float, default=0.9, help="IoU threshold for near-duplicate boxes")
+    p.add_argument("--json", help="write all issues to this JSON file")
+    p.add_argument("--show", type=int, default=20, help="number of issues to print")
+    p.add_argument("--fail-on", choices=("error", "warning", "info", "never"), default="error",
+                   help="exit with status 1 when issues of this severity or worse are found")
+    p.set_defaults(func=cmd_qa)
+
+    p = sub.add_parser("audit", parents=[common],
+                       help="compare model detections with the annotations: missing, false and confused labels")
+    p.add_argument("--model", default="yolo11s.pt", help="weights of the model to audit with")
+    p.add_argument("--missing-conf", type=float, default=0.5,
+                   help="minimum confidence of an unmatched detection to report a missing object")
+    p.add_argument("--iou", type=float, default=0.5, help="IoU at which a detection matches an annotation")
+    p.add_argument("--batch-size", type=int, default=16)
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--json", help="write all findings to this JSON file")
+    p.add_argument("--show", type=int, default=20, help="number of findings to print")
+    p.set_defaults(func=cmd_audit)
+
+    p = sub.add_parser("dedup", parents=[common, writes],
+                       help="find near-duplicate images with perceptual hashes and record them in the project")
+    p.add_argument("--dhash-distance", type=int, default=DHASH_DISTANCE, help="max dHash Hamming distance")
+    p.add_argument("--phash-distance", type=int, default=PHASH_DISTANCE, help="max pHash Hamming distance")
+    p.add_argument("--copy-annotations", action="store_true",
+                   help="copy the annotations of each group's kept image to its unannotated duplicates")
+    p.add_argument("--show", type=int, default=10, help="number of groups to print")
+    p.set_defaults(func=cmd_dedup)
+
+    p = sub.add_parser("classes", parents=[common, writes],
+                       help="list the classes with their ids and counts; rename, merge or delete classes")
+    p.add_argument("--rename", nargs=2, action="append", metavar=("OLD", "NEW"),
+                   help="rename a class in the class list and all annotations (merges into NEW if it exists)")
+    p.add_argument("--delete", action="append", metavar="LABEL", help="remove a class and its annotations")
+    p.set_defaults(func=cmd_classes)
+
+    p = sub.add_parser("stats", parents=[common],
+                       help="class balance, box size, aspect ratio and annotations-per-image histograms")
+    p.add_argument("--json", action="store_true", help="print the statistics as JSON")
+    p.add_argument("--out", help="also write the statistics as JSON to this file")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("split", parents=[common], help="write a train/val/test YOLO dataset")
+    p.add_argument("out_dir")
+    p.add_argument("--ratios", type=float, nargs=3, default=[0.8, 0.1, 0.1], metavar=("TRAIN", "VAL", "TEST"))
+    p.add_argument("--group", choices=GROUP_MODES, default="none",
+                   help="keep images of a group in one split (video: frames named <name>_<n>; default: none)")
+    p.add_argument("--link", choices=LINK_MODES, default="hardlink")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--exclude-duplicates", action="store_true",
+                   help="leave out the near-duplicates recorded by the dedup command")
+    p.set_defaults(func=cmd_split)
+
+    p = sub.add_parser("train-cache", help="copy a YOLO dataset resized to the training size (faster epochs)")
+    p.add_argument("dataset", help="dataset.yaml (e.g. written by split)")
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--format", choices=("jpeg", "webp"), default="jpeg")
+    p.add_argument("--letterbox", action="store_true", help="pad to imgsz x imgsz and adjust the labels")
+    p.add_argument("--cache-dir", help="default: ~/.cache/annotator/training/<dataset>_<imgsz>_<format>")
+    p.add_argument("--force", action="store_true", help="rewrite images even when unchanged")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--quiet", action="store_true", help="no progress output")
+    p.set_defaults(func=cmd_train_cache)
+
+    p = sub.add_parser("serve", help="share the project with several annotators over HTTP (File -> Connect to Server)")
+    p.add_argument("project")
+    p.add_argument("--host", default="127.0.0.1", help="address to listen on (0.0.0.0 for the local network)")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--quiet", action="store_true", help="do not log requests")
+    p.add_argument("--allow-new-images", action="store_true",
+                   help="accept annotations of images that are not in the project (they are added to it)")
+    p.set_defaults(func=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())